@@ -1,9 +1,10 @@
 from math import inf
 
-from gurobipy.gurobipy import GRB, Model, quicksum
+from gurobipy import GRB, Model, quicksum
 
 from configure_gurobi import configure_gurobi
 from fractional_integral_flow import SplittableFlow
+from graph_algorithms import cycle_longer_than_two, depth_first_forest, sink_strongly_connected_component
 from simulations import EPS, ConfluentMechanism
 
 
@@ -18,13 +19,8 @@ class OnePlusLogTwoApproximation(ConfluentMechanism):
         assert node != into_node
 
         for succs in flow_graph:
-            for neighbor in succs:
-                if neighbor == node:
-                    if into_node in succs:
-                        succs[into_node] += succs[neighbor]
-                    else:
-                        succs[into_node] = succs[neighbor]
-                    del succs[neighbor]
+            if node in succs:
+                succs[into_node] = succs.get(into_node, 0) + succs.pop(node)
 
         # TODO: Check that this is valid
         flow_graph[node] = {}
@@ -54,70 +50,8 @@ class OnePlusLogTwoApproximation(ConfluentMechanism):
                     graph[neighbor].append(i)
         return graph
 
-    @staticmethod
-    def detect_cycles_longer_than_two(graph):
-        """
-
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[1],[2],[0]])
-        [0, 1, 2, 0]
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[1], [0], [0]])
-
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[4], [2], [3], [1], [0]])
-        [1, 2, 3, 1]
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[]])
-
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[1], [2], [3], [2]])
-
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[1], [2], [3], [4], [1]])
-        [1, 2, 3, 4, 1]
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[], [0, 0, 2], [0, 3], [1, 0]])
-        [1, 2, 3, 1]
-        >>> OnePlusLogTwoApproximation.detect_cycles_longer_than_two([[], [2], [3], [0]])
-
-
-        Args:
-            graph (list of list of int): in adjacency list representation
-        Returns:
-            list of ints: node indices of a loop, first element is successor of the last.
-        """
-        entered = set()
-        left = set()
-
-        def dfs(node, predecessor):
-            if node in entered:
-                return None
-            entered.add(node)
-
-            for neighbor in graph[node]:
-                assert neighbor != node
-                if neighbor == predecessor or neighbor in left:
-                    continue
-                if neighbor in entered:
-                    return [node, neighbor]
-                else:
-                    result = dfs(neighbor, node)
-                    if result is not None:
-                        return [node] + result
-
-            left.add(node)
-            return None
-
-        for i in range(len(graph)):
-            result = dfs(i, None)
-            if result is not None:
-                assert len(result) > 3
-                assert result[0] == i
-                loop_point = result[-1]
-                assert result[-2] != loop_point  # cycle of length 1
-                assert result[-3] != loop_point  # cycle of length 2
-                assert result.count(loop_point) >= 2
-
-                for j in range(4, len(result) + 1):
-                    if result[-j] == loop_point:
-                        return result[-j:]
-                assert False
-
-        return None
+    # Iterative depth-first search, see graph_algorithms
+    detect_cycles_longer_than_two = staticmethod(cycle_longer_than_two)
 
     def _node_aggregation(self, flow_graph, transitive_delegations, demands):
         for i, succs in enumerate(flow_graph):
@@ -183,40 +117,21 @@ class OnePlusLogTwoApproximation(ConfluentMechanism):
             del flow_graph[v][sj]
 
     def _transitive_delegations_to_delegations(self, transitive_delegations):
-        delegations_dict = {}
-
+        """Let every node delegate along a tree of potential delegations rooted at its transitive delegate."""
         num_agents = len(transitive_delegations)
-        predecessors = [[] for _ in range(num_agents)]
-        for i in range(num_agents):
-            if self.graph.is_voter(i):
-                delegations_dict[i] = None
-            else:
-                for neighbor in self.graph.potential_delegations[i]:
-                    predecessors[neighbor].append(i)
-
-        def dfs(node):
-            assert node in delegations_dict
-            for pred in predecessors[node]:
-                if pred in delegations_dict:
-                    continue
-                if transitive_delegations[pred] != transitive_delegations[node]:
-                    continue
-                delegations_dict[pred] = node
-                dfs(pred)
-
-        for i in range(num_agents):
-            if self.graph.is_voter(i):
-                dfs(i)
+        voters = [i for i in range(num_agents) if self.graph.is_voter(i)]
+        delegations = depth_first_forest(self.graph.predecessors, voters, transitive_delegations)
 
-        assert len(delegations_dict) == num_agents
-        return [delegations_dict[i] for i in range(num_agents)]
+        assert all((delegations[i] is None) == self.graph.is_voter(i) for i in range(num_agents))
+        return delegations
 
     def get_delegations(self, time_out=None):
         num_agents = self.graph.number_of_nodes()
         transitive_delegations = [i for i in range(num_agents)]
         demands = [1 for _ in range(num_agents)]
 
-        flow_graph = SplittableFlow.solve_flow(self.graph.potential_delegations)[0]
+        flow_graph = SplittableFlow.solve_flow(self.graph.unique_potential_delegations,
+                                              predecessors=self.graph.predecessors)[0]
 
         assert len(flow_graph) == num_agents
         for i, succs in enumerate(flow_graph):
@@ -252,67 +167,8 @@ class OnePlusLnApproximation(OnePlusLogTwoApproximation):
     PLOT_LABEL = "($1 + \\log |V|$)-approximation"
     PLOT_PATTERN = "solid"
 
-    @staticmethod
-    def sink_strongly_connected_component(graph):
-        """Compute a strongly connected component (SCC) that is a sink in the DAG of SCCs.
-
-        Isolated sinks are not reported. The function assumes that all sinks are isolated.
-
-        >>> OnePlusLnApproximation.sink_strongly_connected_component([[1], [2], [0]])
-        [0, 1, 2]
-        >>> OnePlusLnApproximation.sink_strongly_connected_component([[1], [2], [1]])
-        [1, 2]
-        >>> OnePlusLnApproximation.sink_strongly_connected_component([[], [2], [1]])
-        [1, 2]
-
-        Args:
-            graph (list of list of int): graph in adjacency list representation
-        Returns:
-            list of int:
-            list of all nodes in the
-        """
-
-        num_nodes = len(graph)
-        dfs_num = [None for _ in range(num_nodes)]  # Iteration counter when visited for the first time
-        dfs_low = [0 for _ in range(num_nodes)]  # Lowest dfs_num reachable from DFS spanning subtree of node
-        visited = [False for _ in range(num_nodes)]
-        dfs_number_counter = 0
-        stack = []
-
-        def tarjan_scc(u):
-            nonlocal dfs_number_counter, dfs_num, dfs_low, visited, stack
-
-            assert not visited[u]
-
-            dfs_low[u] = dfs_number_counter
-            dfs_num[u] = dfs_number_counter
-            dfs_number_counter += 1
-
-            stack.append(u)
-            visited[u] = True
-
-            for neighbor in graph[u]:
-                if dfs_num[neighbor] is None:
-                    inner = tarjan_scc(neighbor)
-                    if inner is not None:
-                        return inner
-                assert visited[neighbor]
-                if visited[neighbor]:
-                    dfs_low[u] = min(dfs_low[u], dfs_low[neighbor])
-
-            if dfs_low[u] == dfs_num[u]:
-                index = stack.index(u)
-                assert index == dfs_num[u]
-                return stack[index:]
-
-            return None
-
-        for i in range(num_nodes):
-            if len(graph[i]) > 0 and dfs_num[i] is None:
-                inner = tarjan_scc(i)
-                if inner is not None:
-                    return inner
-        assert False
+    # Iterative Tarjan's algorithm, see graph_algorithms
+    sink_strongly_connected_component = staticmethod(sink_strongly_connected_component)
 
     def _balancing(self, flow_graph, sinks, frontier, demands):
         configure_gurobi()
@@ -406,7 +262,8 @@ class OnePlusLnApproximation(OnePlusLogTwoApproximation):
         demands = [1 for _ in range(num_agents)]
 
         # list of (dict of int → float): for each node, dictionary mapping successors to positive flow
-        flow_graph = SplittableFlow.solve_flow(self.graph.potential_delegations)[0]
+        flow_graph = SplittableFlow.solve_flow(self.graph.unique_potential_delegations,
+                                              predecessors=self.graph.predecessors)[0]
 
         assert len(flow_graph) == num_agents
         for i, succs in enumerate(flow_graph):
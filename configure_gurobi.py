@@ -6,3 +6,8 @@ def configure_gurobi():
     setParam("OutputFlag", False)
     if getenv("GUROBI_SINGLE_THREAD") is not None:
         setParam("Threads", 1)
+
+
+def debug_names():
+    """Say whether to name the variables of models, e.g. to inspect them with ``Model.write``."""
+    return getenv("GUROBI_DEBUG_NAMES") is not None
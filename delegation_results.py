@@ -0,0 +1,186 @@
+"""Compact result types for confluent delegations and splittable flows.
+
+Both types store their contents in NumPy arrays, which can be taken over without copying, and are read-only sequences in
+the list formats used throughout (``list of (int / None)`` and ``list of ((dict of int → float) / None)``). Elements of
+these compatibility views are created lazily on access, so code written for lists keeps working and pays for the
+conversion only where it actually looks at the elements.
+"""
+
+from collections.abc import Sequence
+from itertools import chain
+
+from numpy import arange, array_equal, asarray, bincount, cumsum, fromiter, int32, int64, zeros
+
+
+class ConfluentDelegations(Sequence):
+    """Confluent delegations as an int32 array holding the delegate of every node, or -1 for voters.
+
+    >>> delegations = ConfluentDelegations.from_list([None, 0, None, 2])
+    >>> delegations
+    [None, 0, None, 2]
+    >>> delegations.delegates
+    array([-1,  0, -1,  2], dtype=int32)
+    >>> delegations[1], delegations[2], delegations == [None, 0, None, 2]
+    (0, None, True)
+
+    Attributes:
+        delegates (numpy array of int32): for every node, the node it delegates to, or -1 for voters
+    """
+
+    VOTER = -1
+
+    def __init__(self, delegates):
+        self.delegates = asarray(delegates, dtype=int32)  # not copied if it already is an int32 array
+
+    @classmethod
+    def from_list(cls, delegations):
+        """Convert from ``list of (int / None)``."""
+        return cls(fromiter((cls.VOTER if delegate is None else delegate for delegate in delegations), int32,
+                            len(delegations)))
+
+    def to_numpy(self):
+        """Return the array of delegates, without copying it."""
+        return self.delegates
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None and not copy:
+            return self.delegates
+        return self.delegates.astype(self.delegates.dtype if dtype is None else dtype)
+
+    def subtree_weights(self):
+        """Return for every node the number of nodes whose delegations pass through it, including itself.
+
+        For a voter, this is its weight; for a delegating node, it is the flow on the edge to its delegate.
+
+        >>> ConfluentDelegations.from_list([None, 0, 1, 0, None]).subtree_weights().tolist()
+        [4, 2, 1, 1, 1]
+        """
+        weights = zeros(len(self.delegates), dtype=int64)
+        current = arange(len(self.delegates))
+        while len(current) > 0:  # one round per level of the delegation forest
+            weights += bincount(current, minlength=len(self.delegates))
+            current = self.delegates[current]
+            current = current[current != self.VOTER]
+        return weights
+
+    def tolist(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.delegates)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ConfluentDelegations(self.delegates[index])
+        delegate = int(self.delegates[index])
+        return None if delegate == self.VOTER else delegate
+
+    def __iter__(self):
+        for delegate in self.delegates.tolist():
+            yield None if delegate == self.VOTER else delegate
+
+    def __eq__(self, other):
+        if isinstance(other, ConfluentDelegations):
+            return array_equal(self.delegates, other.delegates)
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class SplittableFlows(Sequence):
+    """Splittable flows in compressed sparse row (CSR) format.
+
+    The flow leaving node u is ``values[indptr[u]:indptr[u + 1]]`` on the edges to ``targets[indptr[u]:indptr[u + 1]]``.
+    Voters have no outgoing flow; as elements of the compatibility view, they are None.
+
+    >>> flows = SplittableFlows.from_list([None, None, {0: 0.25, 1: 0.75}])
+    >>> flows
+    [None, None, {0: 0.25, 1: 0.75}]
+    >>> flows.indptr.tolist(), flows.targets.tolist(), flows.values.tolist()
+    ([0, 0, 0, 2], [0, 1], [0.25, 0.75])
+
+    Attributes:
+        indptr (numpy array of int64): CSR offsets, of length number of nodes + 1
+        targets (numpy array of int32): endpoints of the edges carrying flow, ordered by their start
+        values (numpy array of float64): flow on each of these edges
+        is_voter (numpy array of bool): for every node, whether it is a voter
+    """
+
+    def __init__(self, indptr, targets, values, is_voter):
+        assert len(indptr) == len(is_voter) + 1
+        assert indptr[-1] == len(targets) == len(values)
+        self.indptr = asarray(indptr, dtype=int64)
+        self.targets = asarray(targets, dtype=int32)
+        self.values = asarray(values, dtype=float)
+        self.is_voter = asarray(is_voter, dtype=bool)
+
+    @classmethod
+    def from_list(cls, flows):
+        """Convert from ``list of ((dict of int → float) / None)``, where empty dicts also count as voters."""
+        number_of_nodes = len(flows)
+        indptr = zeros(number_of_nodes + 1, dtype=int64)
+        cumsum(fromiter((len(succs) if succs else 0 for succs in flows), int64, number_of_nodes), out=indptr[1:])
+        targets = fromiter(chain.from_iterable(succs for succs in flows if succs), int32, indptr[-1])
+        values = fromiter(chain.from_iterable(succs.values() for succs in flows if succs), float, indptr[-1])
+        return cls(indptr, targets, values, fromiter((not succs for succs in flows), bool, number_of_nodes))
+
+    @classmethod
+    def from_edges(cls, is_voter, sources, targets, values):
+        """Build from the flows on edges sorted by their start, e.g. the nonzero flows of a solved linear program.
+
+        Args:
+            is_voter (numpy array of bool): for every node, whether it is a voter
+            sources (numpy array of int): start of every edge, in ascending order
+            targets (numpy array of int): end of every edge
+            values (numpy array of float): flow on every edge
+        """
+        indptr = zeros(len(is_voter) + 1, dtype=int64)
+        cumsum(bincount(sources, minlength=len(is_voter)), out=indptr[1:])
+        return cls(indptr, targets, values, is_voter)
+
+    def to_numpy(self):
+        """Return the CSR arrays (indptr, targets, values), without copying them."""
+        return self.indptr, self.targets, self.values
+
+    def tolist(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.is_voter)
+
+    def __getitem__(self, node):
+        if isinstance(node, slice):
+            return [self[i] for i in range(len(self))[node]]
+        if self.is_voter[node]:
+            return None
+        begin, end = self.indptr[node], self.indptr[node + 1]
+        return dict(zip(self.targets[begin:end].tolist(), self.values[begin:end].tolist()))
+
+    def __iter__(self):
+        indptr = self.indptr.tolist()
+        targets = self.targets.tolist()
+        values = self.values.tolist()
+        for node, is_voter in enumerate(self.is_voter.tolist()):
+            if is_voter:
+                yield None
+            else:
+                yield dict(zip(targets[indptr[node]:indptr[node + 1]], values[indptr[node]:indptr[node + 1]]))
+
+    def __eq__(self, other):
+        if isinstance(other, SplittableFlows):
+            return all(array_equal(a, b) for a, b in zip((self.indptr, self.targets, self.values, self.is_voter),
+                                                         (other.indptr, other.targets, other.values, other.is_voter)))
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -0,0 +1,296 @@
+"""Simulation of many independent runs of the graph model in lockstep.
+
+Instead of growing one ``Graph`` after another, an ``Ensemble`` keeps R runs in NumPy arrays with a leading run
+dimension and adds the next node to all runs at once. The attachment probabilities of every run are kept in an urn
+(gamma = 1), implicitly (gamma = 0) or in a Fenwick tree per run (otherwise), so each node takes a constant number of
+vectorized operations over the runs, or a logarithmic number for general gamma. The online mechanisms ``NoChoice``,
+``GreedyNewestDelegate``, ``GreedyRandomDelegation`` and ``GreedyPowerOfChoice`` make their decisions for all runs at
+once. The runs follow the same distribution as ``Graph.add_node`` with a fixed outdegree, but not the same random
+stream.
+"""
+
+from numpy import (arange, argmin, concatenate, cumsum, empty, flatnonzero, full, int32, maximum, ones, where,
+                   zeros)
+from numpy.random import default_rng
+
+from graph_storage import CompactStorage
+from simple_mechanisms import GreedyNewestDelegate, GreedyPowerOfChoice, GreedyRandomDelegation, NoChoice
+from simulations import Graph
+
+
+class Ensemble:
+    """R independent graphs with fixed outdegree, grown in lockstep, and online mechanisms running on each of them.
+
+    The deterministic rules make the same decisions as the mechanisms running on each run as a ``Graph``:
+
+    >>> mechanism_classes = [GreedyPowerOfChoice, GreedyNewestDelegate]
+    >>> ensemble = Ensemble(20, 1., .5, 2, 200, mechanism_classes, rng=0)
+    >>> ensemble.grow(199)
+    >>> ensemble.number_of_nodes
+    200
+    >>> weights = ensemble.max_weights()
+    >>> all(mechanism_class(ensemble.graph(run)).current_max_weight() == weights[mechanism_class][run]
+    ...     for run in range(20) for mechanism_class in mechanism_classes)
+    True
+
+    Attributes:
+        runs (int): number of runs R
+        gamma (float): exponent of preferential attachment
+        d (float): probability of a new node delegating
+        outdegree (int): number of potential delegations of every delegating node
+        capacity (int): maximum number of nodes per run
+        number_of_nodes (int): number of nodes in each run so far
+        is_voter (numpy array of bool): is_voter[r, i] says whether node i of run r is a voter
+        potential_delegations (numpy array of int32): potential_delegations[r, i] are the potential delegations of
+                                                      node i in run r, undefined for voters
+        mechanisms (list of type): the simulated mechanism classes
+        rng (numpy.random.Generator): source of randomness of the graphs
+    """
+
+    def __init__(self, runs, gamma, d, outdegree, capacity, mechanism_classes=(), rng=None):
+        assert runs > 0 and outdegree >= 1 and capacity >= 1
+        self.runs = runs
+        self.gamma = gamma
+        self.d = d
+        self.outdegree = outdegree
+        self.capacity = capacity
+        self.rng = default_rng(rng)
+        self.number_of_nodes = 1
+        self.is_voter = ones((runs, capacity), dtype=bool)
+        self.potential_delegations = zeros((runs, capacity, outdegree), dtype=int32)
+
+        if gamma == 0:
+            self._sampler = _UniformSampler(runs)
+        elif gamma == 1:
+            self._sampler = _UrnSampler(runs, 1 + (capacity - 1) * (outdegree + 1))
+        else:
+            self._sampler = _FenwickSampler(runs, capacity, gamma)
+
+        self.mechanisms = list(mechanism_classes)
+        self._rules = [_rule_for(mechanism_class, self) for mechanism_class in self.mechanisms]
+
+    def step(self):
+        """Add one node to every run."""
+        node = self.number_of_nodes
+        assert node < self.capacity
+        delegating = flatnonzero(self.rng.random(self.runs) < self.d)
+        self.is_voter[delegating, node] = False
+
+        targets = empty((len(delegating), self.outdegree), dtype=int32)
+        for j in range(self.outdegree):
+            targets[:, j] = self._sampler.sample(delegating, self.rng.random(len(delegating)), node)
+            self._sampler.increment(delegating, targets[:, j])
+        self._sampler.add_node(node)
+        self.potential_delegations[delegating, node] = targets
+
+        for rule in self._rules:
+            rule.step(node, delegating, targets)
+        self.number_of_nodes = node + 1
+
+    def grow(self, n):
+        """Add ``n`` nodes to every run."""
+        for _ in range(n):
+            self.step()
+
+    def max_weights(self):
+        """Return a dict mapping every mechanism class to a numpy array of the maximum weight in each run."""
+        return {mechanism_class: rule.max_weight.copy() for mechanism_class, rule in zip(self.mechanisms, self._rules)}
+
+    def voter_weights(self, mechanism_class):
+        """Return a numpy array of shape (R, number of nodes): the weight of each voter, zero for delegating nodes."""
+        return self._rules[self.mechanisms.index(mechanism_class)].weights[:, :self.number_of_nodes].copy()
+
+    def graph(self, run):
+        """Return the nodes of run ``run`` so far as a ``Graph``, which can be grown further with its own randomness."""
+        number_of_nodes = self.number_of_nodes
+        is_voter = self.is_voter[run, 1:number_of_nodes]
+        outdegrees = where(is_voter, 0, self.outdegree)
+        storage = CompactStorage(self.gamma)
+        storage.append_voter()
+        storage.append_block(is_voter, concatenate(([0], cumsum(outdegrees))),
+                             self.potential_delegations[run, 1:number_of_nodes][~is_voter].ravel())
+        return Graph(self.gamma, self.d, self.outdegree, rng=self.rng.spawn(1)[0], storage=storage)
+
+    def traces(self, time, step_size=1):
+        """Grow all runs to ``time`` nodes and record the maximum weights along the way.
+
+        Args:
+            time (int): number of nodes at the end, at most ``capacity``
+            step_size (int): the maximum weights are recorded whenever the number of nodes minus one is a multiple of
+                             ``step_size``
+
+        Returns:
+            (list of int, dict of type → numpy array of int): (numbers of nodes at which the weights were recorded,
+                                                               for every mechanism class an array of shape (R, ticks)
+                                                               with the maximum weight of each run at each tick)
+        """
+        assert self.number_of_nodes <= time <= self.capacity
+        ticks = []
+        history = {mechanism_class: [] for mechanism_class in self.mechanisms}
+        while True:
+            if (self.number_of_nodes - 1) % step_size == 0:
+                ticks.append(self.number_of_nodes)
+                for mechanism_class, max_weight in self.max_weights().items():
+                    history[mechanism_class].append(max_weight)
+            if self.number_of_nodes == time:
+                break
+            self.step()
+        traces = {}
+        for mechanism_class, weights in history.items():
+            traces[mechanism_class] = empty((self.runs, len(ticks)), dtype=int32)
+            for tick, max_weight in enumerate(weights):
+                traces[mechanism_class][:, tick] = max_weight
+        return ticks, traces
+
+
+class _UniformSampler:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def sample(self, rows, uniforms, number_of_nodes):
+        return (uniforms * number_of_nodes).astype(int32).clip(max=number_of_nodes - 1)
+
+    def increment(self, rows, nodes):
+        pass
+
+    def add_node(self, node):
+        pass
+
+
+class _UrnSampler:
+    """One urn per run, holding every node once plus once per potential delegation to it."""
+
+    def __init__(self, runs, capacity):
+        self.urn = zeros((runs, capacity), dtype=int32)
+        self.sizes = ones(runs, dtype=int32)
+
+    def sample(self, rows, uniforms, number_of_nodes):
+        indices = (uniforms * self.sizes[rows]).astype(int32).clip(max=self.sizes[rows] - 1)
+        return self.urn[rows, indices]
+
+    def increment(self, rows, nodes):
+        self.urn[rows, self.sizes[rows]] = nodes
+        self.sizes[rows] += 1
+
+    def add_node(self, node):
+        self.urn[arange(len(self.sizes)), self.sizes] = node
+        self.sizes += 1
+
+
+class _FenwickSampler:
+    """One Fenwick tree per run over the weights degree ** gamma, vectorized over the runs."""
+
+    def __init__(self, runs, capacity, gamma):
+        self.gamma = gamma
+        self.size = 1 << max(capacity - 1, 1).bit_length()
+        self.tree = zeros((runs, self.size + 1))
+        self.degrees = zeros((runs, capacity), dtype=int32)
+        self._add(arange(runs), zeros(runs, dtype=int32), ones(runs))
+        self.degrees[:, 0] = 1
+
+    def _add(self, rows, nodes, deltas):
+        positions = nodes.astype(int32) + 1
+        active = arange(len(rows))
+        while len(active) > 0:
+            self.tree[rows[active], positions[active]] += deltas[active]
+            positions[active] += positions[active] & -positions[active]
+            active = active[positions[active] <= self.size]
+
+    def sample(self, rows, uniforms, number_of_nodes):
+        remaining = uniforms * self.tree[rows, self.size]
+        positions = zeros(len(rows), dtype=int32)
+        bit = self.size
+        while bit > 0:
+            candidates = positions + bit
+            below = self.tree[rows, candidates] <= remaining
+            remaining[below] -= self.tree[rows[below], candidates[below]]
+            positions[below] = candidates[below]
+            bit >>= 1
+        return positions.clip(max=number_of_nodes - 1)
+
+    def increment(self, rows, nodes):
+        old = self.degrees[rows, nodes]
+        self.degrees[rows, nodes] = old + 1
+        self._add(rows, nodes, (old + 1.) ** self.gamma - old ** self.gamma)
+
+    def add_node(self, node):
+        runs = len(self.degrees)
+        self.degrees[:, node] = 1
+        self._add(arange(runs), full(runs, node, dtype=int32), ones(runs))
+
+
+class _OnlineRule:
+    """Vectorized state of an online mechanism in all runs: transitive delegates and voter weights.
+
+    Subclasses decide the delegations by overriding ``choose``.
+    """
+
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        self.transitive_delegations = zeros((ensemble.runs, ensemble.capacity), dtype=int32)
+        self.weights = zeros((ensemble.runs, ensemble.capacity), dtype=int32)
+        self.weights[:, 0] = 1
+        self.max_weight = ones(ensemble.runs, dtype=int32)
+
+    def choose(self, rows, targets):
+        """Return the delegate of the new node in each of the given runs, out of its potential delegations."""
+        assert False
+
+    def step(self, node, delegating, targets):
+        self.transitive_delegations[:, node] = node
+        self.weights[:, node] = 1
+        self.weights[delegating, node] = 0
+        if len(delegating) == 0:
+            return
+        voters = self.transitive_delegations[delegating, self.choose(delegating, targets)]
+        self.transitive_delegations[delegating, node] = voters
+        self.weights[delegating, voters] += 1
+        self.max_weight[delegating] = maximum(self.max_weight[delegating], self.weights[delegating, voters])
+
+
+class _NoChoiceRule(_OnlineRule):
+    def __init__(self, ensemble):
+        if ensemble.outdegree != 1:
+            raise ValueError("NoChoice mechanism can only be applied to graphs with outdegree 1.")
+        super().__init__(ensemble)
+
+    def choose(self, rows, targets):
+        return targets[:, 0]
+
+
+class _NewestDelegateRule(_OnlineRule):
+    def choose(self, rows, targets):
+        return targets.max(axis=1)
+
+
+class _RandomDelegationRule(_OnlineRule):
+    def __init__(self, ensemble):
+        super().__init__(ensemble)
+        self.rng = ensemble.rng.spawn(1)[0]
+
+    def choose(self, rows, targets):
+        return targets[arange(len(rows)), self.rng.integers(targets.shape[1], size=len(rows))]
+
+
+class _PowerOfChoiceRule(_OnlineRule):
+    def choose(self, rows, targets):
+        # Like GreedyPowerOfChoice, ties go to the first potential delegation
+        option_weights = self.weights[rows[:, None], self.transitive_delegations[rows[:, None], targets]]
+        return targets[arange(len(rows)), argmin(option_weights, axis=1)]
+
+
+RULES = [(NoChoice, _NoChoiceRule), (GreedyNewestDelegate, _NewestDelegateRule),
+         (GreedyRandomDelegation, _RandomDelegationRule), (GreedyPowerOfChoice, _PowerOfChoiceRule)]
+ENSEMBLE_MECHANISMS = [mechanism_class for mechanism_class, _ in RULES]
+
+
+def _rule_for(mechanism_class, ensemble):
+    for supported_class, rule_class in RULES:
+        if issubclass(mechanism_class, supported_class):
+            return rule_class(ensemble)
+    raise ValueError(f"Mechanism {mechanism_class.__name__} cannot be simulated in an ensemble.")
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -1,25 +1,406 @@
-from gurobipy import GRB, Model, quicksum
-
-from configure_gurobi import configure_gurobi
+from itertools import chain
+from math import ceil
+from time import perf_counter
+
+from gurobipy import GRB, Column, LinExpr, Model
+from numpy import (arange, array, bincount, concatenate, cumsum, flatnonzero, fromiter, full, int32, int64, ndarray,
+                   ones, repeat, where, zeros)
+from scipy.sparse import csr_matrix
+
+from configure_gurobi import configure_gurobi, debug_names
+from delegation_results import ConfluentDelegations, SplittableFlows
+from graph_algorithms import depth_first_forest, reaching_bounds, strongly_connected_components
+from graph_storage import deduplicated_adjacency
+from simple_mechanisms import GreedyPowerOfChoice
 from simulations import EPS, SplittableMechanism, ConfluentMechanism
 
 
-class SplittableFlow(SplittableMechanism):
+def _edge_arrays(unique_edges):
+    """Return whether every node is a voter, and the start and end of every edge, in the order of the edges."""
+    is_voter = array([edges is None for edges in unique_edges], dtype=bool)
+    outdegrees = array([0 if edges is None else len(edges) for edges in unique_edges], dtype=int64)
+    sources = repeat(arange(len(unique_edges)), outdegrees)
+    targets = fromiter(chain.from_iterable(edges for edges in unique_edges if edges is not None), int64,
+                       outdegrees.sum())
+    return is_voter, sources, targets
+
+
+def _flow_model(name, unique_edges, big_m=None, drop_single_choices=False):
+    """Build a flow model from sparse node-edge incidence matrices.
+
+    Variables and constraints are in the order in which they would be added one at a time: z, then the flow f(u, v) of
+    every edge (followed by its indicator x(u, v) if ``big_m`` is given). If ``big_m`` is given, every non-sink ``u``
+    contributes the rows ``f(u, v) - big_m * x(u, v) <= 0`` for its edges and ``Σ x(u, _) = 1``. Then, every node
+    contributes one row, ``Σ f(u, _) - Σ f(_, u) = 1`` for non-sinks ``u`` and ``Σ f(_, v) - z <= -1`` for sinks ``v``.
+    Flows are non-negative through their lower bound, and variables are only named if ``debug_names()``.
+
+    A non-sink with a single edge has to use it. If ``drop_single_choices``, its two indicator rows are left out;
+    instead, its indicator is fixed to one and M becomes the upper bound of its flow.
+
+    Args:
+        name (string): name of the model
+        unique_edges (list of (list of int / None)): adjacency list representation of the graph, without duplicates
+        big_m (int / numpy array of int / None): if given, all variables are integral and every edge has a binary
+                                                 indicator variable. Either one M for all edges, or one M per node
+                                                 for the edges leaving it.
+        drop_single_choices (bool): whether to replace the indicator rows of nodes with a single edge by bounds
+
+    Returns:
+        (Model, MVar, numpy array of bool, numpy array of int, numpy array of int):
+        (model minimizing z, all variables, for every node whether it is a voter, start and end of every edge)
+    """
+    is_voter, sources, targets = _edge_arrays(unique_edges)
+    num_nodes, num_edges = len(unique_edges), len(sources)
+    edges = arange(num_edges)
+    indicators = big_m is not None
+    flow_columns = 1 + (2 * edges if indicators else edges)
+
+    model = Model(name)
+    vtypes = full(1 + (2 if indicators else 1) * num_edges, GRB.INTEGER if indicators else GRB.CONTINUOUS)
+    upper_bounds = full(len(vtypes), GRB.INFINITY)
+    names = None
+    lower_bounds = zeros(len(vtypes))
+    if indicators:
+        vtypes[flow_columns + 1] = GRB.BINARY
+        upper_bounds[flow_columns + 1] = 1.
+        edge_big_m = big_m[sources] if isinstance(big_m, ndarray) else full(num_edges, float(big_m))
+        outdegrees = bincount(sources, minlength=num_nodes)
+        single = outdegrees[sources] == 1
+        if drop_single_choices:
+            lower_bounds[flow_columns[single] + 1] = 1.
+            upper_bounds[flow_columns[single]] = edge_big_m[single]
+    if debug_names():
+        names = full(len(vtypes), "z", dtype=object)
+        names[flow_columns] = [f"flow_{u}_{v}" for u, v in zip(sources.tolist(), targets.tolist())]
+        if indicators:
+            names[flow_columns + 1] = [f"x_{u}_{v}" for u, v in zip(sources.tolist(), targets.tolist())]
+        names = names.tolist()
+    variables = model.addMVar(len(vtypes), lb=lower_bounds, ub=upper_bounds, vtype=vtypes, name=names)
+    objective = zeros(len(vtypes))
+    objective[0] = 1.
+    variables.Obj = objective
+    model.ModelSense = GRB.MINIMIZE
+
+    if indicators:
+        delegators = flatnonzero(~is_voter)
+        ends = cumsum(outdegrees)
+        rank = cumsum(~is_voter) - 1  # number of earlier non-sinks, for non-sinks
+        bound_rows = edges + rank[sources]
+        choice_rows = ends[delegators] + rank[delegators]
+        rows = concatenate((bound_rows, bound_rows, choice_rows[rank[sources]]))
+        columns = concatenate((flow_columns, flow_columns + 1, flow_columns + 1))
+        values = concatenate((ones(num_edges), -edge_big_m, ones(num_edges)))
+        matrix = csr_matrix((values, (rows, columns)), shape=(num_edges + len(delegators), len(vtypes)))
+        senses = full(matrix.shape[0], GRB.LESS_EQUAL)
+        senses[choice_rows] = GRB.EQUAL
+        right_hand_sides = zeros(matrix.shape[0])
+        right_hand_sides[choice_rows] = 1.
+        if drop_single_choices:
+            kept = ones(matrix.shape[0], dtype=bool)
+            kept[bound_rows[single]] = False
+            kept[choice_rows[outdegrees[delegators] == 1]] = False
+            matrix, senses, right_hand_sides = matrix[kept], senses[kept], right_hand_sides[kept]
+        model.addMConstr(matrix, variables, senses, right_hand_sides)
+
+    # Outgoing flow counts positively for non-sinks, incoming flow negatively for non-sinks and positively for sinks
+    rows = concatenate((sources, targets, flatnonzero(is_voter)))
+    columns = concatenate((flow_columns, flow_columns, zeros(is_voter.sum(), dtype=int64)))
+    values = concatenate((ones(num_edges), where(is_voter[targets], 1., -1.), full(is_voter.sum(), -1.)))
+    balance = csr_matrix((values, (rows, columns)), shape=(num_nodes, len(vtypes)))
+    model.addMConstr(balance, variables, where(is_voter, GRB.LESS_EQUAL, GRB.EQUAL), where(is_voter, -1., 1.))
+    return model, variables, is_voter, sources, targets
+
+
+def _mip_start(start, sources, targets):
+    """Return z, and the flow and indicator of every edge, for feasible confluent delegations ``start``."""
+    if not isinstance(start, ConfluentDelegations):
+        start = ConfluentDelegations.from_list(start)
+    weights = start.subtree_weights()
+    indicators = (start.delegates[sources] == targets).astype(float)
+    return weights[start.delegates == ConfluentDelegations.VOTER].max().item(), weights[sources] * indicators, indicators
+
+
+def confluent_lower_bound(potential_delegations):
+    """Lower bound on the optimal maximum weight of confluent flow, found without solving a program.
+
+    The n nodes split among the voters, so some voter has weight at least ceil(n / number of voters). Moreover, every
+    node from which only a single voter is reachable must delegate to it. Whether this is the case is decided for
+    whole strongly connected components, which are visited after all components they reach.
+
+    >>> confluent_lower_bound([None, [0], [1], None, [0, 3]])
+    3
+    >>> confluent_lower_bound([None, None, [0, 1], [0, 1]])
+    2
+
+    Args:
+        potential_delegations (list of (list of int / None)): adjacency list representation of the graph, in which a
+                                                              voter is reachable from every node
+
+    Returns:
+        int: the lower bound
+    """
+    MANY = -1
+    num_nodes = len(potential_delegations)
+    reached = [MANY] * num_nodes  # the only voter reachable from a node, or MANY
+    forced = [0] * num_nodes  # for voters, the number of nodes that must delegate to them, including themselves
+    for scc in strongly_connected_components(potential_delegations):
+        if potential_delegations[scc[0]] is None:
+            reached[scc[0]] = scc[0]
+            forced[scc[0]] += 1
+            continue
+        members = set(scc)
+        voters = {reached[v] for u in scc for v in potential_delegations[u] if v not in members}
+        if len(voters) == 1 and MANY not in voters:
+            voter = voters.pop()
+            for u in scc:
+                reached[u] = voter
+            forced[voter] += len(scc)
+    num_voters = sum(delegations is None for delegations in potential_delegations)
+    return max(-(-num_nodes // num_voters), max(forced))
+
+
+class IncrementalFlowModel:
+    """Flow model of a growing graph, extended by the variables and constraints of new nodes instead of being rebuilt.
+
+    The model is the one of ``SplittableFlow.solve_flow`` or, if ``integral``, of ``ConfluentFlow.solve_flow``. The
+    flows of a new delegating node enter the conservation rows of their targets through their columns, so adding a
+    node costs time in its number of edges. Gurobi re-optimizes a modified LP from its previous basis; for the MILP, the
+    previous solution and a choice for every new node are installed as a MIP start, which Gurobi completes. In the MILP,
+    M only needs to be at least the number of nodes, so it is doubled whenever the graph outgrows it.
+
+    If ``monotone``, re-optimizing uses that appending nodes never lowers the optimum: no existing node delegates to a
+    new one, so every old solution restricted to the old nodes stays feasible. Conversely, the previous solution, with
+    every new delegating node sending its unit along any path, raises z by at most the number of new delegating nodes.
+    Re-optimizing therefore first asks whether the previous optimum is still achievable, with z fixed to it, which
+    Gurobi answers as soon as it finds any solution. Only if not, it minimizes with z bounded to the remaining range, so
+    after a single new delegating node, the MILP is again a feasibility problem.
+
+    >>> model = IncrementalFlowModel([None, None, [0, 1]], integral=True)
+    >>> model.optimize()
+    2.0
+    >>> model.add_node([2, 1])
+    >>> model.add_node(None)
+    >>> model.optimize(), model.confluent_delegations()
+    (2.0, [None, None, 0, 1, None])
+    >>> model = IncrementalFlowModel([None, None, [0, 1]], integral=True, monotone=True)
+    >>> model.optimize(), model.add_node([2]), model.optimize(), model.add_node([2]), model.optimize()
+    (2.0, None, 3.0, None, 4.0)
+    >>> model.add_node([0, 1]), model.optimize(), model.feasibility_answers
+    (None, 4.0, 1)
+
+    If the time out passes before the optimum is proven, no value is returned:
+
+    >>> from simulations import Graph
+    >>> graph = Graph(1., .5, 2, rng=0)
+    >>> _ = graph.grow(300)
+    >>> IncrementalFlowModel(graph.unique_potential_delegations, integral=True).optimize(time_out=1e-9)
+    Traceback (most recent call last):
+    TimeoutError
+
+    Attributes:
+        model (Model): the Gurobi model, minimizing z
+        integral (bool): whether the flows are confluent and integral
+        is_voter (list of bool): for every node, whether it is a voter
+        sources (list of int): start of every edge, in ascending order
+        targets (list of int): end of every edge
+        flows (list of Var): for every edge, its flow
+        indicators (list of Var): for every edge, whether it is used, only if ``integral``
+        big_m (int): M in the constraints f(u, v) <= M * x(u, v), only if ``integral``
+        monotone (bool): whether to re-optimize by first checking the feasibility of the previous optimum
+        optimum (float / None): the optimal z found by the last call of ``optimize``, None before
+        feasibility_answers (int): number of re-optimizations in which the previous optimum was still feasible, only
+                                   counted if ``monotone``
+    """
+
+    def __init__(self, unique_edges, integral=False, monotone=False):
+        configure_gurobi()
+        self.model = Model("incremental_confluent_flow" if integral else "incremental_splittable_flow")
+        self.model.ModelSense = GRB.MINIMIZE
+        self.integral = integral
+        self.z = self.model.addVar(obj=1., vtype=GRB.INTEGER if integral else GRB.CONTINUOUS, name="z")
+        self.is_voter = []
+        self.sources = []
+        self.targets = []
+        self.flows = []
+        self.indicators = []
+        self._conservation = []  # for every node, its conservation constraint
+        self._big_m_constraints = []
+        self.big_m = 2 * len(unique_edges)
+        self.monotone = monotone
+        self.optimum = None
+        self.feasibility_answers = 0
+        self._new_delegating_nodes = 0
+        self._changed = True
+
+        # Add all rows first, since potential delegations of existing nodes need not point to earlier nodes
+        for edges in unique_edges:
+            self._add_row(edges is None)
+        for u, edges in enumerate(unique_edges):
+            if edges is not None:
+                self._add_edges(u, edges)
+
+    def _add_row(self, is_voter):
+        self.is_voter.append(is_voter)
+        if is_voter:
+            self._conservation.append(self.model.addLConstr(LinExpr([-1.], [self.z]), GRB.LESS_EQUAL, -1.))
+        else:
+            self._conservation.append(self.model.addLConstr(LinExpr(), GRB.EQUAL, 1.))
+
+    def _add_edges(self, u, edges):
+        vtype = GRB.INTEGER if self.integral else GRB.CONTINUOUS
+        indicators = []
+        for v in edges:
+            column = Column([1., 1. if self.is_voter[v] else -1.], [self._conservation[u], self._conservation[v]])
+            flow = self.model.addVar(vtype=vtype, column=column)
+            self.sources.append(u)
+            self.targets.append(v)
+            self.flows.append(flow)
+            if self.integral:
+                x = self.model.addVar(vtype=GRB.BINARY)
+                self._big_m_constraints.append(self.model.addLConstr(flow - self.big_m * x, GRB.LESS_EQUAL, 0.))
+                indicators.append(x)
+        if self.integral:
+            self.model.addLConstr(LinExpr([1.] * len(indicators), indicators), GRB.EQUAL, 1.)
+            self.indicators.extend(indicators)
+            indicators[0].Start = 1.  # completed by Gurobi to a feasible MIP start, given the previous solution
+            for x in indicators[1:]:
+                x.Start = 0.
+        self._changed = True
+
+    def add_node(self, edges):
+        """Add a node whose potential delegations, without duplicates, point to existing nodes; None for a voter."""
+        u = len(self.is_voter)
+        assert edges is None or all(v < u for v in edges)
+        self._add_row(edges is None)
+        if edges is not None:
+            self._add_edges(u, edges)
+            self._new_delegating_nodes += 1
+        if self.integral and len(self.is_voter) > self.big_m:
+            self.big_m *= 2
+            for constraint, x in zip(self._big_m_constraints, self.indicators):
+                self.model.chgCoeff(constraint, x, -self.big_m)
+
+    def optimize(self, time_out=None, start=None):
+        """Re-optimize if nodes were added since the last call, and return the optimal maximum weight z.
+
+        Args:
+            time_out (float / None): time out in seconds, None for unbounded running time
+            start (list of (int / None) / ConfluentDelegations / None): for the MILP, feasible delegations to install
+                                                                        as MIP start instead of the previous solution,
+                                                                        with their maximum weight as cutoff
+
+        Raises:
+            TimeoutError: if the time out passes before the optimum is proven, in which case ``optimum`` is unchanged
+        """
+        if self._changed:
+            begin = perf_counter()
+            self.model.setParam("TimeLimit", GRB.INFINITY if time_out is None else time_out)
+            cutoff = GRB.INFINITY
+            if start is not None and self.integral and self.flows:
+                z, flows, indicators = _mip_start(start, array(self.sources), array(self.targets))
+                self.z.Start = z
+                self.model.setAttr("Start", self.flows, flows.tolist())
+                self.model.setAttr("Start", self.indicators, indicators.tolist())
+                cutoff = z + .5  # z is integral, so solutions as good as the start pass
+            self.model.setParam("Cutoff", cutoff)
+            if self.monotone and self.optimum is not None:
+                self._optimize_monotone(time_out, begin)
+            else:
+                self.model.optimize()
+            if self.integral and self.indicators and self.model.SolCount > 0:
+                self.model.setAttr("Start", self.indicators, self.model.getAttr("X", self.indicators))
+            if self.model.Status != GRB.OPTIMAL:  # an incumbent found before the time out need not be optimal
+                raise TimeoutError
+            self.optimum = self.z.X
+            self._new_delegating_nodes = 0
+            self._changed = False
+        return self.optimum
+
+    def _optimize_monotone(self, time_out, begin):
+        self.z.LB = self.z.UB = self.optimum
+        self.model.optimize()
+        if self.model.Status == GRB.OPTIMAL:
+            self.feasibility_answers += 1
+            return
+        if self.model.Status not in (GRB.INFEASIBLE, GRB.INF_OR_UNBD, GRB.CUTOFF):  # cutoff if a start is installed
+            raise TimeoutError
+        if time_out is not None:  # both solves share the time out
+            remaining = time_out - (perf_counter() - begin)
+            if remaining <= 0:
+                raise TimeoutError
+            self.model.setParam("TimeLimit", remaining)
+        self.z.LB = self.optimum + 1 if self.integral else self.optimum
+        self.z.UB = self.optimum + self._new_delegating_nodes
+        self.model.optimize()
+
+    def _edge_solution(self):
+        is_voter = array(self.is_voter, dtype=bool)
+        sources = array(self.sources, dtype=int64)
+        targets = array(self.targets, dtype=int64)
+        values = array(self.model.getAttr("X", self.flows)) if self.flows else zeros(0)
+        return is_voter, sources, targets, values
+
+    def splittable_flows(self):
+        """Return the flows of the last solution as ``SplittableFlows``."""
+        is_voter, sources, targets, values = self._edge_solution()
+        positive = values > EPS
+        return SplittableFlows.from_edges(is_voter, sources[positive], targets[positive], values[positive])
+
+    def confluent_delegations(self):
+        """Return the delegations of the last solution as ``ConfluentDelegations``."""
+        is_voter, sources, targets, values = self._edge_solution()
+        used = values > EPS
+        delegates = full(len(is_voter), ConfluentDelegations.VOTER, dtype=int32)
+        delegates[sources[used]] = targets[used]
+        assert used.sum() == (~is_voter).sum()
+        return ConfluentDelegations(delegates)
+
+
+class _IncrementalFlowMechanism:
+    """Mixin keeping an ``IncrementalFlowModel`` up to date while observing the graph, if ``incremental``.
+
+    If ``monotone``, the model is kept as well and re-optimized by first checking whether the previous optimum is still
+    feasible, see ``IncrementalFlowModel``.
+    """
+
+    def __init__(self, graph, incremental=False, monotone=False):
+        super().__init__(graph)
+        self.flow_model = None
+        if incremental or monotone:
+            self.flow_model = IncrementalFlowModel(graph.unique_potential_delegations, not self.is_splittable(),
+                                                   monotone)
+
+    def notify_of_added_voting_node(self):
+        if self.flow_model is not None:
+            self.flow_model.add_node(None)
+
+    def notify_of_added_delegating_node(self, potential_delegations):
+        super().notify_of_added_delegating_node(potential_delegations)
+        if self.flow_model is not None:
+            self.flow_model.add_node(list(dict.fromkeys(potential_delegations)))
+
+
+class SplittableFlow(_IncrementalFlowMechanism, SplittableMechanism):
+    """Optimal splittable flow, solved from scratch at every call or, if ``incremental``, kept as a growing model."""
+
     PLOT_COLOR = "#9C27B0"
     PLOT_ABBREVIATION = "s"
     PLOT_LABEL = "optimal splittable flow"
     PLOT_PATTERN = "solid"
 
     @staticmethod
-    def solve_flow(potential_delegations):
+    def solve_flow(potential_delegations, predecessors=None):
         """Minimize congestion for splittable flow by solving a linear program.
         Assumes that a sink is reachable from every node.
 
         Args:
             potential_delegations (list of (list of int / None)): adjacency list representation of the graph
+            predecessors (list of (list of int) / None): for every node, the nodes with an edge to it, each listed
+                                                         once. If given, ``potential_delegations`` must not contain
+                                                         duplicates, e.g. ``Graph.unique_potential_delegations``.
 
         Returns:
-            (list of ((dict of int → float) / None), float): (splittable flow, maximum congestion)
+            (SplittableFlows, float): (splittable flow, maximum congestion)
 
         >>> SplittableFlow.solve_flow([None, [0], [1, 1], None])
         ([None, {0: 2.0}, {1: 1.0}, None], 3.0)
@@ -41,74 +422,150 @@ class SplittableFlow(SplittableMechanism):
         (The sums range over the implicit argument denoted by an underscore.)
         """
 
-        unique_edges = []
-        for delegations in potential_delegations:
-            if delegations is None:
-                unique_edges.append(None)
-            else:
-                unique_edges.append(list(set(delegations)))
+        if predecessors is None:
+            unique_edges, predecessors = deduplicated_adjacency(potential_delegations)
+        else:
+            unique_edges = potential_delegations
 
         configure_gurobi()
-        model = Model("splittable_flow")
-        z = model.addVar(vtype=GRB.CONTINUOUS, name="z")
+        model, variables, is_voter, sources, targets = _flow_model("splittable_flow", unique_edges)
+        model.optimize()
 
-        predecessors = {i: set() for i in range(len(unique_edges))}
-        flow = {}
-        for u, edges in enumerate(unique_edges):
-            if edges is not None:
-                for v in edges:
-                    flow[(u, v)] = model.addVar(vtype=GRB.CONTINUOUS, name=f"flow_{u}_{v}")
-                    model.addConstr(flow[(u, v)] >= 0)
-                    predecessors[v].add(u)
+        solution = variables.X  # in bulk, as a numpy array
+        z, values = solution[0].item(), solution[1:]
+        assert (bincount(sources, weights=values, minlength=len(unique_edges))[~is_voter] >= 1 - EPS).all()
+        positive = values > EPS
+        return SplittableFlows.from_edges(is_voter, sources[positive], targets[positive], values[positive]), z
 
-        for u, edges in enumerate(unique_edges):
-            if edges is not None:
-                model.addConstr(
-                    quicksum(flow[(u, v)] for v in edges) == quicksum(flow[(v, u)] for v in predecessors[u]) + 1)
-            else:
-                model.addConstr(z >= quicksum(flow[(v, u)] for v in predecessors[u]) + 1)
+    def get_delegations(self, time_out=None):
+        if self.flow_model is not None:
+            self.flow_model.optimize(time_out)
+            return self.flow_model.splittable_flows()
+        return self.solve_flow(self.graph.unique_potential_delegations, predecessors=self.graph.predecessors)[0]
 
-        model.setObjective(z, GRB.MINIMIZE)
-        model.optimize()
+    def current_max_weight(self, time_out=None):
+        """Return the optimal maximum congestion, i.e., the objective value of the linear program."""
+        if self.flow_model is not None:
+            return self.flow_model.optimize(time_out)
+        return self.solve_flow(self.graph.unique_potential_delegations, predecessors=self.graph.predecessors)[1]
 
-        flow_list = []
-        for u, edges in enumerate(unique_edges):
-            if edges is None:
-                flow_list.append(None)
-            else:
-                out_flow = {}
-                assert sum(flow[(u, v)].X for v in edges) >= 1 - EPS
-                for v in edges:
-                    if flow[(u, v)].X > EPS:
-                        out_flow[v] = flow[(u, v)].X
-                flow_list.append(out_flow)
-        return flow_list, z.X
 
-    def get_delegations(self, time_out=None):
-        return self.solve_flow(self.graph.potential_delegations)[0]
+class Probe:
+    """Statistics of one probe of ``ConfluentFlow.search_flow``.
+
+    Attributes:
+        z (int): the maximum weight Z whose feasibility was decided
+        feasible (bool): whether a confluent flow with maximum weight at most Z exists
+        runtime (float): solver time in seconds
+        nodes (int): number of branch-and-bound nodes explored
+    """
+
+    def __init__(self, z, feasible, runtime, nodes):
+        self.z = z
+        self.feasible = feasible
+        self.runtime = runtime
+        self.nodes = nodes
+
+    def __repr__(self):
+        return f"Probe(z={self.z}, feasible={self.feasible}, runtime={self.runtime:.3f}, nodes={self.nodes})"
 
 
-class ConfluentFlow(ConfluentMechanism):
+class ConfluentFlow(_IncrementalFlowMechanism, ConfluentMechanism):
+    """Optimal confluent flow, solved from scratch at every call or, if ``incremental``, kept as a growing model.
+
+    If ``bounds``, the MILP is only solved when cheap bounds leave the optimum open. The upper bound is the maximum
+    weight of the best heuristic delegations; the lower bounds are ``confluent_lower_bound`` and the ceiled optimum of
+    the splittable LP relaxation, tried in this order. If a lower bound meets the upper bound, the heuristic
+    delegations are optimal and returned right away, which is counted in ``short_circuits``.
+
+    If ``search``, the MILP is replaced by feasibility probes as in ``search_flow``, which are collected in ``probes``.
+
+    >>> from simulations import Graph
+    >>> graph = Graph(1., .5, 2, rng=0)
+    >>> bounded = ConfluentFlow(graph, bounds=True)
+    >>> _ = graph.grow(100)
+    >>> bounded.current_max_weight() == ConfluentFlow(graph).current_max_weight(), bounded.short_circuits
+    (True, 1)
+    """
+
     PLOT_COLOR = "#3F51B5"
     PLOT_ABBREVIATION = "c"
     PLOT_LABEL = "optimal confluent flow"
     PLOT_PATTERN = "solid"
 
+    def __init__(self, graph, incremental=False, heuristics=(), monotone=False, bounds=False, tight=False,
+                 search=False):
+        """
+        Args:
+            graph (Graph): the observed graph
+            incremental (bool): whether to keep the model alive across calls, see ``IncrementalFlowModel``
+            heuristics (list of type): confluent mechanism classes, such as ``GreedyPowerOfChoice``, run alongside on
+                                       the graph. Before every solve, the best of their delegations is installed as
+                                       MIP start and cutoff.
+            monotone (bool): whether to keep the model alive and answer each update by checking if the previous
+                             optimum is still feasible
+            bounds (bool): whether to skip the MILP when lower bounds prove the heuristic delegations optimal. Without
+                           ``heuristics``, ``GreedyPowerOfChoice`` provides the upper bound.
+            tight (bool): whether to solve the tight formulation of ``solve_flow``, which per-edge M values make
+                          expensive to keep up to date in a growing model, so it only applies without ``incremental``
+                          and ``monotone``
+            search (bool): whether to find the optimum by ``search_flow``, which applies under the same conditions as
+                           ``tight``
+        """
+        super().__init__(graph, incremental, monotone)
+        if bounds and not heuristics:
+            heuristics = (GreedyPowerOfChoice,)
+        self.heuristics = [heuristic_class(graph) for heuristic_class in heuristics]
+        self.start_weight = None
+        self.relaxation = None
+        if bounds:
+            self.relaxation = SplittableFlow(graph, monotone=self.flow_model is not None)
+        self.short_circuits = 0
+        self.tight = tight
+        self.search = search
+        self.probes = []
+
+    def _heuristic_start(self):
+        """Return the delegations of the heuristic with least maximum weight, kept in ``start_weight``, or None."""
+        start = None
+        for heuristic in self.heuristics:
+            delegations = heuristic.get_delegations()
+            weight = heuristic.max_weight_from_delegations(delegations)
+            if start is None or weight < self.start_weight:
+                start, self.start_weight = delegations, weight
+        return start
+
+    def _bounds_meet(self):
+        """Return whether the lower bounds prove ``start_weight`` optimal, if bounding is enabled."""
+        if self.relaxation is None:
+            return False
+        if (confluent_lower_bound(self.graph.unique_potential_delegations) < self.start_weight
+                and ceil(self.relaxation.current_max_weight() - EPS) < self.start_weight):
+            return False
+        self.short_circuits += 1
+        return True
+
     @staticmethod
     def is_splittable():
         return False
 
     @staticmethod
-    def solve_flow(potential_delegations, time_out=None):
+    def solve_flow(potential_delegations, time_out=None, predecessors=None, start=None, tight=False):
         """Minimize congestion for confluent flow by solving a Mixed Integer Linear Program.
         Assumes that a sink is reachable from every node.
 
         Args:
             potential_delegations (list of (list of int / None)): adjacency list representation of the graph
             time_out (float / None): Timeout in seconds, None for unbounded running time
+            predecessors (list of (list of int) / None): as in ``SplittableFlow.solve_flow``
+            start (list of (int / None) / ConfluentDelegations / None): feasible delegations, e.g. of a heuristic, to
+                                                                        install as MIP start. Their maximum weight
+                                                                        becomes a cutoff, so that the search skips
+                                                                        all worse solutions.
+            tight (bool): whether to use the tighter formulation below
 
         Returns:
-            (list of (int / None), float): (optimal flow, maximum congestion)
+            (ConfluentDelegations, float): (optimal flow, maximum congestion)
 
         >>> ConfluentFlow.solve_flow([None, [0], [1, 1], None])
         ([None, 0, 1, None], 3)
@@ -116,6 +573,10 @@ class ConfluentFlow(ConfluentMechanism):
         ([None, None, 0, 1], 2)
         >>> ConfluentFlow.solve_flow([None, None, [0, 1]])[1]
         2
+        >>> ConfluentFlow.solve_flow([None, None, [0, 1], [1]], start=[None, None, 1, 1])
+        ([None, None, 0, 1], 2)
+        >>> ConfluentFlow.solve_flow([None, [0], [1, 1], None], tight=True)
+        ([None, 0, 1, None], 3)
         
         MILP variables:
             z = minimization objective, equal to maximum weight of any sink
@@ -133,57 +594,176 @@ class ConfluentFlow(ConfluentMechanism):
             f(u, v) <= M * x(u, v)    ∀ adjacent u, v
             Σ x(u, _) = 1             ∀ non-sinks u
         (The sums range over the implicit argument denoted by an underscore.)
+
+        A single M is large enough for every edge, but makes the LP relaxation weak: x(u, v) = f(u, v) / M is tiny. The
+        tight formulation instead uses for every edge (u, v) the least M that is valid on its own: the flow through u
+        is at most ``reaching_bounds``, a bound on the number of nodes that can reach u, and at most U - 1 for an upper
+        bound U on the optimal z. Here, U is the weight of the start or of delegations along a depth-first forest of the
+        reverse graph, whichever is smaller, and these delegations are installed as MIP start. z is also bounded from
+        below by ``confluent_lower_bound``. Nodes with a single edge must use it, so their indicator rows are replaced
+        by bounds.
         """
 
-        unique_edges = []
-        for delegations in potential_delegations:
-            if delegations is None:
-                unique_edges.append(None)
-            else:
-                unique_edges.append(list(set(delegations)))
+        if predecessors is None:
+            unique_edges, predecessors = deduplicated_adjacency(potential_delegations)
+        else:
+            unique_edges = potential_delegations
 
         configure_gurobi()
-        model = Model("confluent_flow")
-        z = model.addVar(vtype=GRB.INTEGER, name="z")
-        M = len(unique_edges)
-
-        predecessors = {i: set() for i in range(len(unique_edges))}
-        flow = {}
-        x = {}
-        for u, edges in enumerate(unique_edges):
-            if edges is not None:
-                for v in edges:
-                    flow[(u, v)] = model.addVar(vtype=GRB.INTEGER, name=f"flow_{u}_{v}")
-                    model.addConstr(flow[(u, v)] >= 0)
-                    x[(u, v)] = model.addVar(vtype=GRB.BINARY, name=f"x_{u}_{v}")
-                    predecessors[v].add(u)
-                    model.addConstr(flow[(u, v)] <= M * x[(u, v)])
-                model.addConstr(quicksum(x[(u, v)] for v in edges) == 1)
-
-        for u, edges in enumerate(unique_edges):
-            if edges is not None:
-                model.addConstr(
-                    quicksum(flow[(u, v)] for v in edges) == quicksum(flow[(v, u)] for v in predecessors[u]) + 1)
-            else:
-                model.addConstr(z >= quicksum(flow[(v, u)] for v in predecessors[u]) + 1)
+        upper_bound = None
+        if tight:  # the start must respect the M values derived from the upper bound
+            start, upper_bound = ConfluentFlow._upper_bound(unique_edges, predecessors, start)
+        model, variables, is_voter, sources, targets = ConfluentFlow._model(unique_edges, predecessors, upper_bound)
 
-        model.setObjective(z, GRB.MINIMIZE)
         if time_out is not None:
             model.setParam('TimeLimit', time_out)
+        if start is not None:
+            z, flows, indicators = _mip_start(start, sources, targets)
+            values = zeros(len(variables.tolist()))
+            values[0], values[1::2], values[2::2] = z, flows, indicators
+            variables.Start = values
+            model.setParam("Cutoff", z + .5)  # z is integral, so solutions as good as the start pass
         model.optimize()
 
-        delegations = [None for _ in unique_edges]
-        for u, edges in enumerate(unique_edges):
-            if edges is not None:
-                for v in edges:
-                    if flow[(u, v)].X > EPS:
-                        assert delegations[u] is None
-                        delegations[u] = v
+        return ConfluentFlow._delegations(variables, is_voter, sources, targets), round(variables[0].X.item())
+
+    @staticmethod
+    def search_flow(potential_delegations, time_out=None, predecessors=None, start=None, tight=False):
+        """Minimize congestion for confluent flow by a search on the maximum weight Z, deciding one Z at a time.
+
+        Deciding whether some confluent flow has maximum weight at most Z is easier for the solver than minimizing: with
+        z fixed to Z, the MILP of ``solve_flow`` becomes a feasibility problem, and Gurobi stops at its first solution.
+        The search starts with the lower bound L, the larger of ``confluent_lower_bound`` and the ceiled optimum of the
+        splittable LP, and the upper bound U, the weight of the better of ``start`` and delegations along a
+        depth-first forest of the reverse graph. Since L is often optimal, the search gallops upwards from L, probing
+        L, L + 2, L + 6, ..., until a probe is feasible, and then bisects. A feasible probe lowers U to the weight of
+        the solution found, an infeasible probe Z raises L to Z + 1, until L = U.
+
+        >>> ConfluentFlow.search_flow([None, [0], [1, 1], None])[:2]
+        ([None, 0, 1, None], 3)
+        >>> delegations, z, probes = ConfluentFlow.search_flow([None, None, [0, 1], [0, 1], [2, 3]])
+        >>> z, [(probe.z, probe.feasible) for probe in probes]
+        (3, [(3, True)])
 
-        return delegations, round(z.X)
+        Args:
+            potential_delegations (list of (list of int / None)): adjacency list representation of the graph
+            time_out (float / None): Timeout in seconds for all probes together, None for unbounded running time
+            predecessors (list of (list of int) / None): as in ``SplittableFlow.solve_flow``
+            start (list of (int / None) / ConfluentDelegations / None): feasible delegations, e.g. of a heuristic,
+                                                                        that may lower the initial upper bound
+            tight (bool): whether to probe the tight formulation of ``solve_flow``
+
+        Returns:
+            (ConfluentDelegations, int, list of Probe): (optimal flow, maximum congestion, the probes in order)
+
+        Raises:
+            TimeoutError: if the time out passes before the search ends
+        """
+        if predecessors is None:
+            unique_edges, predecessors = deduplicated_adjacency(potential_delegations)
+        else:
+            unique_edges = potential_delegations
+
+        configure_gurobi()
+        best, upper_bound = ConfluentFlow._upper_bound(unique_edges, predecessors, start)
+        lower_bound = max(confluent_lower_bound(unique_edges),
+                          ceil(SplittableFlow.solve_flow(unique_edges, predecessors)[1] - EPS))
+        model, variables, is_voter, sources, targets = ConfluentFlow._model(unique_edges, predecessors,
+                                                                            upper_bound if tight else None)
+        model.setParam("SolutionLimit", 1)
+        z = variables[0]
+
+        probes = []
+        begin = perf_counter()
+        step = 1  # while galloping, else None
+        while lower_bound < upper_bound:
+            if time_out is not None:
+                remaining = time_out - (perf_counter() - begin)
+                if remaining <= 0:
+                    raise TimeoutError
+                model.setParam("TimeLimit", remaining)
+            probe_z = min(lower_bound + step - 1, upper_bound - 1) if step else (lower_bound + upper_bound) // 2
+            z.LB = z.UB = probe_z
+            model.optimize()
+            if model.SolCount > 0:
+                best = ConfluentFlow._delegations(variables, is_voter, sources, targets)
+                upper_bound = ConfluentMechanism.max_weight_from_delegations(best)
+                step = None
+            elif model.Status in (GRB.INFEASIBLE, GRB.INF_OR_UNBD):
+                lower_bound = probe_z + 1
+                step = step and 2 * step
+            else:
+                raise TimeoutError
+            probes.append(Probe(probe_z, model.SolCount > 0, model.Runtime, int(model.NodeCount)))
+
+        if not isinstance(best, ConfluentDelegations):
+            best = ConfluentDelegations.from_list(best)
+        return best, upper_bound, probes
+
+    @staticmethod
+    def _upper_bound(unique_edges, predecessors, start=None):
+        """Return feasible delegations, the better of ``start`` and a depth-first forest, and their maximum weight."""
+        voters = [node for node, edges in enumerate(unique_edges) if edges is None]
+        best = depth_first_forest(predecessors, voters)
+        weight = ConfluentMechanism.max_weight_from_delegations(best)
+        if start is not None and ConfluentMechanism.max_weight_from_delegations(start) < weight:
+            best, weight = start, ConfluentMechanism.max_weight_from_delegations(start)
+        return best, weight
+
+    @staticmethod
+    def _model(unique_edges, predecessors, upper_bound=None):
+        """Build the MILP of ``solve_flow``, in the tight formulation if an upper bound on z is given."""
+        if upper_bound is None:
+            return _flow_model("confluent_flow", unique_edges, big_m=len(unique_edges))
+        big_m = array(reaching_bounds(predecessors, upper_bound - 1))
+        model, variables, is_voter, sources, targets = _flow_model("confluent_flow", unique_edges, big_m=big_m,
+                                                                   drop_single_choices=True)
+        variables[0].LB = confluent_lower_bound(unique_edges)
+        variables[0].UB = upper_bound
+        return model, variables, is_voter, sources, targets
+
+    @staticmethod
+    def _delegations(variables, is_voter, sources, targets):
+        """Read the delegations off the solution of the MILP."""
+        solution = variables.X  # in bulk, as a numpy array
+        used = solution[1::2] > EPS
+        delegates = full(len(is_voter), ConfluentDelegations.VOTER, dtype=int32)
+        delegates[sources[used]] = targets[used]
+        assert used.sum() == (~is_voter).sum() and (delegates[~is_voter] >= 0).all()
+        return ConfluentDelegations(delegates)
 
     def get_delegations(self, time_out=None):
-        return self.solve_flow(self.graph.potential_delegations, time_out)[0]
+        start = self._heuristic_start()
+        if self._bounds_meet():
+            return start
+        if self.flow_model is not None:
+            self.flow_model.optimize(time_out, start)
+            return self.flow_model.confluent_delegations()
+        if self.search:
+            result = self.search_flow(self.graph.unique_potential_delegations, time_out,
+                                      predecessors=self.graph.predecessors, start=start, tight=self.tight)
+            self.probes.extend(result[2])
+            return result[0]
+        return self.solve_flow(self.graph.unique_potential_delegations, time_out,
+                               predecessors=self.graph.predecessors, start=start, tight=self.tight)[0]
+
+    def current_max_weight(self, time_out=None):
+        """Return the optimal maximum weight, i.e., the objective value of the MILP."""
+        start = self._heuristic_start()
+        if self._bounds_meet():
+            return self.start_weight
+        if self.flow_model is not None:
+            return round(self.flow_model.optimize(time_out, start))
+        if self.search:
+            result = self.search_flow(self.graph.unique_potential_delegations, time_out,
+                                      predecessors=self.graph.predecessors, start=start, tight=self.tight)
+            self.probes.extend(result[2])
+            return result[1]
+        return self.solve_flow(self.graph.unique_potential_delegations, time_out,
+                               predecessors=self.graph.predecessors, start=start, tight=self.tight)[1]
+
+
+INCREMENTAL_MECHANISMS = (SplittableFlow, ConfluentFlow)
 
 
 if __name__ == "__main__":
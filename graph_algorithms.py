@@ -0,0 +1,249 @@
+"""Iterative graph algorithms shared by the mechanisms.
+
+All algorithms use an explicit stack and, for every node, the position of the next edge to explore, so they run in time
+O(n + m) and work on graphs of any depth without hitting Python's recursion limit. Graphs are given in adjacency list
+representation, where None stands for a node without outgoing edges (such as a voter in ``potential_delegations``).
+"""
+
+
+def strongly_connected_components(graph, roots=None):
+    """Generate the strongly connected components (SCCs) of a graph by Tarjan's algorithm.
+
+    Each SCC is generated as soon as it is complete, i.e. after all SCCs reachable from it, so the SCCs come in reverse
+    topological order of the DAG of SCCs. Since the generator is lazy, stopping early saves the remaining work.
+
+    >>> list(strongly_connected_components([[1], [2], [0, 3], None]))
+    [[3], [0, 1, 2]]
+    >>> list(strongly_connected_components([None, [0], [1, 2]], roots=[2]))
+    [[0], [1], [2]]
+    >>> len(list(strongly_connected_components([None] + [[i] for i in range(100000)])))
+    100001
+
+    Args:
+        graph (list of ((list of int) / None)): graph in adjacency list representation
+        roots (iterable of int / None): nodes to start depth-first searches from, in this order, defaulting to all
+                                        nodes. Only SCCs reachable from the roots are generated.
+
+    Yields:
+        list of int: the nodes of an SCC, in the order in which the search discovered them
+    """
+    num_nodes = len(graph)
+    if roots is None:
+        roots = range(num_nodes)
+    dfs_num = [-1] * num_nodes  # counter when visiting node, -1 if unvisited
+    dfs_low = [0] * num_nodes  # lowest dfs_num reachable from the DFS subtree of node through nodes on the stack
+    in_stack = [False] * num_nodes
+    next_edge = [0] * num_nodes
+    stack = []
+    counter = 0
+
+    for root in roots:
+        if dfs_num[root] >= 0:
+            continue
+        dfs_num[root] = dfs_low[root] = counter
+        counter += 1
+        stack.append(root)
+        in_stack[root] = True
+        call_stack = [root]
+        while call_stack:
+            node = call_stack[-1]
+            neighbors = graph[node] or ()
+            if next_edge[node] < len(neighbors):
+                neighbor = neighbors[next_edge[node]]
+                next_edge[node] += 1
+                if dfs_num[neighbor] < 0:
+                    dfs_num[neighbor] = dfs_low[neighbor] = counter
+                    counter += 1
+                    stack.append(neighbor)
+                    in_stack[neighbor] = True
+                    call_stack.append(neighbor)
+                elif in_stack[neighbor]:
+                    dfs_low[node] = min(dfs_low[node], dfs_num[neighbor])
+                continue
+
+            call_stack.pop()
+            if call_stack:
+                parent = call_stack[-1]
+                dfs_low[parent] = min(dfs_low[parent], dfs_low[node])
+            if dfs_low[node] == dfs_num[node]:  # new SCC found with node as root
+                scc = []
+                while True:
+                    member = stack.pop()
+                    in_stack[member] = False
+                    scc.append(member)
+                    if member == node:
+                        break
+                scc.reverse()
+                yield scc
+
+
+def sink_strongly_connected_component(graph):
+    """Compute a strongly connected component (SCC) that is a sink in the DAG of SCCs.
+
+    Isolated sinks are not reported. The function assumes that all sinks are isolated.
+
+    >>> sink_strongly_connected_component([[1], [2], [0]])
+    [0, 1, 2]
+    >>> sink_strongly_connected_component([[1], [2], [1]])
+    [1, 2]
+    >>> sink_strongly_connected_component([[], [2], [1]])
+    [1, 2]
+
+    Args:
+        graph (list of ((list of int) / None)): graph in adjacency list representation
+
+    Returns:
+        list of int: the nodes of the SCC
+    """
+    roots = (node for node, neighbors in enumerate(graph) if neighbors)
+    scc = next(strongly_connected_components(graph, roots), None)
+    assert scc is not None
+    return scc
+
+
+def cycle_longer_than_two(graph):
+    """Find a cycle of length at least three, ignoring cycles of length two, by depth-first search.
+
+    An edge back to the node from which the search just came closes a cycle of length two and is skipped. Any other
+    edge to a node on the current search path closes a longer cycle.
+
+    >>> cycle_longer_than_two([[1], [2], [0]])
+    [0, 1, 2, 0]
+    >>> cycle_longer_than_two([[1], [0], [0]])
+
+    >>> cycle_longer_than_two([[4], [2], [3], [1], [0]])
+    [1, 2, 3, 1]
+    >>> cycle_longer_than_two([[]])
+
+    >>> cycle_longer_than_two([[1], [2], [3], [2]])
+
+    >>> cycle_longer_than_two([[1], [2], [3], [4], [1]])
+    [1, 2, 3, 4, 1]
+    >>> cycle_longer_than_two([[], [0, 0, 2], [0, 3], [1, 0]])
+    [1, 2, 3, 1]
+    >>> cycle_longer_than_two([[], [2], [3], [0]])
+
+
+    Args:
+        graph (list of ((list of int) / None)): graph in adjacency list representation, without self-loops
+
+    Returns:
+        list of int / None: node indices of a cycle, where the first element is the successor of the last and also
+                            appears as the last element, or None if there is no such cycle
+    """
+    num_nodes = len(graph)
+    UNVISITED, ON_PATH, LEFT = 0, 1, 2
+    state = [UNVISITED] * num_nodes
+    position = [0] * num_nodes  # position of node on the current search path
+    next_edge = [0] * num_nodes
+
+    for root in range(num_nodes):
+        if state[root] != UNVISITED:
+            continue
+        state[root] = ON_PATH
+        path = [root]
+        while path:
+            node = path[-1]
+            neighbors = graph[node] or ()
+            if next_edge[node] < len(neighbors):
+                neighbor = neighbors[next_edge[node]]
+                next_edge[node] += 1
+                assert neighbor != node
+                if state[neighbor] == LEFT or (len(path) >= 2 and neighbor == path[-2]):
+                    continue
+                if state[neighbor] == ON_PATH:
+                    cycle = path[position[neighbor]:] + [neighbor]
+                    assert len(cycle) >= 4
+                    return cycle
+                state[neighbor] = ON_PATH
+                position[neighbor] = len(path)
+                path.append(neighbor)
+            else:
+                state[node] = LEFT
+                path.pop()
+
+    return None
+
+
+def depth_first_forest(graph, roots, labels=None):
+    """Grow a depth-first search tree from each root in turn, never entering a node twice.
+
+    All roots are marked as visited before the first search starts, so no root ends up in the tree of another.
+
+    >>> depth_first_forest([[1, 2], [3], [3], []], [0])
+    [None, 0, 0, 1]
+    >>> depth_first_forest([[3], [2, 3], [], []], [1, 0], labels=[0, 1, 1, 0])
+    [None, None, 1, 0]
+
+    Args:
+        graph (list of ((list of int) / None)): graph in adjacency list representation
+        roots (list of int): nodes to start from, in this order
+        labels (list / None): if given, a search only enters nodes with the same label as its root
+
+    Returns:
+        list of (int / None): for each node, the node from which the search entered it, or None for roots and nodes
+                              that were not reached
+    """
+    num_nodes = len(graph)
+    parents = [None] * num_nodes
+    visited = [False] * num_nodes
+    next_edge = [0] * num_nodes
+    for root in roots:
+        visited[root] = True
+
+    for root in roots:
+        label = None if labels is None else labels[root]
+        stack = [root]
+        while stack:
+            node = stack[-1]
+            neighbors = graph[node] or ()
+            if next_edge[node] < len(neighbors):
+                neighbor = neighbors[next_edge[node]]
+                next_edge[node] += 1
+                if visited[neighbor] or (labels is not None and labels[neighbor] != label):
+                    continue
+                visited[neighbor] = True
+                parents[neighbor] = node
+                stack.append(neighbor)
+            else:
+                stack.pop()
+
+    return parents
+
+
+def reaching_bounds(predecessors, cap):
+    """Bound for every node the number of nodes from which it can be reached, including itself, capped at ``cap``.
+
+    The nodes reaching a node are its strongly connected component (SCC) together with the nodes reaching its
+    predecessors outside of it. In the reverse graph, Tarjan's algorithm generates every SCC after the SCCs of all these
+    predecessors, so the bound of an SCC is its size plus the bounds of these predecessors. Where their sets of reaching
+    nodes overlap, this counts nodes more than once, but it takes only O(n + m) time and memory, unlike the exact
+    counts. Bounds above ``cap`` are lowered to it.
+
+    >>> reaching_bounds([[1, 2], [3], [3], []], cap=10)
+    [5, 2, 2, 1]
+    >>> reaching_bounds([[1], [0], [1]], cap=10)
+    [2, 2, 3]
+    >>> reaching_bounds([[1], [0], [1]], cap=2)
+    [2, 2, 2]
+
+    Args:
+        predecessors (list of ((list of int) / None)): for every node, the nodes with an edge to it
+        cap (int): maximum bound
+
+    Returns:
+        list of int: for every node, an upper bound on the number of nodes from which it can be reached
+    """
+    bounds = [0] * len(predecessors)
+    for scc in strongly_connected_components(predecessors):
+        members = set(scc)
+        outside = {predecessor for node in scc for predecessor in predecessors[node] or () if predecessor not in members}
+        bound = min(cap, len(scc) + sum(bounds[predecessor] for predecessor in outside))
+        for node in scc:
+            bounds[node] = bound
+    return bounds
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -1,7 +1,7 @@
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 from subprocess import Popen, PIPE
-from numpy.random import seed
-from simulations import Graph
+from graph_export import FORMATS, write_graph
+from simulations import Graph, iteration_rng
 
 if __name__ == "__main__":
     parser = ArgumentParser(description=("Generate example graphs via preferential attachment and render them with "
@@ -17,8 +17,14 @@ if __name__ == "__main__":
                         help='k > 0 (int)')
     parser.add_argument('-sd', type=int, default=0,
                         help='random seed (int)')
+    parser.add_argument('-f', type=str, default="pdf", choices=("pdf",) + FORMATS,
+                        help='output format, "pdf" renders the graph with GraphViz (str)')
+    parser.add_argument('-vf', type=float, default=1.0,
+                        help='fraction of voters to draw, sampled at random (float)')
+    parser.add_argument('-cv', action='store_true',
+                        help='collapse all voters without incoming potential delegations into a single node')
     parser.add_argument('-o', type=str, default=None,
-                        help='output path for plot, defaulting to "/data/graphs/DESCRIPTION.pdf" (str)')
+                        help='output path for plot, defaulting to "/data/graphs/DESCRIPTION.FORMAT" (str)')
     args = parser.parse_args()
 
     time = args.time
@@ -29,15 +35,21 @@ if __name__ == "__main__":
     plot_path = args.o
 
     if plot_path is None:
-        plot_path = f"data/graphs/k{k}d{round(d * 100)}g{round(gamma * 100)}.pdf"
+        plot_path = f"data/graphs/k{k}d{round(d * 100)}g{round(gamma * 100)}.{args.f}"
 
-    seed(sd)
-    a = Graph(gamma, d, k)
-    for _ in range(time - 1):
-        a.add_node()
-    dot = Popen(["dot", "-Tpdf", "-Kdot", "-o", plot_path],
-                stdin=PIPE)
-    # unflatten stacks voters without delegations to make the aspect ratio less wide
-    # Change parameter 3 to change stacking height
-    unf = Popen(["unflatten", "-c", "3"], stdin=PIPE, stdout=dot.stdin)
-    unf.communicate(input=a.to_dot().encode("ascii"))
+    a = Graph(gamma, d, k, rng=iteration_rng(sd, 0, 0))
+    a.grow(time - 1)
+    export_rng = iteration_rng(sd, 0, 1)
+    if args.f != "pdf":
+        write_graph(a, plot_path, args.f, args.vf, args.cv, export_rng)
+    else:
+        dot = Popen(["dot", "-Tpdf", "-Kdot", "-o", plot_path],
+                    stdin=PIPE)
+        # unflatten stacks voters without delegations to make the aspect ratio less wide
+        # Change parameter 3 to change stacking height
+        unf = Popen(["unflatten", "-c", "3"], stdin=PIPE, stdout=dot.stdin)
+        dot.stdin.close()  # only unflatten writes to dot
+        write_graph(a, unf.stdin, "dot", args.vf, args.cv, export_rng)
+        unf.stdin.close()
+        unf.wait()
+        dot.wait()
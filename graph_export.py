@@ -0,0 +1,154 @@
+"""Streaming export of delegation graphs to GraphViz DOT, GraphML and plain edge lists.
+
+The output is assembled and written in chunks of nodes, so exporting a graph takes time linear in its size and memory
+independent of it. To make large graphs renderable, voters can be subsampled, and voters without any incoming
+potential delegation can be collapsed into a single node.
+"""
+
+from io import TextIOBase
+
+from numpy import count_nonzero, flatnonzero, ones, unique, zeros
+from numpy.random import default_rng
+
+FORMATS = ("dot", "graphml", "edges")
+DEFAULT_CHUNK_SIZE = 2 ** 16
+DELEGATOR_COLOR = "#3F51B5"
+VOTER_COLOR = "#F44336"
+COLLAPSED_VOTERS = "voters"
+
+
+def write_graph(graph, out, file_format="dot", voter_fraction=1., collapse_isolated_voters=False, rng=None,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write the graph of potential delegations to a file or pipe, one chunk of nodes at a time.
+
+    Duplicate potential delegations are written once. Edges to voters that are not sampled are dropped.
+
+    >>> from io import StringIO
+    >>> from simulations import Graph
+    >>> graph = Graph(1., .5, 2, rng=0)
+    >>> graph.add_voter()
+    >>> graph.add_preferential_node()
+    >>> graph.add_voter()
+    >>> out = StringIO()
+    >>> write_graph(graph, out, "edges")
+    >>> sorted(set(graph.potential_delegations[2])) == [int(v) for v in out.getvalue().split()[1::2]]
+    True
+    >>> out = StringIO()
+    >>> write_graph(graph, out, collapse_isolated_voters=True)
+    >>> "voters [shape=box" in out.getvalue() and '"1 voter"' in out.getvalue()
+    True
+
+    Args:
+        graph (Graph): graph to export
+        out (string / file object): path of the output file, or a text or binary file object such as the stdin of a
+                                    subprocess, which is neither flushed nor closed
+        file_format (string): one of ``FORMATS``
+        voter_fraction (float between 0 and 1): each voter is kept independently with this probability
+        collapse_isolated_voters (bool): whether to replace all kept voters without incoming potential delegations by
+                                         a single node labeled with their number
+        rng (numpy.random.Generator / int / None): randomness for subsampling voters, defaulting to
+                                                   ``graph.spawn_rng()``
+        chunk_size (int): number of nodes written at once
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format}, expected one of {', '.join(FORMATS)}.")
+    if isinstance(out, str):
+        with open(out, "w", encoding="ascii") as file:
+            write_graph(graph, file, file_format, voter_fraction, collapse_isolated_voters, rng, chunk_size)
+        return
+    if isinstance(out, TextIOBase):
+        write = out.write
+    else:
+        def write(text):
+            out.write(text.encode("ascii"))
+
+    is_voter, shown, collapsed = _select_nodes(graph, voter_fraction, collapse_isolated_voters, rng, chunk_size)
+    if file_format == "dot":
+        _write_dot(graph, write, is_voter, shown, collapsed, chunk_size)
+    elif file_format == "graphml":
+        _write_graphml(graph, write, is_voter, shown, collapsed, chunk_size)
+    else:
+        for sources, targets in _edge_chunks(graph, shown, chunk_size):
+            write("".join(f"{u} {v}\n" for u, v in zip(sources.tolist(), targets.tolist())))
+
+
+def _select_nodes(graph, voter_fraction, collapse_isolated_voters, rng, chunk_size):
+    """Decide which nodes are written individually.
+
+    Returns:
+        (numpy array of bool, numpy array of bool, int): (for every node whether it is a voter, for every node whether
+                                                          it is written, number of collapsed voters)
+    """
+    assert 0. <= voter_fraction <= 1.
+    is_voter = graph.voters()
+    shown = ones(len(is_voter), dtype=bool)
+    if voter_fraction < 1.:
+        if rng is None:
+            rng = graph.spawn_rng()
+        shown[is_voter] = default_rng(rng).random(count_nonzero(is_voter)) < voter_fraction
+
+    collapsed = 0
+    if collapse_isolated_voters:
+        has_predecessor = zeros(len(is_voter), dtype=bool)
+        for start in range(0, len(is_voter), chunk_size):
+            _, targets = graph.edges(start, min(start + chunk_size, len(is_voter)))
+            has_predecessor[targets] = True
+        isolated = is_voter & shown & ~has_predecessor
+        collapsed = int(count_nonzero(isolated))
+        shown &= ~isolated
+    return is_voter, shown, collapsed
+
+
+def _edge_chunks(graph, shown, chunk_size):
+    """Yield the distinct potential delegations between written nodes, sorted, as arrays (sources, targets)."""
+    number_of_nodes = len(shown)
+    for start in range(0, number_of_nodes, chunk_size):
+        sources, targets = graph.edges(start, min(start + chunk_size, number_of_nodes))
+        kept = shown[targets]
+        keys = unique(sources[kept].astype("int64") * number_of_nodes + targets[kept])
+        if len(keys):
+            yield keys // number_of_nodes, keys % number_of_nodes
+
+
+def _node_chunks(nodes, chunk_size):
+    for start in range(0, len(nodes), chunk_size):
+        yield nodes[start:start + chunk_size].tolist()
+
+
+def _write_dot(graph, write, is_voter, shown, collapsed, chunk_size):
+    write("digraph {\n")
+    write(f"node [shape=circle color=\"{DELEGATOR_COLOR}\" style=filled label=\"\"];")
+    for nodes in _node_chunks(flatnonzero(~is_voter), chunk_size):
+        write("".join(f" {i};" for i in nodes))
+    write(f"\nnode [shape=circle color=\"{VOTER_COLOR}\" style=filled label=\"\"];")
+    for nodes in _node_chunks(flatnonzero(is_voter & shown), chunk_size):
+        write("".join(f" {i};" for i in nodes))
+    if collapsed > 0:
+        write(f"\n{COLLAPSED_VOTERS} [shape=box label=\"{collapsed} voter{'s' if collapsed != 1 else ''}\"];")
+    write("\nedge [color=\"#000000\" arrowhead=open penwidth=1];\n")
+    for sources, targets in _edge_chunks(graph, shown, chunk_size):
+        write("".join(f"{u} -> {v};\n" for u, v in zip(sources.tolist(), targets.tolist())))
+    write("}\n")
+
+
+def _write_graphml(graph, write, is_voter, shown, collapsed, chunk_size):
+    write('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+          '<key id="voter" for="node" attr.name="voter" attr.type="boolean"><default>false</default></key>\n'
+          '<key id="count" for="node" attr.name="count" attr.type="int"><default>1</default></key>\n'
+          '<graph id="G" edgedefault="directed">\n')
+    for nodes in _node_chunks(flatnonzero(~is_voter), chunk_size):
+        write("".join(f'<node id="n{i}"/>\n' for i in nodes))
+    for nodes in _node_chunks(flatnonzero(is_voter & shown), chunk_size):
+        write("".join(f'<node id="n{i}"><data key="voter">true</data></node>\n' for i in nodes))
+    if collapsed > 0:
+        write(f'<node id="{COLLAPSED_VOTERS}"><data key="voter">true</data><data key="count">{collapsed}</data>'
+              f'</node>\n')
+    for sources, targets in _edge_chunks(graph, shown, chunk_size):
+        write("".join(f'<edge source="n{u}" target="n{v}"/>\n' for u, v in zip(sources.tolist(), targets.tolist())))
+    write("</graph>\n</graphml>\n")
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -0,0 +1,401 @@
+"""Compact array-backed storage of append-only delegation graphs.
+
+A graph with n nodes and m potential delegations takes about 4 bytes per edge and 20 bytes per node, instead of
+several hundred bytes per node for Python lists of boxed integers.
+"""
+
+from collections.abc import Sequence
+from os import makedirs
+from os.path import join, samefile
+
+from numpy import arange, bitwise_or, diff, dtype, empty, flatnonzero, memmap, repeat, unique, unpackbits, uint8, zeros
+
+INITIAL_CAPACITY = 16
+ARRAY_DTYPES = {"offsets": "int64", "targets": "int32", "voter_bits": "uint8", "degrees": "int32",
+                "weights": "float64"}
+
+
+class CompactStorage:
+    """Nodes and potential delegations of a graph in NumPy arrays that grow by amortized doubling.
+
+    Potential delegations are stored in compressed sparse row (CSR) format: the potential delegations of node i are
+    ``targets[offsets[i]:offsets[i + 1]]``, which is empty for voters. Targets are stored as int32; the offsets are
+    int64 so that the number of edges is not limited.
+
+    >>> from numpy import array
+    >>> storage = CompactStorage(1.)
+    >>> storage.append_voter()
+    >>> storage.append_block(array([False, True, False]), array([0, 2, 2, 4]), array([0, 0, 2, 1]))
+    >>> [storage.potential_delegations(i) for i in range(storage.number_of_nodes)]
+    [None, [0, 0], None, [2, 1]]
+    >>> storage.degrees[:storage.number_of_nodes].tolist()
+    [3, 2, 2, 1]
+
+    Attributes:
+        gamma (float): exponent of preferential attachment, used for the weights
+        number_of_nodes (int): number of stored nodes
+        number_of_edges (int): number of stored potential delegations
+        offsets (numpy array of int64): CSR offsets, valid up to index number_of_nodes
+        targets (numpy array of int32): CSR targets, valid up to index number_of_edges
+        voter_bits (numpy array of uint8): bit mask of voters, bit i % 8 of byte i // 8 is set iff node i is a voter
+        degrees (numpy array of int32): degree of each node, i.e., one plus its number of incoming edges
+        weights (numpy array of float64): weights[i] = degrees[i] ** gamma
+    """
+
+    __slots__ = ("gamma", "number_of_nodes", "number_of_edges", "offsets", "targets", "voter_bits", "degrees",
+                 "weights")
+
+    def __init__(self, gamma):
+        self.gamma = gamma
+        self.number_of_nodes = 0
+        self.number_of_edges = 0
+        for name, length in self._array_lengths(INITIAL_CAPACITY, INITIAL_CAPACITY).items():
+            setattr(self, name, zeros(length, dtype=ARRAY_DTYPES[name]))
+
+    @staticmethod
+    def _array_lengths(number_of_nodes, number_of_edges):
+        return {"offsets": number_of_nodes + 1, "targets": number_of_edges, "voter_bits": (number_of_nodes + 7) // 8,
+                "degrees": number_of_nodes, "weights": number_of_nodes}
+
+    def array_lengths(self):
+        """Return a dict mapping the name of each array to the length of its valid part."""
+        return self._array_lengths(self.number_of_nodes, self.number_of_edges)
+
+    def _resize(self, name, length):
+        """Replace an array by a longer copy, padded with zeros."""
+        array = getattr(self, name)
+        resized = zeros(length, dtype=array.dtype)
+        resized[:len(array)] = array
+        setattr(self, name, resized)
+
+    @staticmethod
+    def _grown_capacity(capacity, needed):
+        capacity = max(capacity, 1)
+        while needed > capacity:
+            capacity *= 2
+        return capacity
+
+    def save(self, directory):
+        """Write the valid part of every array to a raw binary file ``NAME.bin`` in ``directory``.
+
+        Returns:
+            dict: description of the arrays for the header of the snapshot, to be passed to ``load``
+        """
+        description = {}
+        for name, length in self.array_lengths().items():
+            array = getattr(self, name)
+            array[:length].tofile(join(directory, f"{name}.bin"))
+            description[name] = {"dtype": array.dtype.str, "length": length}
+        return description
+
+    @classmethod
+    def load(cls, directory, gamma, number_of_nodes, number_of_edges, description):
+        """Memory-map the arrays written by ``save``.
+
+        The arrays are mapped copy-on-write: they are read lazily and shared between processes, and changes (e.g.
+        increased degrees when the graph grows further) stay private to this process.
+        """
+        storage = cls.__new__(cls)
+        storage.gamma = gamma
+        storage.number_of_nodes = number_of_nodes
+        storage.number_of_edges = number_of_edges
+        for name in ARRAY_DTYPES:
+            array_dtype = dtype(description[name]["dtype"])
+            length = description[name]["length"]
+            if length == 0:  # empty files cannot be mapped
+                array = empty(0, dtype=array_dtype)
+            else:
+                array = memmap(join(directory, f"{name}.bin"), dtype=array_dtype, mode="c", shape=(length,))
+            setattr(storage, name, array)
+        return storage
+
+    def _reserve(self, number_of_nodes, number_of_edges):
+        """Make sure that the arrays can hold the given numbers of nodes and edges, growing them if needed."""
+        node_capacity = len(self.degrees)
+        edge_capacity = len(self.targets)
+        if number_of_nodes <= node_capacity and number_of_edges <= edge_capacity:
+            return
+        if number_of_nodes > node_capacity:
+            node_capacity = self._grown_capacity(node_capacity, number_of_nodes)
+        if number_of_edges > edge_capacity:
+            edge_capacity = self._grown_capacity(edge_capacity, number_of_edges)
+        for name, length in self._array_lengths(node_capacity, edge_capacity).items():
+            if length > len(getattr(self, name)):
+                self._resize(name, length)
+
+    def is_voter(self, node):
+        return bool((self.voter_bits[node >> 3] >> (node & 7)) & 1)
+
+    def voters(self):
+        """Return a numpy array of bool, indicating for every node whether it is a voter."""
+        return unpackbits(self.voter_bits, count=self.number_of_nodes, bitorder="little").astype(bool)
+
+    def potential_delegations(self, node):
+        """Return the potential delegations of ``node`` as a new list of int, or None for voters."""
+        if self.is_voter(node):
+            return None
+        return self.targets[self.offsets[node]:self.offsets[node + 1]].tolist()
+
+    def edges(self, start, stop):
+        """Return the potential delegations of the nodes ``start, …, stop - 1`` as two arrays (sources, targets)."""
+        offsets = self.offsets[start:stop + 1]
+        sources = repeat(arange(start, stop, dtype=self.targets.dtype), diff(offsets))
+        return sources, self.targets[offsets[0]:offsets[-1]]
+
+    def increment_degree(self, node):
+        self.degrees[node] += 1
+        self.weights[node] = self.degrees[node] ** self.gamma
+
+    def append_voter(self):
+        node = self.number_of_nodes
+        self._reserve(node + 1, self.number_of_edges)
+        self.voter_bits[node >> 3] |= 1 << (node & 7)
+        self._append_node(node)
+
+    def append_delegator(self, potential_delegations):
+        """Append a delegating node. Unlike ``append_block``, this does not update the degrees of its targets."""
+        node = self.number_of_nodes
+        number_of_edges = self.number_of_edges + len(potential_delegations)
+        self._reserve(node + 1, number_of_edges)
+        self.targets[self.number_of_edges:number_of_edges] = potential_delegations
+        self.number_of_edges = number_of_edges
+        self._append_node(node)
+
+    def _append_node(self, node):
+        self.offsets[node + 1] = self.number_of_edges
+        self.degrees[node] = 1
+        self.weights[node] = 1 ** self.gamma
+        self.number_of_nodes = node + 1
+
+    def append_block(self, is_voter, offsets, targets):
+        """Append consecutive nodes and increase the degrees of all their targets.
+
+        Args:
+            is_voter (numpy array of bool): for each new node, whether it is a voter
+            offsets (numpy array of int): CSR offsets of the new nodes, starting at zero
+            targets (numpy array of int): CSR targets of the new nodes
+        """
+        first = self.number_of_nodes
+        end = first + len(is_voter)
+        self._reserve(end, self.number_of_edges + len(targets))
+
+        self.offsets[first + 1:end + 1] = offsets[1:] + self.number_of_edges
+        self.targets[self.number_of_edges:self.number_of_edges + len(targets)] = targets
+        voters = flatnonzero(is_voter) + first
+        bitwise_or.at(self.voter_bits, voters >> 3, (1 << (voters & 7)).astype(uint8))
+        self.degrees[first:end] = 1
+        self.weights[first:end] = 1 ** self.gamma
+        self.number_of_nodes = end
+        self.number_of_edges += len(targets)
+
+        endpoints, counts = unique(targets, return_counts=True)
+        self.degrees[endpoints] += counts.astype("int32")
+        self.weights[endpoints] = self.degrees[endpoints] ** self.gamma
+
+
+def deduplicated_adjacency(potential_delegations):
+    """Remove duplicate potential delegations and compute the predecessors of every node.
+
+    >>> deduplicated_adjacency([None, [0, 0], [1, 0], None])
+    ([None, [0], [1, 0], None], [[1, 2], [2], [], []])
+
+    Args:
+        potential_delegations (list of ((list of int) / None)): adjacency list representation of the graph
+
+    Returns:
+        (list of ((list of int) / None), list of (list of int)):
+        (potential delegations without duplicates, for every node the nodes with an edge to it)
+    """
+    unique_edges = []
+    predecessors = [[] for _ in range(len(potential_delegations))]
+    for u, delegations in enumerate(potential_delegations):
+        if delegations is None:
+            unique_edges.append(None)
+        else:
+            edges = list(dict.fromkeys(delegations))
+            unique_edges.append(edges)
+            for v in edges:
+                predecessors[v].append(u)
+    return unique_edges, predecessors
+
+
+class AdjacencyIndex:
+    """Deduplicated potential delegations and reverse adjacency of an append-only graph, updated as nodes arrive.
+
+    Attributes:
+        unique_potential_delegations (list of ((list of int) / None)): potential delegations without duplicates
+        predecessors (list of (list of int)): for every node, all nodes with an edge to it, each listed once
+        in_degrees (list of int): for every node, the number of distinct nodes with an edge to it
+    """
+
+    __slots__ = ("unique_potential_delegations", "predecessors", "in_degrees")
+
+    def __init__(self, potential_delegations):
+        self.unique_potential_delegations, self.predecessors = deduplicated_adjacency(potential_delegations)
+        self.in_degrees = [len(preds) for preds in self.predecessors]
+
+    def append(self, potential_delegations):
+        """Add a node with the given potential delegations (None for a voter)."""
+        node = len(self.predecessors)
+        self.predecessors.append([])
+        self.in_degrees.append(0)
+        if potential_delegations is None:
+            self.unique_potential_delegations.append(None)
+        else:
+            edges = list(dict.fromkeys(potential_delegations))
+            self.unique_potential_delegations.append(edges)
+            for v in edges:
+                self.predecessors[v].append(node)
+                self.in_degrees[v] += 1
+
+
+class ComponentIndex:
+    """Weakly connected components of an append-only graph, maintained by union-find as nodes arrive.
+
+    Finding a root compresses the path to it, and the smaller component is always merged into the larger one, so each
+    operation takes amortized almost constant time. Every component is identified by its root, which can change when
+    the component is merged with another one.
+
+    >>> index = ComponentIndex([None, [0], None, None])
+    >>> index.append([2, 3])
+    >>> [index.find(node) for node in range(5)]
+    [0, 0, 2, 2, 2]
+    >>> sorted(sorted(nodes) for nodes in index.members.values())
+    [[0, 1], [2, 3, 4]]
+
+    Attributes:
+        parents (list of int): for every node, its parent in the union-find forest; roots are their own parents
+        members (dict of int → list of int): for every root, the nodes of its component in no particular order
+    """
+
+    __slots__ = ("parents", "members")
+
+    def __init__(self, potential_delegations):
+        self.parents = []
+        self.members = {}
+        for delegations in potential_delegations:
+            self.append(delegations)
+
+    def find(self, node):
+        """Return the root of the component of ``node``."""
+        root = node
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[node] != root:
+            self.parents[node], node = root, self.parents[node]
+        return root
+
+    def union(self, u, v):
+        """Merge the components of ``u`` and ``v`` and return the root of the merged component."""
+        u = self.find(u)
+        v = self.find(v)
+        if u == v:
+            return u
+        if len(self.members[u]) <= len(self.members[v]):  # on ties, the root of v remains a root
+            u, v = v, u
+        self.parents[v] = u
+        self.members[u].extend(self.members.pop(v))
+        return u
+
+    def append(self, potential_delegations):
+        """Add a node with the given potential delegations (None for a voter)."""
+        node = len(self.parents)
+        self.parents.append(node)
+        self.members[node] = [node]
+        if potential_delegations is not None:
+            for v in potential_delegations:
+                self.union(node, v)
+
+
+class OutOfCoreStorage(CompactStorage):
+    """Storage whose arrays are memory-mapped files, extended by a fixed number of nodes or edges at a time.
+
+    Nodes are streamed into the files and the operating system only needs to keep recently written pages in memory,
+    which allows for graphs much larger than the main memory. The files have the layout of a snapshot, so once
+    ``Graph.save`` has been called with the same directory, the graph can be opened with ``Graph.load``.
+
+    Attributes:
+        directory (string): directory holding the files
+        chunk_size (int): number of nodes (or edges) by which the arrays are extended
+    """
+
+    __slots__ = ("directory", "chunk_size")
+
+    def __init__(self, directory, gamma, chunk_size=2 ** 20):
+        makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.gamma = gamma
+        self.number_of_nodes = 0
+        self.number_of_edges = 0
+        for name, length in self._array_lengths(chunk_size, chunk_size).items():
+            self._map(name, length)
+
+    def _map(self, name, length):
+        path = join(self.directory, f"{name}.bin")
+        with open(path, "ab") as file:
+            file.truncate(length * dtype(ARRAY_DTYPES[name]).itemsize)  # extended with zeros
+        setattr(self, name, memmap(path, dtype=ARRAY_DTYPES[name], mode="r+", shape=(length,)))
+
+    def _resize(self, name, length):
+        getattr(self, name).flush()
+        setattr(self, name, None)
+        self._map(name, length)
+
+    def _grown_capacity(self, capacity, needed):
+        return -(-needed // self.chunk_size) * self.chunk_size
+
+    def save(self, directory):
+        """Flush the files if ``directory`` is their own directory, otherwise copy the arrays like the parent class."""
+        if not samefile(directory, self.directory):
+            return super().save(directory)
+        description = {}
+        for name, length in self.array_lengths().items():
+            getattr(self, name).flush()
+            description[name] = {"dtype": dtype(ARRAY_DTYPES[name]).str, "length": length}
+        return description
+
+
+class PotentialDelegationsView(Sequence):
+    """Read-only view on a ``CompactStorage`` in the format of ``list of ((list of int) / None)``.
+
+    Indexing a node creates a fresh list of its potential delegations, so modifying it does not change the graph.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def __len__(self):
+        return self._storage.number_of_nodes
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("node index out of range")
+        return self._storage.potential_delegations(index)
+
+    def __iter__(self):
+        storage = self._storage
+        offsets = storage.offsets[:storage.number_of_nodes + 1].tolist()
+        targets = storage.targets[:storage.number_of_edges].tolist()
+        for node, is_voter in enumerate(storage.voters().tolist()):
+            if is_voter:
+                yield None
+            else:
+                yield targets[offsets[node]:offsets[node + 1]]
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, PotentialDelegationsView)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -0,0 +1,175 @@
+from heapq import heappop, heappush
+from time import perf_counter
+
+from delegation_results import ConfluentDelegations
+from simulations import ConfluentMechanism
+
+
+class LocalSearchDelegation(ConfluentMechanism):
+    """Greedy power of choice, improved by moving delegators away from the voter with maximum weight.
+
+    New nodes are assigned as by ``GreedyPowerOfChoice``. Before delegations are reported, a local search repeatedly
+    takes a voter ``a`` of maximum weight and, among all nodes ``u`` delegating to it transitively, looks for an
+    alternative potential delegation leading to another voter ``b``. Moving ``u`` along with all nodes delegating to
+    it (its subtree) shifts the subtree's weight from ``a`` to ``b``. The best move lowers ``max(weight(a),
+    weight(b))`` the most and is applied if it lowers it below the old weight of ``a``. The search stops when the
+    heaviest voter admits no improving move, so the result is a local optimum with respect to moving single subtrees.
+    Improvements are kept when the graph grows.
+
+    The heaviest voter is taken from a lazy max-heap of voter weights in logarithmic time, but moves are not
+    polylogarithmic: applying a move relabels the transitive delegates of the whole moved subtree and walks the paths
+    from its old and new delegate up to their voters, taking O(s + p + log n) time for a subtree of size s and paths of
+    total length p. Finding a move scans all potential delegations of all nodes delegating to the heaviest voter, which
+    takes O(W k) time for maximum weight W and outdegree k. Since W grows almost linearly in the number of nodes for
+    gamma = 1, a search with many moves can take quadratic time on large graphs; ``time_out`` bounds it.
+
+    >>> from simulations import Graph
+    >>> from simple_mechanisms import GreedyPowerOfChoice
+    >>> graph = Graph(1., .5, 2, rng=0)
+    >>> local_search, greedy = LocalSearchDelegation(graph), GreedyPowerOfChoice(graph)
+    >>> _ = graph.grow(500)
+    >>> local_search.current_max_weight() <= greedy.current_max_weight()
+    True
+    >>> local_search.current_max_weight() == local_search.max_weight_from_delegations(local_search.get_delegations())
+    True
+
+    Attributes:
+        delegations (list of (int / None)): for each node, the id of the node it delegates to; None for voters
+        transitive_delegations (list of int): for each node, the id of the voter it transitively delegates to
+        subtree_weights (list of int): for each node, the number of nodes transitively delegating through it, including
+                                       itself; for a voter, this is its weight
+        children (list of (set of int)): for each node, the nodes delegating to it
+        heap (list of (int, int)): entries (-weight, voter), which may be outdated; for every voter, the entry with its
+                                   current weight is present
+        moves (int): number of moves applied so far
+    """
+
+    PLOT_COLOR = "#009688"
+    PLOT_ABBREVIATION = "l"
+    PLOT_LABEL = "local search"
+    PLOT_PATTERN = "solid"
+
+    def __init__(self, graph):
+        super().__init__(graph)
+        self.delegations = []
+        self.transitive_delegations = []
+        self.subtree_weights = []
+        self.children = []
+        self.heap = []
+        self.moves = 0
+        for node in range(graph.number_of_nodes()):
+            if graph.is_voter(node):
+                self._add_voter()
+            else:
+                self._add_delegator(graph.potential_delegations[node])
+
+    @staticmethod
+    def is_splittable():
+        return False
+
+    def _add_voter(self):
+        number = len(self.delegations)
+        self.delegations.append(None)
+        self.transitive_delegations.append(number)
+        self.subtree_weights.append(1)
+        self.children.append(set())
+        heappush(self.heap, (-1, number))
+
+    def _add_delegator(self, potential_delegations):
+        number = len(self.delegations)
+        delegate = min(potential_delegations,
+                       key=lambda option: self.subtree_weights[self.transitive_delegations[option]])
+        assert delegate < number, "Potential delegations must point to earlier nodes."
+        self.delegations.append(delegate)
+        self.transitive_delegations.append(self.transitive_delegations[delegate])
+        self.subtree_weights.append(1)
+        self.children.append(set())
+        self.children[delegate].add(number)
+        self._add_along_path(delegate, 1)
+
+    def _add_along_path(self, node, weight):
+        """Add ``weight`` to the subtree weights of ``node`` and its transitive delegates, and update the heap."""
+        while self.delegations[node] is not None:
+            self.subtree_weights[node] += weight
+            node = self.delegations[node]
+        self.subtree_weights[node] += weight
+        heappush(self.heap, (-self.subtree_weights[node], node))
+
+    def _heaviest_voter(self):
+        while -self.heap[0][0] != self.subtree_weights[self.heap[0][1]]:
+            heappop(self.heap)
+        return self.heap[0][1]
+
+    def _subtree(self, node):
+        nodes = [node]
+        for member in nodes:
+            nodes.extend(self.children[member])
+        return nodes
+
+    def _best_move(self, voter):
+        """Return the best improving move (node, new delegate) away from ``voter``, or None if there is none."""
+        weight = self.subtree_weights[voter]
+        best_weight = weight
+        best_move = None
+        for node in self._subtree(voter)[1:]:
+            moved = self.subtree_weights[node]
+            if weight - moved >= best_weight:
+                continue
+            for option in self.graph.potential_delegations[node]:
+                other_voter = self.transitive_delegations[option]
+                if other_voter == voter:
+                    continue  # includes all nodes in the subtree of node, so the move cannot close a cycle
+                new_weight = max(weight - moved, self.subtree_weights[other_voter] + moved)
+                if new_weight < best_weight:
+                    best_weight = new_weight
+                    best_move = (node, option)
+        return best_move
+
+    def _move(self, node, delegate):
+        old_delegate = self.delegations[node]
+        moved = self.subtree_weights[node]
+        self.children[old_delegate].remove(node)
+        self._add_along_path(old_delegate, -moved)
+        self.delegations[node] = delegate
+        self.children[delegate].add(node)
+        self._add_along_path(delegate, moved)
+        voter = self.transitive_delegations[delegate]
+        for member in self._subtree(node):
+            self.transitive_delegations[member] = voter
+        self.moves += 1
+
+    def improve(self, time_out=None):
+        """Apply improving moves until the heaviest voter admits none, or until ``time_out`` seconds have passed."""
+        begin = perf_counter()
+        while time_out is None or perf_counter() - begin < time_out:
+            move = self._best_move(self._heaviest_voter())
+            if move is None:
+                return
+            self._move(*move)
+
+    def notify_of_added_voting_node(self):
+        self._add_voter()
+
+    def notify_of_added_delegating_node(self, potential_delegations):
+        super().notify_of_added_delegating_node(potential_delegations)
+        self._add_delegator(potential_delegations)
+
+    def notify_of_added_nodes(self, block):
+        for potential_delegations in block:
+            if potential_delegations is None:
+                self._add_voter()
+            else:
+                self._add_delegator(potential_delegations)
+
+    def get_delegations(self, time_out=None):
+        self.improve(time_out)
+        return ConfluentDelegations.from_list(self.delegations)
+
+    def current_max_weight(self, time_out=None):
+        self.improve(time_out)
+        return self.subtree_weights[self._heaviest_voter()]
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
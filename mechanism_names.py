@@ -1,10 +1,12 @@
 from approximate_confluent_flow import OnePlusLogTwoApproximation, OnePlusLnApproximation
 from fractional_integral_flow import ConfluentFlow, SplittableFlow
+from local_search import LocalSearchDelegation
 from simple_mechanisms import GreedyNewestDelegate, GreedyRandomDelegation, GreedyPowerOfChoice, NoChoice, \
     GeneralizedPowerOfChoice
 
 MECHANISMS_LIST = [NoChoice, GreedyNewestDelegate, GreedyPowerOfChoice, GreedyRandomDelegation, ConfluentFlow,
-                   SplittableFlow, OnePlusLogTwoApproximation, OnePlusLnApproximation, GeneralizedPowerOfChoice]
+                   SplittableFlow, OnePlusLogTwoApproximation, OnePlusLnApproximation, GeneralizedPowerOfChoice,
+                   LocalSearchDelegation]
 MECHANISMS = {m.PLOT_ABBREVIATION: m for m in MECHANISMS_LIST}
 
 
@@ -0,0 +1,92 @@
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from time import perf_counter
+
+from graph_storage import OutOfCoreStorage
+from mechanism_names import MECHANISMS
+from simple_mechanisms import GreedyNewestDelegate, GreedyPowerOfChoice, GreedyRandomDelegation, NoChoice
+from simulations import Graph, iteration_rng
+
+ONLINE_MECHANISMS = [NoChoice, GreedyNewestDelegate, GreedyPowerOfChoice, GreedyRandomDelegation]
+DEFAULT_CHUNK_SIZE = 2 ** 20
+
+
+def generate_out_of_core(path, gamma, d, outdegree, number_of_nodes, mechanism_classes=(),
+                         chunk_size=DEFAULT_CHUNK_SIZE, rng=None):
+    """Generate a graph too large for the main memory directly into a snapshot on disk.
+
+    Nodes are added in chunks of ``chunk_size`` by ``Graph.grow`` and streamed into memory-mapped files (see
+    ``OutOfCoreStorage``). The mechanisms observe the graph and consume one chunk at a time. The result can be opened
+    with ``Graph.load(path)``.
+
+    Besides the pages currently written, the following state stays in memory and grows with the number of nodes:
+
+    - the sampler: nothing for gamma = 0, 4 bytes per entry of the urn (one per unit of degree) for gamma = 1, and 24
+      bytes per node of NumPy arrays otherwise;
+    - ``NoChoice``, ``GreedyNewestDelegate`` and ``GreedyRandomDelegation``: 20 bytes per node of NumPy arrays;
+    - ``GreedyPowerOfChoice``: three Python lists, about 55 bytes per node.
+
+    Capacities double when full, so right after growing the NumPy arrays take up to twice their size. At 10^8 nodes,
+    a run with ``GreedyPowerOfChoice`` thus needs several GB of main memory even though the graph itself is on disk.
+
+    Args:
+        path (string): directory of the snapshot
+        gamma (float): gamma in the graph model
+        d (float): probability of delegating in the graph model
+        outdegree (int): k in the graph model
+        number_of_nodes (int): total number of nodes to generate
+        mechanism_classes (list of type): online mechanisms to run on the graph, out of ``ONLINE_MECHANISMS``
+        chunk_size (int): number of nodes generated at once and by which the files are extended
+        rng (numpy.random.Generator / numpy.random.SeedSequence / int / None): see ``Graph``
+
+    Returns:
+        (Graph, list of Mechanism): the generated graph and the mechanisms observing it
+    """
+    for mechanism_class in mechanism_classes:
+        if not issubclass(mechanism_class, tuple(ONLINE_MECHANISMS)):
+            raise ValueError(f"Mechanism {mechanism_class.__name__} cannot be run out of core.")
+
+    storage = OutOfCoreStorage(path, gamma, chunk_size)
+    storage.append_voter()
+    graph = Graph(gamma, d, outdegree, rng=rng, storage=storage)
+    mechanisms = [mechanism_class(graph) for mechanism_class in mechanism_classes]
+    while graph.number_of_nodes() < number_of_nodes:
+        graph.grow(min(chunk_size, number_of_nodes - graph.number_of_nodes()))
+    graph.save(path)
+
+    return graph, mechanisms
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=("Generate a very large graph out of core, save it as a snapshot and print the "
+                                         "maximum weights of online mechanisms on it."),
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('number_of_nodes', metavar='T', type=int,
+                        help='number of nodes > 0 (int)')
+    parser.add_argument('-g', type=float, default=1.0,
+                        help='gamma (float)')
+    parser.add_argument('-d', type=float, default=0.5,
+                        help='d \\in (0,1) (float)')
+    parser.add_argument('-k', type=int, default=2,
+                        help='k > 0 (int)')
+    parser.add_argument('-cs', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='chunk size (int)')
+    parser.add_argument('-sd', type=int, default=0,
+                        help='random seed (int)')
+    parser.add_argument('-m', type=str, default='p',
+                        help='mechanisms to use:\n' + "\n".join(f"{m.PLOT_ABBREVIATION}: {m.PLOT_LABEL};"
+                                                                for m in ONLINE_MECHANISMS))
+    parser.add_argument('-o', type=str, default=None,
+                        help='directory of the snapshot, defaulting to "data/graphs/DESCRIPTION" (str)')
+    args = parser.parse_args()
+
+    path = args.o
+    if path is None:
+        path = (f"data/graphs/ooc_T{args.number_of_nodes}_g{round(args.g * 100)}_k{args.k}_d{round(args.d * 100)}_"
+                f"sd{args.sd}")
+
+    begin = perf_counter()
+    graph, mechanisms = generate_out_of_core(path, args.g, args.d, args.k, args.number_of_nodes,
+                                             [MECHANISMS[x] for x in args.m], args.cs, iteration_rng(args.sd, 0, 0))
+    print(f"Generated {graph.number_of_nodes()} nodes in {perf_counter() - begin:.1f} s.")
+    for mechanism in mechanisms:
+        print(f"{mechanism.PLOT_LABEL}: {mechanism.current_max_weight()}")
@@ -5,13 +5,14 @@ from matplotlib import pyplot as plt, rc
 from matplotlib.ticker import FormatStrFormatter
 from numpy import arange
 from numpy import median
-from numpy.random import seed
 
+from ensemble import ENSEMBLE_MECHANISMS, Ensemble
 from mechanism_names import parse_mechanisms, describe_mechanisms
-from simulations import Graph
+from simulations import Graph, iteration_rng
 
 
-def plot_distribution_at_time(mechanism_classes, gamma, outdegree, d, time, num_runs, random_seed, plot_path=None):
+def plot_distribution_at_time(mechanism_classes, gamma, outdegree, d, time, num_runs, random_seed, plot_path=None,
+                              ensemble=False):
     """Plot a histogram of maximum weight frequencies at time T over many runs.
 
     Args:
@@ -23,6 +24,8 @@ def plot_distribution_at_time(mechanism_classes, gamma, outdegree, d, time, num_
         num_runs (int): number of runs at which to compute max degree at time T
         random_seed (int): seed for randomness
         plot_path (string / None): Output path for graphic. File extensions as allowed by matplotlib, e.g. pdf.
+        ensemble (bool): whether to simulate all runs in lockstep as an ``Ensemble``, which is much faster but only
+                         supports the mechanisms in ``ENSEMBLE_MECHANISMS`` and draws different random numbers
     """
 
     mechanism_abbrevs = ""
@@ -37,28 +40,26 @@ def plot_distribution_at_time(mechanism_classes, gamma, outdegree, d, time, num_
     rc('font', **{'family': 'serif', 'serif': ['Libertine']})
     rc('text', usetex=True)
 
-    seed(random_seed)
-
     mechanisms_history = {observer_class.PLOT_ABBREVIATION: [] for observer_class in mechanism_classes}
 
     assert num_runs > 0
-    for i in range(num_runs):
-        graph = Graph(gamma, d, outdegree)
-        mechanisms = [observer_class(graph) for observer_class in mechanism_classes]
-        print(i)
-        for t in range(2, time + 1):
-            graph.add_node()
-        for mechanism in mechanisms:
-            delegations = mechanism.get_delegations()
-            max_weight = mechanism.max_weight_from_delegations(delegations)
-            mechanisms_history[mechanism.PLOT_ABBREVIATION].append(max_weight)
+    if ensemble:
+        runs = Ensemble(num_runs, gamma, d, outdegree, time, mechanism_classes, rng=iteration_rng(random_seed, 0, 0))
+        runs.grow(time - 1)
+        for mechanism_class, max_weights in runs.max_weights().items():
+            mechanisms_history[mechanism_class.PLOT_ABBREVIATION] = max_weights.tolist()
+    else:
+        for i in range(num_runs):
+            graph = Graph(gamma, d, outdegree, rng=iteration_rng(random_seed, 0, i))
+            mechanisms = [observer_class(graph) for observer_class in mechanism_classes]
+            print(i)
+            graph.grow(time - 1)
+            for mechanism in mechanisms:
+                mechanisms_history[mechanism.PLOT_ABBREVIATION].append(mechanism.current_max_weight())
 
     all_max_weight_histories = []
-    mechanism_names = []
     for mechanism in mechanisms_history:
         all_max_weight_histories.append(mechanisms_history[mechanism])
-    for mechanism in mechanisms:
-        mechanism_names.append(mechanism.PLOT_LABEL)
 
     min_weight = floor(min(min(all_max_weight_histories)))
     max_weight = ceil(max(max(all_max_weight_histories)))
@@ -102,6 +103,9 @@ if __name__ == "__main__":
                         help='mechanisms to use:\n' + describe_mechanisms(False))
     parser.add_argument('-o', type=str, default=None,
                         help='write path for plot')
+    parser.add_argument('-e', action='store_true',
+                        help='simulate all runs at once, only for mechanisms ' +
+                             ''.join(m.PLOT_ABBREVIATION for m in ENSEMBLE_MECHANISMS))
 
     args = parser.parse_args()
 
@@ -119,4 +123,5 @@ if __name__ == "__main__":
     for gamma in gammas:
         for d in ds:
             for k in ks:
-                plot_distribution_at_time(mechanism_classes, gamma, k, d, time, num_runs, random_seed, plot_path)
+                plot_distribution_at_time(mechanism_classes, gamma, k, d, time, num_runs, random_seed, plot_path,
+                                          args.e)
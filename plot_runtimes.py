@@ -3,16 +3,17 @@ from math import ceil
 from time import process_time
 
 from matplotlib import pyplot as plt, rc
-from numpy.random import seed
 
+from fractional_integral_flow import ConfluentFlow
 from mechanism_names import parse_mechanisms, describe_mechanisms
 from plot_smoothened_traces import Setting
-from simulations import Graph
+from simulations import Graph, iteration_rng
 
 MECHANISM_TIMEOUT = 8 * 60
 
 
-def compare_runtimes(settings, time, random_seed, log_path=None, plot_path=None):
+def compare_runtimes(settings, time, random_seed, log_path=None, plot_path=None, heuristics=(), bounds=False,
+                     tight=False, search=False):
     """
     Args:
         settings (list of Setting): Description s of a setting
@@ -21,12 +22,30 @@ def compare_runtimes(settings, time, random_seed, log_path=None, plot_path=None)
         log_path (string / None): Desired path for log. Defaults to data/logs/TITLE.csv, where TITLE includes parameters
         plot_path (string / None): Desired path for graphics file. PDF extension is supported, other file formats may
                                   also work depending on matplotlib. Defaults to data/plots/TITLE.pdf
+        heuristics (list of type): confluent mechanism classes. If nonempty, settings that run ``ConfluentFlow`` also
+                                   run it seeded with the best delegations of these heuristics as MIP start and
+                                   cutoff, and the speedup over the unseeded runs is logged. The online running time
+                                   of the heuristics themselves is not counted.
+        bounds (bool): whether settings that run ``ConfluentFlow`` also run it with bounds that skip the MILP when they
+                       prove the heuristic delegations optimal. The number of skipped MILPs is logged.
+        tight (bool): whether settings that run ``ConfluentFlow`` also run it with the tight MILP formulation
+        search (bool): whether settings that run ``ConfluentFlow`` also run it as a search on the maximum weight,
+                       probing the tight formulation if ``tight``. The number of probes and their solver time are
+                       logged.
     """
 
     title = f"tsmo_T{time}_sd{random_seed}"
     for s in settings:
         title += (f"_({''.join(m.PLOT_ABBREVIATION for m in s.mechanisms)}_g{round(s.gamma * 100)}_k{s.outdegree}_"
                   f"d{round(s.d * 100)}_sz{s.step_size}_s{s.smoothing})")
+    if heuristics:
+        title += f"_h{''.join(h.PLOT_ABBREVIATION for h in heuristics)}"
+    if bounds:
+        title += "_b"
+    if tight:
+        title += "_t"
+    if search:
+        title += "_z"
     if log_path is None:
         log_path = f"data/logs/{title}.csv"
     if plot_path is None:
@@ -41,18 +60,31 @@ def compare_runtimes(settings, time, random_seed, log_path=None, plot_path=None)
     with open(log_path, 'w') as file:
         file.write(f"Runtimes: settings={settings}, T={time}, random_seed={random_seed}\n")
 
-        for s in settings:
-            seed(random_seed)
-
-            runtime_history_sum = [[0 for _ in range(ceil(time / s.step_size))] for _ in s.mechanisms]
+        for setting_index, s in enumerate(settings):
+            # (mechanism class, keyword arguments, label, line pattern) for every curve
+            variants = [(m, {}, m.PLOT_LABEL, m.PLOT_PATTERN) for m in s.mechanisms]
+            if heuristics and ConfluentFlow in s.mechanisms:
+                variants.append((ConfluentFlow, {"heuristics": heuristics},
+                                 f"{ConfluentFlow.PLOT_LABEL} with MIP start", "dashed"))
+            if bounds and ConfluentFlow in s.mechanisms:
+                variants.append((ConfluentFlow, {"heuristics": heuristics, "bounds": True},
+                                 f"{ConfluentFlow.PLOT_LABEL} with bounds", "dotted"))
+            if tight and ConfluentFlow in s.mechanisms:
+                variants.append((ConfluentFlow, {"tight": True}, f"{ConfluentFlow.PLOT_LABEL} (tight)", "dashdot"))
+            if search and ConfluentFlow in s.mechanisms:
+                variants.append((ConfluentFlow, {"heuristics": heuristics, "tight": tight, "search": True},
+                                 f"{ConfluentFlow.PLOT_LABEL} (search on z)", (0, (1, 3))))
+            runtime_history_sum = [[0 for _ in range(ceil(time / s.step_size))] for _ in variants]
+            short_circuits = [0 for _ in variants]
+            probes = [[] for _ in variants]
 
             for iteration in range(s.smoothing):
                 print(f"Iteration {iteration + 1} out of {s.smoothing}")
 
-                elapsed_time = [0. for _ in s.mechanisms]
-                graph = Graph(s.gamma, s.d, s.outdegree)
+                elapsed_time = [0. for _ in variants]
+                graph = Graph(s.gamma, s.d, s.outdegree, rng=iteration_rng(random_seed, setting_index, iteration))
 
-                mechanisms = [observer_class(graph) for observer_class in s.mechanisms]
+                mechanisms = [observer_class(graph, **kwargs) for observer_class, kwargs, _, _ in variants]
 
                 tick = -1
                 for t in range(1, time + 1):
@@ -78,19 +110,44 @@ def compare_runtimes(settings, time, random_seed, log_path=None, plot_path=None)
 
                             if time_out:
                                 runtime_history_sum[i] = runtime_history_sum[i][:tick]
-                                print(f"Mechanism {mechanism.PLOT_LABEL} timed out in iteration {iteration + 1} and "
+                                print(f"Mechanism {variants[i][2]} timed out in iteration {iteration + 1} and "
                                       f"at time {elapsed_time[i]} s.")
                                 continue
                             runtime_history_sum[i][tick] += duration
 
-            for i, mechanism in enumerate(s.mechanisms):
+                for i, mechanism in enumerate(mechanisms):
+                    short_circuits[i] += getattr(mechanism, "short_circuits", 0)
+                    probes[i].extend(getattr(mechanism, "probes", []))
+
+            for i, (mechanism, _, label, pattern) in enumerate(variants):
                 if len(runtime_history_sum[i]) == 0:
-                    print(f"Nothing to plot for {mechanism.PLOT_LABEL}, all iterations timed out.")
+                    print(f"Nothing to plot for {label}, all iterations timed out.")
                     continue
                 n = [x * s.step_size + 1 for x in range(len(runtime_history_sum[i]))]
                 average_runtime = [time / s.smoothing for time in runtime_history_sum[i]]
-                plt.plot(n, average_runtime, color=mechanism.PLOT_COLOR, label=mechanism.PLOT_LABEL,
-                         linestyle=mechanism.PLOT_PATTERN)
+                file.write(f"{setting_index},{label},{','.join(str(runtime) for runtime in average_runtime)}\n")
+                plt.plot(n, average_runtime, color=mechanism.PLOT_COLOR, label=label, linestyle=pattern)
+                if variants[i][1].get("bounds"):
+                    print(f"Bounds proved the heuristics optimal {short_circuits[i]} times for {label}.")
+                    file.write(f"{setting_index},{label} short-circuits,{short_circuits[i]}\n")
+                if variants[i][1].get("search"):
+                    feasible = sum(probe.feasible for probe in probes[i])
+                    print(f"{label} made {len(probes[i])} probes, {feasible} of them feasible, using "
+                          f"{sum(probe.runtime for probe in probes[i]):.2f} s and "
+                          f"{sum(probe.nodes for probe in probes[i])} branch-and-bound nodes.")
+                    file.write(f"{setting_index},{label} probes,{len(probes[i])},feasible,{feasible},runtime,"
+                               f"{sum(probe.runtime for probe in probes[i])},nodes,"
+                               f"{sum(probe.nodes for probe in probes[i])}\n")
+
+            if heuristics and ConfluentFlow in s.mechanisms:
+                cold = runtime_history_sum[s.mechanisms.index(ConfluentFlow)]
+                warm = runtime_history_sum[len(s.mechanisms)]
+                ticks = min(len(cold), len(warm))
+                if ticks > 0 and sum(warm[:ticks]) > 0:
+                    speedup = sum(cold[:ticks]) / sum(warm[:ticks])
+                    print(f"MIP starts speed up {ConfluentFlow.PLOT_LABEL} by a factor of {speedup:.2f} over the "
+                          f"first {ticks} ticks.")
+                    file.write(f"{setting_index},speedup from MIP starts,{speedup}\n")
 
     plt.legend(loc=2)
     plt.ylabel('average runtime (s)')
@@ -118,6 +175,16 @@ if __name__ == '__main__':
                         help='value of seed (int)')
     parser.add_argument('-m', type=str, default='prcsAa',
                         help='mechanisms to use:\n' + describe_mechanisms(False))
+    parser.add_argument('-hs', type=str, default='',
+                        help='heuristics whose best delegations seed an additional run of the confluent MILP ' +
+                             '(abbreviations as for -m)')
+    parser.add_argument('-b', action='store_true',
+                        help='additionally run the confluent MILP behind bounds that may prove the heuristics ' +
+                             'optimal, and log how often they do')
+    parser.add_argument('-t', action='store_true',
+                        help='additionally run the confluent MILP in its tight formulation')
+    parser.add_argument('-z', action='store_true',
+                        help='additionally run the confluent MILP as a search on the maximum weight')
     parser.add_argument('-ol', type=str, default=None,
                         help='write path for log')
     parser.add_argument('-o', type=str, default=None,
@@ -134,8 +201,10 @@ if __name__ == '__main__':
     log_path = args.ol
     plot_path = args.o
     mechanisms = parse_mechanisms(args.m, False)
+    heuristics = parse_mechanisms(args.hs, False)
 
     print(args)
 
     setting = Setting(mechanisms, gamma, k, d, step_size, smoothing)
-    compare_runtimes([setting], max_number, random_seed, log_path, plot_path)
+    compare_runtimes([setting], max_number, random_seed, log_path, plot_path, heuristics, args.b, args.t,
+                     args.z)
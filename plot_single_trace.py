@@ -2,10 +2,9 @@ from argparse import ArgumentParser
 from math import ceil
 
 from matplotlib import pyplot as plt, rc
-from numpy.random import seed
 
 from mechanism_names import parse_mechanisms, describe_mechanisms
-from simulations import Graph, ProtocollingObserver
+from simulations import Graph, ProtocollingObserver, iteration_rng
 
 
 def compare_mechanisms_on_single_trace(mechanism_classes, gamma, outdegree, d, time, step_size, random_seed, log_path,
@@ -24,9 +23,7 @@ def compare_mechanisms_on_single_trace(mechanism_classes, gamma, outdegree, d, t
                                   also work depending on matplotlib. Defaults to data/plots/TITLE.pdf
     """
 
-    seed(random_seed)
-
-    graph = Graph(gamma, d, outdegree)
+    graph = Graph(gamma, d, outdegree, rng=iteration_rng(random_seed, 0, 0))
 
     protocolist = ProtocollingObserver(graph)
 
@@ -34,8 +31,7 @@ def compare_mechanisms_on_single_trace(mechanism_classes, gamma, outdegree, d, t
     mechanisms = [(observer_class(graph), []) for observer_class in mechanism_classes]
 
     for mechanism, max_weight_history in mechanisms:
-        delegations = mechanism.get_delegations()
-        max_weight = mechanism.max_weight_from_delegations(delegations)
+        max_weight = mechanism.current_max_weight()
         assert max_weight == 1
         max_weight_history.append(max_weight)
 
@@ -44,9 +40,7 @@ def compare_mechanisms_on_single_trace(mechanism_classes, gamma, outdegree, d, t
         if (t - 1) % step_size == 0:
             print(t)
             for mechanism, max_weight_history in mechanisms:
-                delegations = mechanism.get_delegations()
-                max_weight = mechanism.max_weight_from_delegations(delegations)
-                max_weight_history.append(max_weight)
+                max_weight_history.append(mechanism.current_max_weight())
 
     # plot
     n = [x * step_size + 1 for x in range(ceil(time / step_size))]
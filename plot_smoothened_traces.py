@@ -1,13 +1,14 @@
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from json import dumps
 from math import ceil
 from time import perf_counter
 
 from matplotlib import pyplot as plt, rc
-from numpy.random import seed
 
+from fractional_integral_flow import INCREMENTAL_MECHANISMS
 from mechanism_names import describe_mechanisms, parse_mechanisms
 from simple_mechanisms import NoChoice
-from simulations import Graph, ProtocollingObserver
+from simulations import Graph, ProtocollingObserver, StatisticsObserver, iteration_rng
 
 MECHANISM_TIMEOUT = 30 * 60
 
@@ -37,7 +38,7 @@ class Setting:
 
 
 def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_path=None, plot_width=6.4,
-                              plot_height=3.2):
+                              plot_height=3.2, summary_path=None, incremental=False):
     """
     Args:
         settings (list of Setting): Description s of a setting
@@ -48,6 +49,10 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
                                   also work depending on matplotlib. Defaults to data/plots/TITLE.pdf
         plot_width (float): Width of figure in inches
         plot_height (float): Height of figure in inches
+        summary_path (string / None): Desired path for the summary records, one JSON object of graph statistics (see
+                                      ``StatisticsObserver.summary``) per iteration. Defaults to
+                                      data/logs/TITLE_summary.jsonl
+        incremental (bool): Whether the mechanisms in ``INCREMENTAL_MECHANISMS`` keep their models alive across ticks
     """
 
     title = f"smo_T{time}_sd{random_seed}"
@@ -58,6 +63,8 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
         log_path = f"data/logs/{title}.csv"
     if plot_path is None:
         plot_path = f"data/plots/{title}.pdf"
+    if summary_path is None:
+        summary_path = f"data/logs/{title}_summary.jsonl"
 
     plt.figure(figsize=(plot_width, plot_height))
 
@@ -65,13 +72,9 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
     rc('font', **fonts)
     rc('text', usetex=True)
 
-    with open(log_path, 'w') as file:
+    with open(log_path, 'w') as file, open(summary_path, 'w') as summary_file:
         file.write(f"Smoothened traces: settings={settings}, T={time}, random_seed={random_seed}\n")
-        for s in settings:
-            # Different iterations should be different for smoothing, but different settings might as well be as
-            # reproducible as possible.
-            seed(random_seed)
-
+        for setting_index, s in enumerate(settings):
             print(s)
             max_weight_history_sum = [[0 for _ in range(ceil(time / s.step_size))] for _ in s.mechanisms]
             num_timeouts = [0 for _ in s.mechanisms]
@@ -81,29 +84,38 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
 
                 elapsed_time = [0. for _ in s.mechanisms]
                 time_out = [False for _ in s.mechanisms]
-                graph = Graph(s.gamma, s.d, s.outdegree)
+                # Every iteration has its own random stream and can be reproduced on its own
+                graph = Graph(s.gamma, s.d, s.outdegree, rng=iteration_rng(random_seed, setting_index, iteration))
 
                 max_weight_history_for_iteration = [[] for _ in s.mechanisms]
 
                 protocolist = ProtocollingObserver(graph)
+                statistics = StatisticsObserver(graph)
 
-                mechanisms = [observer_class(graph) for observer_class in s.mechanisms]
+                mechanisms = [observer_class(graph, incremental=True)
+                              if incremental and issubclass(observer_class, INCREMENTAL_MECHANISMS)
+                              else observer_class(graph) for observer_class in s.mechanisms]
                 assert len(mechanisms) > 0
 
                 # pull that into the loop
                 tick = 0
                 file.write("1\t" + protocolist.protocol[-1])
                 for i, mechanism in enumerate(mechanisms):
-                    delegations = mechanism.get_delegations()
-                    max_weight = mechanism.max_weight_from_delegations(delegations)
+                    max_weight = mechanism.current_max_weight()
                     assert max_weight == 1
                     max_weight_history_for_iteration[i].append(max_weight)
                     file.write("\t" + str(max_weight))
                 file.write("\n")
 
-                for t in range(2, time + 1):
-                    graph.add_node()
-                    file.write(f"{t}\t{protocolist.protocol[-1]}")
+                t = 1
+                while t < time:
+                    # Advance straight to the next tick
+                    block_size = min(s.step_size, time - t)
+                    graph.grow(block_size)
+                    for u in range(t + 1, t + block_size):
+                        file.write(f"{u}\t{protocolist.protocol[u - 1]}\n")
+                    t += block_size
+                    file.write(f"{t}\t{protocolist.protocol[t - 1]}")
                     if (t - 1) % s.step_size == 0:
                         tick += 1
                         for i, mechanism in enumerate(mechanisms):
@@ -115,7 +127,7 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
                             else:
                                 begin = perf_counter()
                                 try:
-                                    delegations = mechanism.get_delegations(
+                                    max_weight = mechanism.current_max_weight(
                                         time_out=MECHANISM_TIMEOUT - elapsed_time[i])
                                 except TimeoutError:
                                     time_out[i] = True
@@ -130,8 +142,8 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
                                 plt.plot(n, max_weight_history_for_iteration[i], color=mechanism.PLOT_COLOR,
                                          label=f"{mechanism.PLOT_LABEL} (run {iteration + 1})",
                                          linestyle=mechanism.PLOT_PATTERN, alpha=1 / (num_timeouts[i] + 1))
+                                max_weight = max_weight_history_for_iteration[i][-1]
 
-                            max_weight = mechanism.max_weight_from_delegations(delegations)
                             max_weight_history_for_iteration[i].append(max_weight)
                             file.write("\t" + str(max_weight))
                     file.write("\n")
@@ -141,6 +153,8 @@ def compare_smoothened_traces(settings, time, random_seed, log_path=None, plot_p
                         for t in range(len(max_weight_history_for_iteration[i])):
                             max_weight_history_sum[i][t] += max_weight_history_for_iteration[i][t]
 
+                summary_file.write(dumps({"setting": setting_index, "iteration": iteration, **statistics.summary()})
+                                   + "\n")
                 file.flush()
 
             n = [x * s.step_size + 1 for x in range(ceil(time / s.step_size))]
@@ -183,12 +197,16 @@ if __name__ == '__main__':
                         help='mechanisms to use:\n' + describe_mechanisms(True))
     parser.add_argument('-ol', type=str, default=None,
                         help='write path for log')
+    parser.add_argument('-os', type=str, default=None,
+                        help='write path for summary records')
     parser.add_argument('-o', type=str, default=None,
                         help='write path for plot')
     parser.add_argument('-pw', type=float, default=6.2,
                         help='width of plot in inches (float)')
     parser.add_argument('-ph', type=float, default=3.2,
                         help='height of plot in inches (float)')
+    parser.add_argument('-inc', action='store_true',
+                        help='keep the models of optimal flows alive and extend them, instead of solving from scratch')
 
     args = parser.parse_args()
 
@@ -200,6 +218,7 @@ if __name__ == '__main__':
     smoothing = args.sm
     log_path = args.ol
     plot_path = args.o
+    summary_path = args.os
     single_mechanisms, mechanisms = parse_mechanisms(args.m, True)
     plot_width = args.pw
     plot_height = args.ph
@@ -211,4 +230,5 @@ if __name__ == '__main__':
                 settings.append(Setting(single_mechanisms, gamma, 1, d, step_size, smoothing))
             if len(mechanisms) != 0:
                 settings.append(Setting(mechanisms, gamma, 2, d, step_size, smoothing))
-            compare_smoothened_traces(settings, time, random_seed, log_path, plot_path, plot_width, plot_height)
+            compare_smoothened_traces(settings, time, random_seed, log_path, plot_path, plot_width, plot_height,
+                                      summary_path, args.inc)
@@ -1,14 +1,13 @@
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from json import dumps
 from math import ceil
 from time import perf_counter
 
 from matplotlib import pyplot as plt, rc
-from numpy.core.multiarray import arange
-from numpy.random import seed, choice
 
 from fractional_integral_flow import ConfluentFlow
 from simple_mechanisms import generate_aliased_mechanism
-from simulations import Graph, ProtocollingObserver
+from simulations import Graph, ProtocollingObserver, StatisticsObserver, iteration_rng
 
 MECHANISM_TIMEOUT = 30 * 60
 
@@ -40,7 +39,7 @@ class Setting:
                 f"smoothing={self.smoothing})")
 
 
-def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None, plot_path=None):
+def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None, plot_path=None, summary_path=None):
     """
     Args:
         settings (list of Setting): Description s of a setting
@@ -49,6 +48,9 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
         log_path (string / None): Desired path for log. Defaults to data/logs/TITLE.csv, where TITLE includes parameters
         plot_path (string / None): Desired path for graphics file. PDF extension is supported, other file formats may
                                   also work depending on matplotlib. Defaults to data/plots/TITLE.pdf
+        summary_path (string / None): Desired path for the summary records, one JSON object of graph statistics (see
+                                      ``StatisticsObserver.summary``) per iteration. Defaults to
+                                      data/logs/TITLE_summary.jsonl
     """
 
     title = f"var_T{time}_sd{random_seed}"
@@ -60,6 +62,8 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
         log_path = f"data/logs/{title}.csv"
     if plot_path is None:
         plot_path = f"data/plots/{title}.pdf"
+    if summary_path is None:
+        summary_path = f"data/logs/{title}_summary.jsonl"
 
     plt.figure(figsize=(6.4, 3.2))
 
@@ -67,15 +71,11 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
     rc('font', **fonts)
     rc('text', usetex=True)
 
-    with open(log_path, 'w') as file:
+    with open(log_path, 'w') as file, open(summary_path, 'w') as summary_file:
         file.write(f"Smoothened traces: settings={settings}, T={time}, random_seed={random_seed}\n")
-        for s in settings:
+        for setting_index, s in enumerate(settings):
             print(s)
 
-            # Different iterations should be different for smoothing, but different settings might as well be as
-            # reproducible as possible.
-            seed(random_seed)
-
             max_weight_history_sum = [[0 for _ in range(ceil(time / s.step_size))] for _ in s.mechanisms]
             num_timeouts = [0 for _ in s.mechanisms]
 
@@ -84,11 +84,13 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
 
                 elapsed_time = [0. for _ in s.mechanisms]
                 time_out = [False for _ in s.mechanisms]
-                graph = Graph(s.gamma, s.d, None)
+                # Every iteration has its own random stream and can be reproduced on its own
+                graph = Graph(s.gamma, s.d, None, rng=iteration_rng(random_seed, setting_index, iteration))
 
                 max_weight_history_for_iteration = [[] for _ in s.mechanisms]
 
                 protocolist = ProtocollingObserver(graph)
+                statistics = StatisticsObserver(graph)
 
                 mechanisms = [observer_class(graph) for observer_class in s.mechanisms]
                 assert len(mechanisms) > 0
@@ -97,16 +99,21 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
                 tick = 0
                 file.write("1\t" + protocolist.protocol[-1])
                 for i, mechanism in enumerate(mechanisms):
-                    delegations = mechanism.get_delegations()
-                    max_weight = mechanism.max_weight_from_delegations(delegations)
+                    max_weight = mechanism.current_max_weight()
                     assert max_weight == 1
                     max_weight_history_for_iteration[i].append(max_weight)
                     file.write("\t" + str(max_weight))
                 file.write("\n")
 
-                for t in range(2, time + 1):
-                    graph.add_node(choice(arange(1, len(s.outdegree_distribution) + 1), p=s.outdegree_distribution))
-                    file.write(f"{t}\t{protocolist.protocol[-1]}")
+                t = 1
+                while t < time:
+                    # Advance straight to the next tick
+                    block_size = min(s.step_size, time - t)
+                    graph.grow(block_size, s.outdegree_distribution)
+                    for u in range(t + 1, t + block_size):
+                        file.write(f"{u}\t{protocolist.protocol[u - 1]}\n")
+                    t += block_size
+                    file.write(f"{t}\t{protocolist.protocol[t - 1]}")
                     if (t - 1) % s.step_size == 0:
                         tick += 1
                         for i, mechanism in enumerate(mechanisms):
@@ -118,7 +125,7 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
                             else:
                                 begin = perf_counter()
                                 try:
-                                    delegations = mechanism.get_delegations(time_out=MECHANISM_TIMEOUT-elapsed_time[i])
+                                    max_weight = mechanism.current_max_weight(time_out=MECHANISM_TIMEOUT-elapsed_time[i])
                                 except TimeoutError:
                                     time_out[i] = True
                                 elapsed_time[i] += perf_counter() - begin
@@ -132,8 +139,8 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
                                 plt.plot(n, max_weight_history_for_iteration[i], color=mechanism.PLOT_COLOR,
                                          label=f"{mechanism.PLOT_LABEL} (run {iteration + 1})",
                                          linestyle=mechanism.PLOT_PATTERN, alpha=1/(num_timeouts[i]+1))
+                                max_weight = max_weight_history_for_iteration[i][-1]
 
-                            max_weight = mechanism.max_weight_from_delegations(delegations)
                             max_weight_history_for_iteration[i].append(max_weight)
                             file.write("\t" + str(max_weight))
                     file.write("\n")
@@ -143,6 +150,8 @@ def compare_varying_outdegree_traces(settings, time, random_seed, log_path=None,
                         for t in range(len(max_weight_history_for_iteration[i])):
                             max_weight_history_sum[i][t] += max_weight_history_for_iteration[i][t]
 
+                summary_file.write(dumps({"setting": setting_index, "iteration": iteration, **statistics.summary()})
+                                   + "\n")
                 file.flush()
 
             n = [x * s.step_size + 1 for x in range(ceil(time / s.step_size))]
@@ -184,6 +193,8 @@ if __name__ == '__main__':
                         help='value of seed (int)')
     parser.add_argument('-ol', type=str, default=None,
                         help='write path for log')
+    parser.add_argument('-os', type=str, default=None,
+                        help='write path for summary records')
     parser.add_argument('-o', type=str, default=None,
                         help='write path for plot')
     args = parser.parse_args()
@@ -197,6 +208,7 @@ if __name__ == '__main__':
     smoothing = args.sm
     log_path = args.ol
     plot_path = args.o
+    summary_path = args.os
 
     settings = []
     for i, kp in enumerate(kps):
@@ -204,4 +216,4 @@ if __name__ == '__main__':
         mechanism = generate_aliased_mechanism(ConfluentFlow, f"p = {round(kp, 2)}",
                                                DASH_PATTERNS[i % len(DASH_PATTERNS)])
         settings.append(Setting([mechanism], gamma, outdegree_distribution, d, step_size, smoothing))
-    compare_varying_outdegree_traces(settings, time, random_seed, log_path, plot_path)
+    compare_varying_outdegree_traces(settings, time, random_seed, log_path, plot_path, summary_path)
@@ -0,0 +1,451 @@
+"""Samplers for choosing the endpoints of new edges by preferential attachment.
+
+A sampler keeps track of the degrees of all nodes in a graph and draws a node with probability proportional to
+degree ** gamma. Every draw is driven by a uniform number in [0, 1) supplied by the caller, so that the graph stays in
+control of the source of randomness.
+"""
+
+from numpy import array, arange, cumsum, empty, full, minimum, repeat, zeros
+
+
+class AttachmentSampler:
+    """Dynamic distribution over the nodes of a graph, in which node n has weight degrees[n] ** gamma.
+
+    Attributes:
+        gamma (float): preferential attachment chooses a node with probability proportional to (node weight)^gamma
+    """
+
+    def __init__(self, gamma):
+        self.gamma = gamma
+
+    @classmethod
+    def from_degrees(cls, gamma, degrees):
+        """Create a sampler for an existing graph.
+
+        Args:
+            gamma (float): exponent of preferential attachment
+            degrees (numpy array of int): degrees of the nodes of the graph
+
+        Returns:
+            AttachmentSampler: sampler of class ``cls``
+        """
+        sampler = cls(gamma)
+        for node, degree in enumerate(degrees.tolist()):
+            sampler.add_node()
+            for _ in range(degree - 1):
+                sampler.increment_degree(node)
+        return sampler
+
+    @classmethod
+    def from_graph(cls, gamma, degrees, offsets, targets):
+        """Create a sampler for an existing graph, in the state it had after generating the graph, e.g. from a snapshot.
+
+        By default, the state only depends on the degrees, see ``from_degrees``.
+
+        Args:
+            gamma (float): exponent of preferential attachment
+            degrees (numpy array of int): degrees of the nodes of the graph
+            offsets (numpy array of int): CSR offsets of the potential delegations, as in ``CompactStorage``
+            targets (numpy array of int): CSR targets of the potential delegations, in the order in which they were drawn
+
+        Returns:
+            AttachmentSampler: sampler of class ``cls``
+        """
+        return cls.from_degrees(gamma, degrees)
+
+    def number_of_nodes(self):
+        assert False
+
+    def add_node(self):
+        """Add a node of degree 1."""
+        assert False
+
+    def increment_degree(self, node):
+        """Increase the degree of an existing node by one."""
+        assert False
+
+    def sample(self, uniform):
+        """Draw a node by inverting the cumulative distribution function of the weights at ``uniform``.
+
+        Args:
+            uniform (float): number drawn uniformly at random from [0, 1)
+
+        Returns:
+            int: the sampled node
+        """
+        assert False
+
+    def sample_block(self, outdegrees, uniforms):
+        """Add a block of new nodes, drawing the endpoints of their edges one after another.
+
+        As in ``Graph.add_preferential_node``, every draw sees the weights updated by all earlier draws, and each new
+        node only becomes available as an endpoint after all of its own edges have been drawn.
+
+        Args:
+            outdegrees (numpy array of int): number of edges of every new node, zero for voters
+            uniforms (numpy array of float): one number drawn uniformly at random from [0, 1) per edge
+
+        Returns:
+            numpy array of int: the endpoints of all edges, ordered by node
+        """
+        assert len(uniforms) == outdegrees.sum()
+        endpoints = empty(len(uniforms), dtype=int)
+        edge = 0
+        for outdegree in outdegrees.tolist():
+            for _ in range(outdegree):
+                endpoint = self.sample(uniforms[edge])
+                endpoints[edge] = endpoint
+                self.increment_degree(endpoint)
+                edge += 1
+            self.add_node()
+        return endpoints
+
+
+class LinearScanSampler(AttachmentSampler):
+    """Sampler normalizing all weights for every draw, taking time linear in the number of nodes.
+
+    Draws exactly the same nodes as ``numpy.random.choice`` would with the normalized weights, given the same uniform
+    number. It mainly serves as a reference for the faster samplers.
+
+    Attributes:
+        degrees (list of int): list of degrees of the nodes
+        probability_weights (list of float): self.probability_weights[n] = self.degrees[n] ** self.gamma
+    """
+
+    def __init__(self, gamma):
+        super().__init__(gamma)
+        self.degrees = []
+        self.probability_weights = []
+
+    def number_of_nodes(self):
+        return len(self.degrees)
+
+    def add_node(self):
+        self.degrees.append(1)
+        self.probability_weights.append(1 ** self.gamma)
+
+    def increment_degree(self, node):
+        self.degrees[node] += 1
+        self.probability_weights[node] = self.degrees[node] ** self.gamma
+
+    def sample(self, uniform):
+        total_weight = sum(self.probability_weights)
+        normalized_weights = [weight / total_weight for weight in self.probability_weights]
+
+        # Same computation as in numpy.random.choice
+        cdf = array(normalized_weights).cumsum()
+        cdf /= cdf[-1]
+        return int(cdf.searchsorted(uniform, side="right"))
+
+
+class FenwickTreeSampler(AttachmentSampler):
+    """Sampler storing the weights in a Fenwick tree, allowing draws and weight updates in logarithmic time.
+
+    For the same uniform number, the sampled node agrees with the one of ``LinearScanSampler`` up to rounding. Degrees,
+    weights and tree are preallocated NumPy arrays whose capacity doubles when full, which keeps the state at 24 bytes
+    per node (at most twice that right after growing).
+
+    >>> sampler = FenwickTreeSampler(1.)
+    >>> for _ in range(3):
+    ...     sampler.add_node()
+    >>> sampler.increment_degree(1)
+    >>> [sampler.sample(u) for u in [0., .2, .25, .7, .75, .99]]
+    [0, 0, 1, 1, 2, 2]
+
+    Attributes:
+        total_weight (float): sum of the weights of all nodes
+    """
+
+    def __init__(self, gamma):
+        super().__init__(gamma)
+        self.total_weight = 0.
+        self._number_of_nodes = 0
+        self._degrees = zeros(1, dtype="int64")
+        self._weights = zeros(1)
+        self._tree = zeros(2)  # 1-indexed, len(self._tree) - 1 is the capacity and always a power of two
+
+    @classmethod
+    def from_degrees(cls, gamma, degrees):
+        """Build the tree in linear time.
+
+        >>> from numpy import array
+        >>> FenwickTreeSampler.from_degrees(1., array([1, 2, 1])).sample(.25)
+        1
+        """
+        sampler = cls(gamma)
+        capacity = 1
+        while capacity < len(degrees):
+            capacity *= 2
+        sampler._number_of_nodes = len(degrees)
+        sampler._degrees = zeros(capacity, dtype="int64")
+        sampler._degrees[:len(degrees)] = degrees
+        sampler._weights = zeros(capacity)
+        sampler._weights[:len(degrees)] = degrees ** gamma
+        sampler._rebuild(capacity)
+        sampler.total_weight = float(sampler._weights.sum())
+        return sampler
+
+    @property
+    def degrees(self):
+        """numpy array of int: degrees of the nodes"""
+        return self._degrees[:self._number_of_nodes]
+
+    def _capacity(self):
+        return len(self._tree) - 1
+
+    def _rebuild(self, capacity):
+        """Rebuild the tree with the given capacity in linear time, one level of the tree at a time."""
+        if capacity > len(self._weights):
+            for name in ["_degrees", "_weights"]:
+                old = getattr(self, name)
+                new = zeros(capacity, dtype=old.dtype)
+                new[:self._number_of_nodes] = old[:self._number_of_nodes]
+                setattr(self, name, new)
+        tree = zeros(capacity + 1)
+        tree[1:] = self._weights[:capacity]
+        step = 1
+        while step < capacity:
+            # Entries whose lowest set bit is step are complete and are added to their parents
+            children = arange(step, capacity + 1 - step, 2 * step)
+            tree[children + step] += tree[children]
+            step *= 2
+        self._tree = tree
+
+    def _add(self, node, delta):
+        tree = self._tree
+        capacity = len(tree) - 1
+        i = node + 1
+        while i <= capacity:
+            tree[i] += delta
+            i += i & -i
+        self.total_weight += delta
+
+    def number_of_nodes(self):
+        return self._number_of_nodes
+
+    def add_node(self):
+        node = self._number_of_nodes
+        weight = 1 ** self.gamma
+        if node >= self._capacity():
+            self._rebuild(2 * self._capacity())
+        self._degrees[node] = 1
+        self._weights[node] = weight
+        self._number_of_nodes += 1
+        self._add(node, weight)
+
+    def increment_degree(self, node):
+        self._degrees[node] += 1
+        weight = float(self._degrees[node]) ** self.gamma
+        self._add(node, weight - float(self._weights[node]))
+        self._weights[node] = weight
+
+    def sample(self, uniform):
+        assert self._number_of_nodes > 0
+        tree = self._tree
+        capacity = len(tree) - 1
+        target = uniform * self.total_weight
+        position = 0
+        step = capacity
+        while step > 0:
+            next_position = position + step
+            if next_position <= capacity and tree[next_position] <= target:
+                position = next_position
+                target -= tree[next_position]
+            step >>= 1
+        # Rounding errors might push the position past the last node
+        return min(position, self._number_of_nodes - 1)
+
+
+class UniformSampler(AttachmentSampler):
+    """Sampler for gamma = 0, where all nodes are equally likely. Draws take constant time.
+
+    >>> sampler = UniformSampler(0.)
+    >>> for _ in range(4):
+    ...     sampler.add_node()
+    >>> [sampler.sample(u) for u in [0., .3, .5, .99]]
+    [0, 1, 2, 3]
+    """
+
+    def __init__(self, gamma):
+        assert gamma == 0
+        super().__init__(gamma)
+        self._number_of_nodes = 0
+
+    @classmethod
+    def from_degrees(cls, gamma, degrees):
+        sampler = cls(gamma)
+        sampler._number_of_nodes = len(degrees)
+        return sampler
+
+    def number_of_nodes(self):
+        return self._number_of_nodes
+
+    def add_node(self):
+        self._number_of_nodes += 1
+
+    def increment_degree(self, node):
+        pass
+
+    def sample(self, uniform):
+        return min(int(uniform * self._number_of_nodes), self._number_of_nodes - 1)
+
+    def sample_block(self, outdegrees, uniforms):
+        """Since weights never change, all endpoints can be drawn at once."""
+        assert len(uniforms) == outdegrees.sum()
+        # For every edge, the number of nodes present when it is drawn
+        number_of_nodes = repeat(arange(self._number_of_nodes, self._number_of_nodes + len(outdegrees)), outdegrees)
+        self._number_of_nodes += len(outdegrees)
+        return minimum((uniforms * number_of_nodes).astype(int), number_of_nodes - 1)
+
+
+class UrnSampler(AttachmentSampler):
+    """Sampler for gamma = 1, drawing from an urn that contains every node once per unit of its degree.
+
+    Draws and degree updates take constant time. In contrast to the other samplers, nodes are not ordered by index in
+    the urn, so the same uniform number generally leads to a different node. The urn is stored as a NumPy array.
+
+    >>> sampler = UrnSampler(1.)
+    >>> for _ in range(3):
+    ...     sampler.add_node()
+    >>> sampler.increment_degree(1)
+    >>> [sampler.sample(u) for u in [0., .25, .5, .75]]
+    [0, 1, 2, 1]
+    """
+
+    def __init__(self, gamma):
+        assert gamma == 1
+        super().__init__(gamma)
+        self._urn = empty(16, dtype="int32")
+        self._size = 0
+        self._number_of_nodes = 0
+
+    @classmethod
+    def from_degrees(cls, gamma, degrees):
+        sampler = cls(gamma)
+        sampler._urn = repeat(arange(len(degrees), dtype="int32"), degrees)
+        sampler._size = len(sampler._urn)
+        sampler._number_of_nodes = len(degrees)
+        return sampler
+
+    @classmethod
+    def from_graph(cls, gamma, degrees, offsets, targets):
+        """Rebuild the urn in the order of generation: the endpoints of each node's edges, followed by the node.
+
+        >>> from numpy import array
+        >>> UrnSampler.from_graph(1., array([4, 1, 2, 1]), array([0, 0, 2, 2, 4]), array([0, 0, 2, 0])).urn.tolist()
+        [0, 0, 0, 1, 2, 2, 0, 3]
+        """
+        sampler = cls(gamma)
+        number_of_nodes = len(degrees)
+        outdegrees = offsets[1:number_of_nodes + 1] - offsets[:number_of_nodes]
+        sampler._urn = empty(number_of_nodes + offsets[number_of_nodes], dtype="int32")
+        sampler._urn[cumsum(outdegrees) + arange(number_of_nodes)] = arange(number_of_nodes)
+        sampler._urn[arange(offsets[number_of_nodes]) + repeat(arange(number_of_nodes), outdegrees)] = \
+            targets[:offsets[number_of_nodes]]
+        sampler._size = len(sampler._urn)
+        sampler._number_of_nodes = number_of_nodes
+        return sampler
+
+    @property
+    def urn(self):
+        """numpy array of int: every node n appears degrees[n] many times"""
+        return self._urn[:self._size]
+
+    def _reserve(self, size):
+        if size > len(self._urn):
+            capacity = max(len(self._urn), 1)
+            while size > capacity:
+                capacity *= 2
+            urn = empty(capacity, dtype="int32")
+            urn[:self._size] = self._urn[:self._size]
+            self._urn = urn
+
+    def _append(self, node):
+        self._reserve(self._size + 1)
+        self._urn[self._size] = node
+        self._size += 1
+
+    def number_of_nodes(self):
+        return self._number_of_nodes
+
+    def add_node(self):
+        self._append(self._number_of_nodes)
+        self._number_of_nodes += 1
+
+    def increment_degree(self, node):
+        self._append(node)
+
+    def sample(self, uniform):
+        return int(self._urn[min(int(uniform * self._size), self._size - 1)])
+
+    def sample_block(self, outdegrees, uniforms):
+        """Draw all endpoints of the block in vectorized form.
+
+        The urn grows by the endpoints of each node's edges followed by the node itself, so the size of the urn at
+        every draw, and thus the drawn position, is known in advance. Positions inside the block refer to earlier
+        entries of the block, which are resolved by pointer jumping.
+
+        >>> from numpy import array
+        >>> sampler = UrnSampler(1.)
+        >>> sampler.add_node()
+        >>> sampler.sample_block(array([2, 0, 1]), array([.9, .7, .99])).tolist()
+        [0, 0, 2]
+        >>> sampler.urn.tolist()
+        [0, 0, 0, 1, 2, 2, 3]
+        """
+        assert len(uniforms) == outdegrees.sum()
+        number_of_nodes = len(outdegrees)
+        # Slots of the block in the urn: the edges of each node, followed by the node itself
+        node_slots = cumsum(outdegrees) + arange(number_of_nodes)
+        owners = repeat(arange(number_of_nodes), outdegrees)
+        edge_slots = arange(len(uniforms)) + owners
+        sizes = self._size + edge_slots
+        positions = minimum((uniforms * sizes).astype(int), sizes - 1)
+
+        values = empty(len(uniforms) + number_of_nodes, dtype="int32")
+        references = full(len(values), -1)
+        values[node_slots] = arange(self._number_of_nodes, self._number_of_nodes + number_of_nodes)
+        outside = positions < self._size
+        values[edge_slots[outside]] = self._urn[positions[outside]]
+        references[edge_slots[~outside]] = positions[~outside] - self._size
+
+        unresolved = edge_slots[~outside]
+        while len(unresolved) > 0:
+            targets = references[unresolved]
+            next_targets = references[targets]
+            resolved = next_targets < 0
+            values[unresolved[resolved]] = values[targets[resolved]]
+            references[unresolved[resolved]] = -1
+            unresolved = unresolved[~resolved]
+            references[unresolved] = next_targets[~resolved]
+
+        self._reserve(self._size + len(values))
+        self._urn[self._size:self._size + len(values)] = values
+        self._size += len(values)
+        self._number_of_nodes += number_of_nodes
+        return values[edge_slots].astype(int)
+
+
+def default_sampler(gamma):
+    """Choose the fastest sampler for the given gamma.
+
+    >>> [default_sampler(gamma).__name__ for gamma in [0, 0.5, 1., 2]]
+    ['UniformSampler', 'FenwickTreeSampler', 'UrnSampler', 'FenwickTreeSampler']
+
+    Returns:
+        type: class inheriting from AttachmentSampler
+    """
+    if gamma == 0:
+        return UniformSampler
+    if gamma == 1:
+        return UrnSampler
+    return FenwickTreeSampler
+
+
+SAMPLERS = {"linear": LinearScanSampler, "fenwick": FenwickTreeSampler, "uniform": UniformSampler,
+            "urn": UrnSampler}
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()
@@ -1,5 +1,9 @@
 """Extracts some aggregate information from log traces.
 
+The harness scripts now also write these statistics (and the degree distribution) for every iteration as one JSON
+record per line, to data/logs/TITLE_summary.jsonl by default (see ``StatisticsObserver`` in simulations.py). This script
+remains for older logs.
+
 Usage is quite hacky:
 For example, let's say that we ran the example from Figure 1d of the paper:
 $ python3 -O plot_smoothened_traces.py -g 1.0 -d 0.5 -sm 100 -sz 50 -sd 0 -o data/plots/fig1d.pdf -ol data/logs/fig1d.csv 5000
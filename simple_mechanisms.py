@@ -1,10 +1,138 @@
+from collections import deque
 from math import inf
 
-from numpy.random.mtrand import choice
+from numpy import add, empty, flatnonzero, maximum, zeros
 
+from delegation_results import ConfluentDelegations
+from graph_algorithms import strongly_connected_components
 from simulations import ConfluentMechanism
 
 
+class OnlineDelegations:
+    """Delegations of an online mechanism, with transitive delegates and voter weights, extended as nodes arrive.
+
+    Since online mechanisms never change a delegation, weights only grow and the maximum weight is a running maximum,
+    which takes constant time per node to maintain.
+
+    >>> from numpy import array
+    >>> from simulations import NodeBlock
+    >>> delegations = OnlineDelegations()
+    >>> delegations.append(0)
+    >>> delegations.extend(NodeBlock(2, array([False, True, False]), array([0, 2, 2, 4]), array([1, 0, 3, 2])),
+    ...                    array([1, 3]))
+    >>> delegations.delegations(), delegations.max_weight
+    ([None, 0, 1, None, 3], 3)
+
+    Attributes:
+        number_of_nodes (int): number of nodes so far, starting with the initial voter
+        delegates (numpy array of int32): for each node, the node it delegates to or -1 for voters, valid up to index
+                                          number_of_nodes
+        transitive_delegations (numpy array of int): for each node, the voter it transitively delegates to, valid up
+                                                     to index number_of_nodes
+        weights (numpy array of int): for a voter, its weight; for all other nodes zero
+        max_weight (int): maximum weight of a voter
+    """
+
+    ARRAY_DTYPES = {"delegates": "int32", "transitive_delegations": "int64", "weights": "int64"}
+
+    def __init__(self):
+        self.number_of_nodes = 1
+        for name, array_dtype in self.ARRAY_DTYPES.items():
+            setattr(self, name, zeros(16, dtype=array_dtype))
+        self.delegates[0] = ConfluentDelegations.VOTER
+        self.weights[0] = 1
+        self.max_weight = 1
+
+    @classmethod
+    def from_resolved(cls, delegations, transitive_delegations, weights):
+        """Start from delegations that were resolved elsewhere, e.g. by an offline computation over an existing graph.
+
+        Args:
+            delegations (list of (int / None)): for each node, the node it delegates to, or None for voters
+            transitive_delegations (list of int): for each node, the voter it transitively delegates to
+            weights (list of int): for a voter, its weight; for all other nodes zero
+        """
+        online_delegations = cls()
+        online_delegations._reserve(len(delegations))
+        online_delegations.delegates[:len(delegations)] = ConfluentDelegations.from_list(delegations).delegates
+        online_delegations.transitive_delegations[:len(delegations)] = transitive_delegations
+        online_delegations.weights[:len(delegations)] = weights
+        online_delegations.max_weight = max(weights)
+        online_delegations.number_of_nodes = len(delegations)
+        return online_delegations
+
+    def _reserve(self, number_of_nodes):
+        capacity = len(self.weights)
+        while capacity < number_of_nodes:
+            capacity *= 2
+        if capacity > len(self.weights):
+            for name, array_dtype in self.ARRAY_DTYPES.items():
+                resized = zeros(capacity, dtype=array_dtype)
+                resized[:self.number_of_nodes] = getattr(self, name)[:self.number_of_nodes]
+                setattr(self, name, resized)
+
+    def delegations(self):
+        """Return the delegations so far, sharing memory with ``delegates``.
+
+        Returns:
+            ConfluentDelegations
+        """
+        return ConfluentDelegations(self.delegates[:self.number_of_nodes])
+
+    def append(self, delegate):
+        """Add a node delegating to ``delegate``, or a voter if ``delegate`` is None."""
+        node = self.number_of_nodes
+        self._reserve(node + 1)
+        if delegate is None:
+            self.delegates[node] = ConfluentDelegations.VOTER
+            voter = node
+        else:
+            self.delegates[node] = delegate
+            voter = self.transitive_delegations[delegate]
+        self.transitive_delegations[node] = voter
+        self.weights[voter] += 1
+        self.max_weight = max(self.max_weight, int(self.weights[voter]))
+        self.number_of_nodes = node + 1
+
+    def extend(self, block, delegates):
+        """Add a block of nodes, resolving delegations within the block by pointer jumping.
+
+        Args:
+            block (NodeBlock): the added nodes
+            delegates (numpy array of int): for every delegating node of the block in order, its delegate
+        """
+        first = self.number_of_nodes
+        assert block.first_node == first
+        self._reserve(first + len(block))
+        delegators = flatnonzero(~block.is_voter)
+        voters = flatnonzero(block.is_voter)
+        self.delegates[first + voters] = ConfluentDelegations.VOTER
+        self.delegates[first + delegators] = delegates
+
+        resolved = empty(len(block), dtype="int64")
+        resolved[voters] = first + voters
+        done = block.is_voter.copy()
+        outside = delegates < first
+        resolved[delegators[outside]] = self.transitive_delegations[delegates[outside]]
+        done[delegators[outside]] = True
+        pointers = zeros(len(block), dtype="int64")
+        pointers[delegators] = delegates - first  # only used for delegations within the block
+        pending = flatnonzero(~done)
+        while len(pending) > 0:
+            targets = pointers[pending]
+            ready = done[targets]
+            resolved[pending[ready]] = resolved[targets[ready]]
+            done[pending[ready]] = True
+            pointers[pending[~ready]] = pointers[targets[~ready]]
+            pending = pending[~ready]
+
+        self.transitive_delegations[first:first + len(block)] = resolved
+        add.at(self.weights, resolved, 1)
+        if len(block) > 0:
+            self.max_weight = max(self.max_weight, int(self.weights[resolved].max()))
+        self.number_of_nodes = first + len(block)
+
+
 class NoChoice(ConfluentMechanism):
     PLOT_COLOR = "grey"
     PLOT_ABBREVIATION = "n"
@@ -15,17 +143,26 @@ class NoChoice(ConfluentMechanism):
         super().__init__(graph)
         if graph.outdegree != 1:
             raise ValueError("NoChoice mechanism can only be applied to graphs with outdegree 1.")
-        self.delegations = [None]
+        self.online_delegations = OnlineDelegations()
+        self.notify_of_added_nodes(graph.node_block(1))  # nodes of a graph loaded from a snapshot
 
     def notify_of_added_voting_node(self):
-        self.delegations.append(None)
+        self.online_delegations.append(None)
 
     def notify_of_added_delegating_node(self, potential_delegations):
         assert len(potential_delegations) == 1
-        self.delegations.append(potential_delegations[0])
+        self.online_delegations.append(potential_delegations[0])
+
+    def notify_of_added_nodes(self, block):
+        starts, outdegrees = block.delegator_offsets()
+        assert (outdegrees == 1).all()
+        self.online_delegations.extend(block, block.targets[starts])
 
     def get_delegations(self, time_out=None):
-        return self.delegations
+        return self.online_delegations.delegations()
+
+    def current_max_weight(self, time_out=None):
+        return self.online_delegations.max_weight
 
 
 class GreedyNewestDelegate(ConfluentMechanism):
@@ -37,17 +174,26 @@ class GreedyNewestDelegate(ConfluentMechanism):
 
     def __init__(self, graph):
         super().__init__(graph)
-        self.delegations = [None]
+        self.online_delegations = OnlineDelegations()
+        self.notify_of_added_nodes(graph.node_block(1))  # nodes of a graph loaded from a snapshot
 
     def notify_of_added_voting_node(self):
-        self.delegations.append(None)
+        self.online_delegations.append(None)
 
     def notify_of_added_delegating_node(self, potential_delegations):
         super().notify_of_added_delegating_node(potential_delegations)
-        self.delegations.append(max(potential_delegations))
+        self.online_delegations.append(max(potential_delegations))
+
+    def notify_of_added_nodes(self, block):
+        starts, _ = block.delegator_offsets()
+        newest = maximum.reduceat(block.targets, starts) if len(starts) > 0 else starts
+        self.online_delegations.extend(block, newest)
 
     def get_delegations(self, time_out=None):
-        return self.delegations
+        return self.online_delegations.delegations()
+
+    def current_max_weight(self, time_out=None):
+        return self.online_delegations.max_weight
 
 
 class GreedyPowerOfChoice(ConfluentMechanism):
@@ -57,6 +203,7 @@ class GreedyPowerOfChoice(ConfluentMechanism):
         delegations (list of (int / None)): For each node, the id of the node it delegates to; None for voters.
         transitive_delegations (list of int): For each node, the id of the voter it transitively delegates to
         voter_weights (list of int): For a voter, its weight; for all other nodes zero
+        max_weight (int): Maximum weight of a voter, maintained as a running maximum since weights never decrease
     """
 
     PLOT_COLOR = "#FF9800"
@@ -70,8 +217,8 @@ class GreedyPowerOfChoice(ConfluentMechanism):
         self.delegations = [None]
         self.transitive_delegations = [0]
         self.voter_weights = [1]
-
-        self._check_assertions()
+        self.max_weight = 1
+        self.notify_of_added_nodes(graph.node_block(1))  # nodes of a graph loaded from a snapshot
 
     def _check_assertions(self):
         assert len(self.delegations) == self.graph.number_of_nodes()
@@ -79,17 +226,13 @@ class GreedyPowerOfChoice(ConfluentMechanism):
         assert len(self.voter_weights) == self.graph.number_of_nodes()
         assert sum(self.voter_weights) == self.graph.number_of_nodes()
 
-    def notify_of_added_voting_node(self):
-        number = self.graph.number_of_nodes() - 1
+    def _add_voter(self):
+        number = len(self.delegations)
         self.delegations.append(None)
         self.transitive_delegations.append(number)
         self.voter_weights.append(1)
 
-        self._check_assertions()
-
-    def notify_of_added_delegating_node(self, potential_delegations):
-        super().notify_of_added_delegating_node(potential_delegations)
-
+    def _add_delegator(self, potential_delegations):
         min_weight_delegate = potential_delegations[0]
         min_weight_voter = self.transitive_delegations[min_weight_delegate]
         min_weight = self.voter_weights[min_weight_voter]
@@ -105,106 +248,188 @@ class GreedyPowerOfChoice(ConfluentMechanism):
         self.transitive_delegations.append(min_weight_voter)
         self.voter_weights[min_weight_voter] += 1
         self.voter_weights.append(0)
+        self.max_weight = max(self.max_weight, self.voter_weights[min_weight_voter])
 
+    def notify_of_added_voting_node(self):
+        self._add_voter()
+        self._check_assertions()
+
+    def notify_of_added_delegating_node(self, potential_delegations):
+        super().notify_of_added_delegating_node(potential_delegations)
+        self._add_delegator(potential_delegations)
+        self._check_assertions()
+
+    def notify_of_added_nodes(self, block):
+        for potential_delegations in block:
+            if potential_delegations is None:
+                self._add_voter()
+            else:
+                self._add_delegator(potential_delegations)
         self._check_assertions()
 
     def get_delegations(self, time_out=None):
         return self.delegations
 
+    def current_max_weight(self, time_out=None):
+        return self.max_weight
+
 
 class GeneralizedPowerOfChoice(ConfluentMechanism):
-    """Uses the power of choice on nodes in topological order of the graph of strongly connected components."""
+    """Uses the power of choice on nodes in topological order of the graph of strongly connected components.
+
+    Graphs only append nodes whose potential delegations point to existing nodes, so every node forms its own strongly
+    connected component and the nodes are processed in the order in which they were added. In incremental mode, the
+    delegations, transitive delegates and voter weights of the previous call are therefore kept, and only the nodes
+    added since then are processed. If a new node has a potential delegation to itself or a later node, for example in
+    a graph loaded from elsewhere, all delegations are recomputed from scratch once.
+
+    >>> from simulations import Graph
+    >>> graph = Graph(1., .5, 3, rng=0)
+    >>> incremental, from_scratch = GeneralizedPowerOfChoice(graph), GeneralizedPowerOfChoice(graph, False)
+    >>> for _ in range(5):
+    ...     _ = graph.grow(50)
+    ...     assert incremental.get_delegations() == from_scratch.get_delegations()
+    >>> incremental.current_max_weight() == from_scratch.current_max_weight()
+    True
+
+    Attributes:
+        incremental (bool): whether to reuse the delegations of the previous call
+        online_delegations (OnlineDelegations / None): delegations of the nodes processed so far, None before the first
+                                                       call
+    """
 
     PLOT_COLOR = "#FF9800"
     PLOT_LABEL = "generalized greedy power of choice"
     PLOT_ABBREVIATION = "t"
     PLOT_PATTERN = "solid"
 
+    def __init__(self, graph, incremental=True):
+        super().__init__(graph)
+        self.incremental = incremental
+        self.online_delegations = None
+
+    def _update(self):
+        num_nodes = self.graph.number_of_nodes()
+        if self.online_delegations is None and self.graph.is_voter(0):
+            self.online_delegations = OnlineDelegations()
+        processed = 0 if self.online_delegations is None else self.online_delegations.number_of_nodes
+        if self.incremental and 0 < processed <= num_nodes:
+            sources, targets = self.graph.edges(processed, num_nodes)
+            if not (targets >= sources).any():
+                for node in range(processed, num_nodes):
+                    if self.graph.is_voter(node):
+                        self.online_delegations.append(None)
+                    else:
+                        self.online_delegations.append(self._choose(self.graph.potential_delegations[node]))
+                return
+        self.online_delegations = OnlineDelegations.from_resolved(*self._compute_delegations(num_nodes))
+
+    def _choose(self, potential_delegations):
+        transitive_delegations = self.online_delegations.transitive_delegations
+        weights = self.online_delegations.weights
+        min_delegation = potential_delegations[0]
+        min_delegation_weight = weights[transitive_delegations[min_delegation]]
+        for m in potential_delegations[1:]:
+            weight = weights[transitive_delegations[m]]
+            if weight < min_delegation_weight:
+                min_delegation_weight = weight
+                min_delegation = m
+        return min_delegation
+
     def get_delegations(self, time_out=None):
-        num_nodes = len(self.graph.potential_delegations)
+        self._update()
+        return self.online_delegations.delegations()
+
+    def current_max_weight(self, time_out=None):
+        self._update()
+        return self.online_delegations.max_weight
+
+    def _compute_delegations(self, num_nodes):
+        """Compute the delegations of the whole graph from scratch.
+
+        Returns:
+            (list of (int / None), list of int, list of int): (delegations, transitive delegations, voter weights)
+        """
         delegations = [None for _ in range(num_nodes)]
         transitive_delegations = [None for _ in range(num_nodes)]
         weights = [0 for _ in range(num_nodes)]
 
-        counter = 0
-        dfs_low = [None for _ in range(num_nodes)]
-        dfs_num = [None for _ in range(num_nodes)]  # counter at visiting node, None if unvisited
-        dfs_stack = []
-        in_stack = [False for _ in range(num_nodes)]  # visited[n] iff n in dfs_stack
-
-        def dfs(node):
-            # Tarjan's SCC algorithm
-            nonlocal delegations, dfs_low, dfs_num, counter, dfs_stack
-            dfs_low[node] = counter
-            dfs_num[node] = counter
-            counter += 1
-            dfs_stack.append(node)
-            in_stack[node] = True
-
-            if not self.graph.is_voter(node):
-                for neighbor in self.graph.potential_delegations[node]:
-                    if dfs_num[neighbor] is None:
-                        dfs(neighbor)
-                        dfs_low[node] = min(dfs_low[node], dfs_low[neighbor])
-                    elif in_stack[neighbor]:
-                        dfs_low[node] = min(dfs_low[node], dfs_num[neighbor])
-
-            if dfs_low[node] == dfs_num[node]:  # New SCC found with node as root
-                index = dfs_stack.index(node)
-                scc = dfs_stack[index:]
-                dfs_stack = dfs_stack[:index]
-                for n in scc:
-                    in_stack[n] = False
-                for _ in range(len(scc)):  # This would be more efficient as a BFS, should not matter for our graphs
-                    for n in scc:
-                        if transitive_delegations[n] is None:
-                            if self.graph.is_voter(n):
-                                transitive_delegations[n] = n
-                                weights[n] = 1
-                                break
-                            if not self.graph.is_voter(n):
-                                min_delegation_weight = inf
-                                min_delegation = None
-                                for m in self.graph.potential_delegations[n]:
-                                    if transitive_delegations[m] is not None:
-                                        transitive = transitive_delegations[m]
-                                        if weights[transitive] < min_delegation_weight:
-                                            min_delegation_weight = weights[transitive]
-                                            min_delegation = m
-                                if min_delegation is not None:
-                                    delegations[n] = min_delegation
-                                    transitive_delegations[n] = transitive_delegations[min_delegation]
-                                    weights[transitive_delegations[n]] += 1
-                                    break
-                assert (transitive_delegations[n] is not None for n in scc)
-
-        for i in range(num_nodes):
-            if dfs_num[i] is None:
-                dfs(i)
-
-        assert ((delegations[n] is None) == (self.graph.is_voter(n)) for n in range(num_nodes))
-
-        return delegations
+        potential_delegations = self.graph.unique_potential_delegations
+        predecessors = self.graph.predecessors
+        component = [-1 for _ in range(num_nodes)]
+
+        for index, scc in enumerate(strongly_connected_components(potential_delegations)):
+            for n in scc:
+                component[n] = index
+            # Resolve the SCC breadth-first, starting from voters and nodes with a potential delegation out of the SCC,
+            # whose SCCs all came earlier
+            queue = deque(n for n in scc if self.graph.is_voter(n)
+                          or any(transitive_delegations[m] is not None for m in potential_delegations[n]))
+            queued = set(queue)
+            while queue:
+                n = queue.popleft()
+                if self.graph.is_voter(n):
+                    transitive_delegations[n] = n
+                    weights[n] = 1
+                else:
+                    min_delegation_weight = inf
+                    min_delegation = None
+                    for m in self.graph.potential_delegations[n]:
+                        if transitive_delegations[m] is not None:
+                            transitive = transitive_delegations[m]
+                            if weights[transitive] < min_delegation_weight:
+                                min_delegation_weight = weights[transitive]
+                                min_delegation = m
+                    delegations[n] = min_delegation
+                    transitive_delegations[n] = transitive_delegations[min_delegation]
+                    weights[transitive_delegations[n]] += 1
+                for pred in predecessors[n]:
+                    if component[pred] == index and pred not in queued:
+                        queued.add(pred)
+                        queue.append(pred)
+            assert all(transitive_delegations[n] is not None for n in scc)
+
+        assert all((delegations[n] is None) == (self.graph.is_voter(n)) for n in range(num_nodes))
+
+        return delegations, transitive_delegations, weights
 
 
 class GreedyRandomDelegation(ConfluentMechanism):
+    """Online algorithm that delegates to one of the potential delegations chosen uniformly at random.
+
+    Attributes:
+        rng (numpy.random.Generator): source of randomness, by default spawned from the graph's generator
+    """
+
     PLOT_COLOR = "#F44336"
     PLOT_ABBREVIATION = "r"
     PLOT_LABEL = "greedy random"
     PLOT_PATTERN = "solid"
 
-    def __init__(self, graph):
+    def __init__(self, graph, rng=None):
         super().__init__(graph)
-        self.delegations = [None]
+        self.online_delegations = OnlineDelegations()
+        if rng is None:
+            rng = graph.spawn_rng()
+        self.rng = rng
+        self.notify_of_added_nodes(graph.node_block(1))  # nodes of a graph loaded from a snapshot
 
     def notify_of_added_voting_node(self):
-        self.delegations.append(None)
+        self.online_delegations.append(None)
 
     def notify_of_added_delegating_node(self, potential_delegations):
-        self.delegations.append(choice(potential_delegations))
+        self.online_delegations.append(potential_delegations[self.rng.integers(len(potential_delegations))])
+
+    def notify_of_added_nodes(self, block):
+        starts, outdegrees = block.delegator_offsets()
+        chosen = block.targets[starts + self.rng.integers(outdegrees)]
+        self.online_delegations.extend(block, chosen)
 
     def get_delegations(self, time_out=None):
-        return self.delegations
+        return self.online_delegations.delegations()
+
+    def current_max_weight(self, time_out=None):
+        return self.online_delegations.max_weight
 
 
 def generate_aliased_mechanism(mechanism, plot_label, plot_pattern):
@@ -1,8 +1,18 @@
 from collections import Counter
+from io import StringIO
+from json import dump, load
 from math import inf
+from os import makedirs
+from os.path import join
 
-from numpy.random import choice
-from numpy.random import random
+from numpy import (add, arange, bincount, concatenate, cumsum, flatnonzero, full, repeat, subtract, trim_zeros, unique,
+                   zeros_like)
+from numpy.random import SeedSequence, default_rng
+
+from graph_export import write_graph
+from graph_storage import AdjacencyIndex, ComponentIndex, CompactStorage, PotentialDelegationsView
+from samplers import SAMPLERS, default_sampler
+from weight_statistics import WeightStatistics
 
 EPS = .00005  # Gurobi gives very bad precision in some cases
 
@@ -10,39 +20,259 @@ EPS = .00005  # Gurobi gives very bad precision in some cases
 class Graph:
     """Underlying graph of potential delegations generated by preferential attachment.
 
+    The graph is stored compactly in NumPy arrays (see ``CompactStorage``); ``potential_delegations``, ``degrees`` and
+    ``probability_weights`` are read-only views on them.
+
     Attributes:
         gamma (float): preferential attachment chooses a node with probability proportional to (node weight)^gamma
         outdegree (int/None): positive number of potential delegations for every non-voting nodes or None if unspecified
         d (float between 0 and 1): the probability of an incoming voter delegating
         potential_delegations (list of ((list of int) / None)): adjacency list representation of the graph
         observers (list of Mechanism): list of Observer objects to be notified of changes to the graph
-        degrees (list of int): list of degrees of the nodes
-        probability_weights (list of float): list of probability weights for choosing nodes:
-                                             self.probability_weights[n] = self.degrees[n] ** self.gamma
+        degrees (numpy array of int): degrees of the nodes
+        probability_weights (numpy array of float): probability weights for choosing nodes:
+                                                    self.probability_weights[n] = self.degrees[n] ** self.gamma
+        sampler (AttachmentSampler): engine drawing the endpoints of new edges
+        rng (numpy.random.Generator): source of all randomness in the generation of the graph
     """
 
-    def __init__(self, gamma, d, outdegree=None):
-        """Initialize graph with single voter."""
+    __slots__ = ("gamma", "outdegree", "d", "observers", "rng", "_storage", "_potential_delegations", "_index",
+                 "_components", "_sampler_class", "_sampler")
+
+    SNAPSHOT_FORMAT_VERSION = 1
+
+    def __init__(self, gamma, d, outdegree=None, sampler=None, rng=None, storage=None):
+        """Initialize graph with single voter.
+
+        Args:
+            gamma (float): exponent of preferential attachment
+            d (float between 0 and 1): the probability of an incoming voter delegating
+            outdegree (int/None): number of potential delegations of every delegating node, None if unspecified
+            sampler (type/None): class inheriting from AttachmentSampler. Defaults to constant-time samplers for gamma
+                                 0 and 1, and to FenwickTreeSampler otherwise. LinearScanSampler recomputes all
+                                 weights at every draw and serves as a simple reference.
+            rng (numpy.random.Generator / numpy.random.SeedSequence / int / None): random number generator or seed for
+                                                                                  one, see ``iteration_rng``. If None,
+                                                                                  the generator is seeded freshly.
+            storage (CompactStorage / None): existing nodes of the graph, e.g. from a snapshot. If None, the graph
+                                             starts with a single voter.
+        """
         self.gamma = gamma
         assert outdegree is None or 1 <= outdegree
         self.outdegree = outdegree
         self.d = d
-        self.potential_delegations = [None]
         self.observers = []
-        self.degrees = [1]
-        self.probability_weights = [1 ** self.gamma]
+        if storage is None:
+            storage = CompactStorage(gamma)
+            storage.append_voter()
+        self._storage = storage
+        self._potential_delegations = PotentialDelegationsView(self._storage)
+        self._index = None
+        self._components = None
+        if sampler is None:
+            sampler = default_sampler(gamma)
+        self._sampler_class = sampler
+        self._sampler = None
+        self.rng = default_rng(rng)
+
+    @property
+    def sampler(self):
+        """AttachmentSampler: engine drawing the endpoints of new edges, rebuilt from the stored graph on first use."""
+        if self._sampler is None:
+            self._sampler = self._sampler_class.from_graph(self.gamma, self.degrees, self._storage.offsets,
+                                                           self._storage.targets)
+        return self._sampler
+
+    def save(self, path):
+        """Write a snapshot of the graph to the directory ``path``.
+
+        The snapshot consists of the raw NumPy arrays of the graph's storage (see ``CompactStorage.save``) and a file
+        ``graph.json`` with the generation parameters and the seed and state of ``self.rng``. Observers are not saved.
+
+        Args:
+            path (string): directory, created if it does not exist
+        """
+        makedirs(path, exist_ok=True)
+        seed_sequence = self.rng.bit_generator.seed_seq
+        header = {"format": self.SNAPSHOT_FORMAT_VERSION, "gamma": self.gamma, "d": self.d,
+                  "outdegree": self.outdegree,
+                  "sampler": next((name for name, cls in SAMPLERS.items() if cls is self._sampler_class), None),
+                  "seed": {"entropy": seed_sequence.entropy, "spawn_key": list(seed_sequence.spawn_key),
+                           "n_children_spawned": seed_sequence.n_children_spawned},
+                  "rng_state": self.rng.bit_generator.state,
+                  "number_of_nodes": self._storage.number_of_nodes, "number_of_edges": self._storage.number_of_edges,
+                  "arrays": self._storage.save(path)}
+        with open(join(path, "graph.json"), "w") as file:
+            dump(header, file, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Open a snapshot written by ``save``.
+
+        The arrays are memory-mapped rather than read, so even very large graphs open almost instantly and several
+        processes loading the same snapshot share its pages. The graph can be grown further; the sampler and the
+        adjacency index are only built once they are needed.
+
+        Args:
+            path (string): directory of the snapshot
+
+        Returns:
+            Graph
+        """
+        with open(join(path, "graph.json")) as file:
+            header = load(file)
+        if header["format"] != cls.SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {header['format']}.")
+
+        storage = CompactStorage.load(path, header["gamma"], header["number_of_nodes"], header["number_of_edges"],
+                                      header["arrays"])
+        seed = header["seed"]
+        seed_sequence = SeedSequence(seed["entropy"], spawn_key=seed["spawn_key"],
+                                     n_children_spawned=seed["n_children_spawned"])
+        sampler = SAMPLERS[header["sampler"]] if header["sampler"] is not None else None
+        graph = cls(header["gamma"], header["d"], header["outdegree"], sampler, seed_sequence, storage)
+        if graph.rng.bit_generator.state["bit_generator"] == header["rng_state"]["bit_generator"]:
+            graph.rng.bit_generator.state = header["rng_state"]
+        return graph
+
+    @property
+    def potential_delegations(self):
+        return self._potential_delegations
+
+    def _adjacency_index(self):
+        """Build the adjacency index on first use; afterwards, it is updated whenever nodes are added."""
+        if self._index is None:
+            self._index = AdjacencyIndex(self.potential_delegations)
+        return self._index
+
+    @property
+    def unique_potential_delegations(self):
+        """list of ((list of int) / None): potential delegations without duplicates. Must not be modified."""
+        return self._adjacency_index().unique_potential_delegations
+
+    @property
+    def predecessors(self):
+        """list of (list of int): for every node, the nodes with an edge to it, each listed once. Must not be modified."""
+        return self._adjacency_index().predecessors
+
+    @property
+    def in_degrees(self):
+        """list of int: for every node, the number of distinct nodes with an edge to it. Must not be modified."""
+        return self._adjacency_index().in_degrees
+
+    def _component_index(self):
+        """Build the union-find structure on first use; afterwards, it is updated whenever nodes are added."""
+        if self._components is None:
+            self._components = ComponentIndex(self.potential_delegations)
+        return self._components
+
+    def component(self, node):
+        """Return the id of the weakly connected component of ``node``, which may change when the graph grows.
+
+        >>> graph = Graph(1., .5, 1)
+        >>> graph.add_voter()
+        >>> graph.component(0) == graph.component(1)
+        False
+        >>> graph.add_preferential_node(2)
+        >>> graph.component(2) == graph.component(graph.potential_delegations[2][0])
+        True
+        """
+        assert 0 <= node < self.number_of_nodes()
+        return self._component_index().find(node)
+
+    def component_ids(self):
+        """Return a list of int, the id of the weakly connected component of every node (see ``component``)."""
+        index = self._component_index()
+        return [index.find(node) for node in range(self.number_of_nodes())]
+
+    def components(self):
+        """Return the weakly connected components as a dict mapping their ids to their nodes. Must not be modified.
+
+        Returns:
+            dict of int → list of int: for every component, its nodes in no particular order
+        """
+        return self._component_index().members
+
+    def number_of_components(self):
+        return len(self._component_index().members)
+
+    @staticmethod
+    def _read_only(array):
+        array.flags.writeable = False
+        return array
+
+    @property
+    def degrees(self):
+        return self._read_only(self._storage.degrees[:self._storage.number_of_nodes])
+
+    @property
+    def probability_weights(self):
+        return self._read_only(self._storage.weights[:self._storage.number_of_nodes])
+
+    def spawn_rng(self):
+        """Derive an independent random number generator, e.g., for a randomized mechanism observing the graph.
+
+        Spawning does not advance ``self.rng``, so the generated graph does not depend on the observers.
+
+        Returns:
+            numpy.random.Generator
+        """
+        return self.rng.spawn(1)[0]
 
     def number_of_nodes(self):
-        return len(self.potential_delegations)
+        return self._storage.number_of_nodes
 
     def is_voter(self, node):
         assert 0 <= node < self.number_of_nodes()
-        return self.potential_delegations[node] is None
+        return self._storage.is_voter(node)
+
+    def voters(self):
+        """Return a numpy array of bool, indicating for every node whether it is a voter."""
+        return self._storage.voters()
+
+    def edges(self, start=0, stop=None):
+        """Return the potential delegations of the nodes ``start, …, stop - 1`` as arrays, including duplicates.
+
+        Args:
+            start (int): first node
+            stop (int/None): end of the range of nodes, defaulting to the number of nodes
+
+        Returns:
+            (numpy array of int, numpy array of int): (delegating node, delegate) for every potential delegation
+        """
+        if stop is None:
+            stop = self.number_of_nodes()
+        assert 0 <= start <= stop <= self.number_of_nodes()
+        sources, targets = self._storage.edges(start, stop)
+        return sources, self._read_only(targets)
+
+    def node_block(self, start=0, stop=None):
+        """Return the existing nodes ``start, …, stop - 1`` as a ``NodeBlock``, e.g. to replay a loaded graph.
+
+        >>> graph = Graph(1., .5, 2, rng=0)
+        >>> block = graph.grow(10)
+        >>> list(graph.node_block(1)) == list(block)
+        True
+
+        Args:
+            start (int): first node
+            stop (int/None): end of the range of nodes, defaulting to the number of nodes
+
+        Returns:
+            NodeBlock
+        """
+        if stop is None:
+            stop = self.number_of_nodes()
+        assert 0 <= start <= stop <= self.number_of_nodes()
+        offsets = self._storage.offsets[start:stop + 1]
+        return NodeBlock(start, self.voters()[start:stop], offsets - offsets[0],
+                         self._read_only(self._storage.targets[offsets[0]:offsets[-1]]))
 
     def add_preferential_node(self, outdegree=None):
         """Add a new node to the graph, delegating to ``self.outdegree`` many nodes chosen via preferential attachment.
 
         Probability of attachment to a node ``n`` is proportional to ``self.probability_weights[n] = self.degrees[n] ** self.gamma``.
+        The endpoints are drawn by ``self.sampler``.
 
         Args:
             outdegree (int/None): Number of outgoing edges, overriding self.outdegree if not None. If self.outdegree is
@@ -60,54 +290,160 @@ class Graph:
 
         for _ in range(outdegree):
             # with updated weights
-            total_weight = sum(self.probability_weights)
-            normalized_weights = [weight / total_weight for weight in self.probability_weights]
-
-            endpoint = choice(self.number_of_nodes(), p=normalized_weights)
+            endpoint = self.sampler.sample(self.rng.random())
             assert 0 <= endpoint < self.number_of_nodes()
 
             pots.append(endpoint)
-            self.degrees[endpoint] += 1
-            self.probability_weights[endpoint] = self.degrees[endpoint] ** self.gamma
+            self._storage.increment_degree(endpoint)
+            self.sampler.increment_degree(endpoint)
 
-        self.potential_delegations.append(pots)
-        self.degrees.append(1)
-        self.probability_weights.append(1 ** self.gamma)
+        self._storage.append_delegator(pots)
+        self.sampler.add_node()
+        if self._index is not None:
+            self._index.append(pots)
+        if self._components is not None:
+            self._components.append(pots)
 
         for observer in self.observers:
             observer.notify_of_added_delegating_node(pots)
 
     def add_voter(self):
         """Add a voting vertex."""
-        self.potential_delegations.append(None)
-        self.degrees.append(1)
-        self.probability_weights.append(1 ** self.gamma)
+        self.sampler.add_node()  # before appending, in case the sampler is only now created from the degrees
+        self._storage.append_voter()
+        if self._index is not None:
+            self._index.append(None)
+        if self._components is not None:
+            self._components.append(None)
         for observer in self.observers:
             observer.notify_of_added_voting_node()
 
     def add_node(self, outdegree=None):
-        if random() < self.d:
+        if self.rng.random() < self.d:
             self.add_preferential_node(outdegree)
         else:
             self.add_voter()
 
+    def grow(self, n, outdegree_distribution=None):
+        """Add ``n`` nodes at once, with the same distribution as ``n`` calls to ``add_node``.
+
+        All random choices of the block are drawn in vectorized form, and each observer is notified once through
+        ``notify_of_added_nodes``.
+
+        Args:
+            n (int): number of nodes to add
+            outdegree_distribution (list of float / None): [prob. outdegree 1, prob. outdegree 2, …] for delegating
+                                                            nodes. If None, all delegating nodes have outdegree
+                                                            ``self.outdegree``.
+
+        Returns:
+            NodeBlock: the added nodes
+        """
+        assert n >= 0
+        is_voter = self.rng.random(n) >= self.d
+        if outdegree_distribution is None:
+            if self.outdegree is None:
+                raise ValueError("Outdegree distribution must be specified if self.outdegree is None.")
+            outdegrees = full(n, self.outdegree)
+        else:
+            outdegrees = self.rng.choice(arange(1, len(outdegree_distribution) + 1), size=n,
+                                         p=outdegree_distribution)
+        outdegrees[is_voter] = 0
+
+        endpoints = self.sampler.sample_block(outdegrees, self.rng.random(outdegrees.sum()))
+        block = NodeBlock(self.number_of_nodes(), is_voter, concatenate(([0], cumsum(outdegrees))), endpoints)
+        self._storage.append_block(block.is_voter, block.offsets, block.targets)
+        if self._index is not None or self._components is not None:
+            for potential_delegations in block:
+                if self._index is not None:
+                    self._index.append(potential_delegations)
+                if self._components is not None:
+                    self._components.append(potential_delegations)
+
+        for observer in self.observers:
+            observer.notify_of_added_nodes(block)
+
+        return block
+
     def to_dot(self):
-        s = "digraph {\n"
-        s += "node [shape=circle color=\"#3F51B5\" style=filled label=\"\"];"  # delegators
-        for i in range(self.number_of_nodes()):
-            if not self.is_voter(i):
-                s += f" {i};"
-        s += "\nnode [shape=circle color=\"#F44336\" style=filled label=\"\"];"  # voters
-        for i in range(self.number_of_nodes()):
-            if self.is_voter(i):
-                s += f" {i};"
-        s += "\nedge [color=\"#000000\" arrowhead=open penwidth=1];\n"
-        for i in range(self.number_of_nodes()):
-            if not self.is_voter(i):
-                for j in set(self.potential_delegations[i]):
-                    s += f"{i} -> {j};\n"
-        s += "}\n"
-        return s
+        """Return the graph in GraphViz DOT format. For large graphs, stream it with ``graph_export.write_graph``."""
+        out = StringIO()
+        write_graph(self, out, "dot")
+        return out.getvalue()
+
+
+def iteration_rng(random_seed, setting, iteration):
+    """Create the random number generator for one iteration of one setting of an experiment.
+
+    The generator is seeded with the child ``SeedSequence(random_seed).spawn(…)[setting].spawn(…)[iteration]``, so every
+    iteration can be regenerated on its own, in any order or process.
+
+    >>> children = SeedSequence(0).spawn(2)[1].spawn(3)
+    >>> iteration_rng(0, 1, 2).random() == default_rng(children[2]).random()
+    True
+
+    Args:
+        random_seed (int): seed of the whole experiment
+        setting (int): index of the setting
+        iteration (int): index of the iteration within the setting
+
+    Returns:
+        numpy.random.Generator
+    """
+    return default_rng(SeedSequence(random_seed, spawn_key=(setting, iteration)))
+
+
+class NodeBlock:
+    """Consecutive nodes added to a graph by a single call to ``Graph.grow``.
+
+    >>> from numpy import array
+    >>> block = NodeBlock(3, array([False, True, False]), array([0, 2, 2, 3]), array([0, 1, 3]))
+    >>> len(block)
+    3
+    >>> list(block)
+    [[0, 1], None, [3]]
+
+    Attributes:
+        first_node (int): index of the first node of the block in the graph
+        is_voter (numpy array of bool): for each node of the block, whether it is a voter
+        offsets (numpy array of int): the potential delegations of the i-th node of the block are
+                                      ``targets[offsets[i]:offsets[i + 1]]``, empty for voters
+        targets (numpy array of int): endpoints of all potential delegations, ordered by node
+    """
+
+    def __init__(self, first_node, is_voter, offsets, targets):
+        assert len(offsets) == len(is_voter) + 1
+        assert offsets[-1] == len(targets)
+        self.first_node = first_node
+        self.is_voter = is_voter
+        self.offsets = offsets
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.is_voter)
+
+    def __iter__(self):
+        """Iterate over the potential delegations of the nodes in the format of ``Graph.potential_delegations``."""
+        offsets = self.offsets.tolist()
+        targets = self.targets.tolist()
+        for i, is_voter in enumerate(self.is_voter.tolist()):
+            if is_voter:
+                yield None
+            else:
+                yield targets[offsets[i]:offsets[i + 1]]
+
+    def delegator_offsets(self):
+        """Return the offsets of the potential delegations of all delegating nodes of the block.
+
+        >>> from numpy import array
+        >>> NodeBlock(3, array([False, True, False]), array([0, 2, 2, 3]), array([0, 1, 3])).delegator_offsets()
+        (array([0, 2]), array([2, 1]))
+
+        Returns:
+            (numpy array of int, numpy array of int): (index of the first potential delegation, outdegree)
+        """
+        delegators = flatnonzero(~self.is_voter)
+        return self.offsets[delegators], self.offsets[delegators + 1] - self.offsets[delegators]
 
 
 class Observer:
@@ -134,6 +470,21 @@ class Observer:
         assert len(potential_delegations) > 0
         assert all(0 <= pot < self.graph.number_of_nodes() - 1 for pot in potential_delegations)
 
+    def notify_of_added_nodes(self, block):
+        """React to a block of nodes being added to the graph.
+
+        By default, this calls ``notify_of_added_voting_node`` and ``notify_of_added_delegating_node`` for every node
+        in order. Note that ``self.graph`` already contains the whole block during these calls.
+
+        Args:
+            block (NodeBlock): the added nodes
+        """
+        for potential_delegations in block:
+            if potential_delegations is None:
+                self.notify_of_added_voting_node()
+            else:
+                self.notify_of_added_delegating_node(potential_delegations)
+
 
 class ProtocollingObserver(Observer):
     def __init__(self, graph):
@@ -147,6 +498,106 @@ class ProtocollingObserver(Observer):
         self.protocol.append(potential_delegations)
 
 
+class StatisticsObserver(Observer):
+    """Observer keeping aggregate statistics of the graph up to date, at amortized constant cost per added node.
+
+    Nodes already in the graph when the observer is created are counted once at initialization.
+
+    >>> graph = Graph(1., .5, 2)
+    >>> statistics = StatisticsObserver(graph)
+    >>> graph.add_preferential_node()
+    >>> graph.add_voter()
+    >>> statistics.summary()
+    {'num_voters': 2, 'num_delegators': 1, 'num_no_choice_delegators': 1, 'total_nodes': 3, \
+'double_to_most_frequent': 1, 'min_k': 2, 'max_k': 2, 'degree_distribution': [0, 2, 0, 1]}
+
+    Attributes:
+        number_of_voters (int): number of voters, including the initial one
+        number_of_delegators (int): number of delegating nodes
+        number_of_no_choice_delegators (int): number of delegating nodes whose potential delegations all lead to the
+                                              same node
+        double_to_most_frequent (int): largest number of no-choice delegators sharing their delegate
+        min_outdegree (int / float): smallest number of potential delegations of a delegating node, inf if none
+        max_outdegree (int / float): largest number of potential delegations of a delegating node, -inf if none
+        degree_counts (numpy array of int): degree_counts[i] is the number of nodes of degree i, with trailing zeros
+    """
+
+    def __init__(self, graph):
+        super().__init__(graph)
+        self.number_of_voters = 0
+        self.number_of_delegators = 0
+        self.number_of_no_choice_delegators = 0
+        self.double_to_most_frequent = 0
+        self.min_outdegree = inf
+        self.max_outdegree = -inf
+        self._no_choice_delegates = Counter()
+        for potential_delegations in graph.potential_delegations:
+            if potential_delegations is None:
+                self.number_of_voters += 1
+            else:
+                self._count_delegator(potential_delegations)
+        self.degree_counts = bincount(graph.degrees, minlength=2)
+
+    def _count_delegator(self, potential_delegations):
+        self.number_of_delegators += 1
+        self.min_outdegree = min(self.min_outdegree, len(potential_delegations))
+        self.max_outdegree = max(self.max_outdegree, len(potential_delegations))
+        if all(delegate == potential_delegations[0] for delegate in potential_delegations[1:]):
+            self._count_no_choice_delegator(potential_delegations[0])
+
+    def _count_no_choice_delegator(self, delegate):
+        self.number_of_no_choice_delegators += 1
+        self._no_choice_delegates[delegate] += 1
+        self.double_to_most_frequent = max(self.double_to_most_frequent, self._no_choice_delegates[delegate])
+
+    def _update_degrees(self, number_of_new_nodes, endpoints, increments):
+        """Move the endpoints of new edges to their new degree, after counting the new nodes with degree 1."""
+        new_degrees = self.graph.degrees[endpoints]
+        while new_degrees.max(initial=1) >= len(self.degree_counts):
+            self.degree_counts = concatenate((self.degree_counts, zeros_like(self.degree_counts)))
+        self.degree_counts[1] += number_of_new_nodes
+        subtract.at(self.degree_counts, new_degrees - increments, 1)
+        add.at(self.degree_counts, new_degrees, 1)
+
+    def notify_of_added_voting_node(self):
+        self.number_of_voters += 1
+        self.degree_counts[1] += 1
+
+    def notify_of_added_delegating_node(self, potential_delegations):
+        self._count_delegator(potential_delegations)
+        endpoints, increments = unique(potential_delegations, return_counts=True)
+        self._update_degrees(1, endpoints, increments)
+
+    def notify_of_added_nodes(self, block):
+        starts, outdegrees = block.delegator_offsets()
+        self.number_of_voters += len(block) - len(starts)
+        self.number_of_delegators += len(starts)
+        if len(starts) > 0:
+            self.min_outdegree = min(self.min_outdegree, int(outdegrees.min()))
+            self.max_outdegree = max(self.max_outdegree, int(outdegrees.max()))
+            first_delegates = block.targets[starts]
+            differing = add.reduceat(block.targets != repeat(first_delegates, outdegrees), starts)
+            for delegate in first_delegates[differing == 0].tolist():
+                self._count_no_choice_delegator(delegate)
+        endpoints, increments = unique(block.targets, return_counts=True)
+        self._update_degrees(len(block), endpoints, increments)
+
+    def summary(self):
+        """Return the statistics as a JSON-serializable summary record, with the keys of ``scripts/log_statistics.py``.
+
+        Returns:
+            dict: the statistics, where ``degree_distribution`` lists the number of nodes of degree 0, 1, …, maximum
+        """
+        return {"num_voters": self.number_of_voters,
+                "num_delegators": self.number_of_delegators,
+                "num_no_choice_delegators": self.number_of_no_choice_delegators,
+                "total_nodes": self.number_of_voters + self.number_of_delegators,
+                "double_to_most_frequent": self.double_to_most_frequent,
+                "min_k": None if self.number_of_delegators == 0 else self.min_outdegree,
+                "max_k": None if self.number_of_delegators == 0 else self.max_outdegree,
+                "degree_distribution": trim_zeros(self.degree_counts, "b").tolist()}
+
+
 class Mechanism(Observer):
     """Algorithm instance observing generation of a ``Graph`` instance and making delegation decisions.
 
@@ -190,14 +641,31 @@ class Mechanism(Observer):
 
         Returns:
             if is_splittable():
-                list of ((dict of int → float) / None):
+                list of ((dict of int → float) / None) / SplittableFlows:
                 For every node n, a dictionary mapping delegates to the weight of delegation, or None for voters.
             else:
-                list of (int / None):
+                list of (int / None) / ConfluentDelegations:
                 For every node n, the index of the node it delegates to or None if it is a voter.
+            The compact result types of ``delegation_results`` behave like the lists and are accepted wherever
+            delegations are passed in.
         """
         pass
 
+    def current_max_weight(self, time_out=None):
+        """Return the maximum weight of a voter under the delegations for the current state of the graph.
+
+        By default, this computes the delegations and evaluates them. Mechanisms that know the maximum weight anyway,
+        e.g. by maintaining it incrementally or as the objective of an optimization, override this, so that callers
+        who only need the maximum weight should prefer it to ``max_weight_from_delegations(get_delegations())``.
+
+        Args:
+            time_out (float): Time out in seconds, as in ``get_delegations``.
+
+        Returns:
+            int / float: the maximum weight
+        """
+        return self.max_weight_from_delegations(self.get_delegations(time_out=time_out))
+
 
 class ConfluentMechanism(Mechanism):
     @staticmethod
@@ -212,31 +680,11 @@ class ConfluentMechanism(Mechanism):
         Args:
              delegations (list of (None / int))
         """
-        num_agents = len(delegations)
-
-        transitive_delegations = []
-        for node, delegate in enumerate(delegations):
-            if delegate is None:
-                transitive_delegations.append(node)
-            else:
-                transitive_delegations.append(delegate)
-
-        def get_transitive_delegate(node):
-            nonlocal transitive_delegations
-            delegate = transitive_delegations[node]
-            if transitive_delegations[delegate] == delegate:  # Delegate is voter
-                return delegate
-            transitive_delegations[node] = get_transitive_delegate(delegate)
-            return transitive_delegations[node]
-
-        weight_counter = Counter(get_transitive_delegate(node) for node in range(num_agents))
-
-        # weight_counter.most_common(1) might e.g. be [(max_weight_voter, max_weight)]
-        return weight_counter.most_common(1)[0][1]
+        return WeightStatistics.from_confluent(delegations).max()
 
     @staticmethod
     def is_splittable():
-        False
+        return False
 
     @staticmethod
     def max_weight_from_delegations(delegations):
@@ -256,27 +704,13 @@ class SplittableMechanism(Mechanism):
         2.5
 
         Args:
-             delegations (list of ((dict of int → float) / None))
+             delegations (list of ((dict of int → float) / None)): empty dicts also count as voters
         """
-        num_agents = len(delegations)
-
-        congestions = [1. for _ in range(num_agents)]
-        for succs in delegations:
-            if succs is not None:
-                for neighbor in succs:
-                    congestions[neighbor] += succs[neighbor]
-
-        max_congestion = -inf
-        for i, succs in enumerate(delegations):
-            if succs is None:
-                max_congestion = max(max_congestion, congestions[i])
-        assert max_congestion > -inf
-
-        return max_congestion
+        return WeightStatistics.from_splittable(delegations).max()
 
     @staticmethod
     def is_splittable():
-        True
+        return True
 
     @staticmethod
     def max_weight_from_delegations(delegations):
@@ -3,6 +3,8 @@ from unittest import TestCase
 
 from mock import MagicMock
 
+from graph_storage import deduplicated_adjacency
+
 
 class TestOnePlusLogTwoApproximation(TestCase):
     # list of (list of (None / list of int), dict of int → float, list of (None / int))
@@ -14,6 +16,7 @@ class TestOnePlusLogTwoApproximation(TestCase):
     class MockGraph:
         def __init__(self, potential_delegations):
             self.potential_delegations = potential_delegations
+            self.unique_potential_delegations, self.predecessors = deduplicated_adjacency(potential_delegations)
             self.observers = []
 
         def is_voter(self, node):
@@ -25,7 +28,9 @@ class TestOnePlusLogTwoApproximation(TestCase):
     def test_get_delegations(self):
         mock = MagicMock()
         modules["fractional_integral_flow"] = mock
+        import approximate_confluent_flow
         from approximate_confluent_flow import OnePlusLogTwoApproximation
+        approximate_confluent_flow.SplittableFlow = mock.SplittableFlow  # the module may be imported already
 
         for current_case in self.test_cases:
             a = self.MockGraph(current_case[0])
@@ -46,6 +51,7 @@ class TestOnePlusLnApproximation(TestCase):
     class MockGraph:
         def __init__(self, potential_delegations):
             self.potential_delegations = potential_delegations
+            self.unique_potential_delegations, self.predecessors = deduplicated_adjacency(potential_delegations)
             self.observers = []
 
         def is_voter(self, node):
@@ -57,7 +63,9 @@ class TestOnePlusLnApproximation(TestCase):
     def test_get_delegations(self):
         mock = MagicMock()
         modules["fractional_integral_flow"] = mock
+        import approximate_confluent_flow
         from approximate_confluent_flow import OnePlusLnApproximation
+        approximate_confluent_flow.SplittableFlow = mock.SplittableFlow  # the module may be imported already
 
         for current_case in self.test_cases:
             a = self.MockGraph(current_case[0])
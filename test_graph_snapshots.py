@@ -0,0 +1,40 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from simulations import Graph
+
+
+class TestGraphSnapshots(TestCase):
+    def test_continuation(self):
+        """A loaded graph draws the same nodes as the original when both grow further."""
+        for gamma in [0., 1., .5]:
+            original = Graph(gamma, .5, 2, rng=0)
+            original.grow(200)
+            with TemporaryDirectory() as directory:
+                original.save(directory)
+                loaded = Graph.load(directory)
+                for graph in [original, loaded]:
+                    for _ in range(20):
+                        graph.add_node()
+                    graph.grow(300)
+                assert list(loaded.potential_delegations) == list(original.potential_delegations), gamma
+
+    def test_mechanisms_on_loaded_graph(self):
+        """Mechanisms attached to a loaded graph agree with those that observed the original run."""
+        from local_search import LocalSearchDelegation
+        from simple_mechanisms import GeneralizedPowerOfChoice, GreedyNewestDelegate, GreedyPowerOfChoice
+
+        mechanism_classes = [GreedyNewestDelegate, GreedyPowerOfChoice, GeneralizedPowerOfChoice,
+                             LocalSearchDelegation]
+        original = Graph(1., .5, 2, rng=0)
+        observers = [mechanism_class(original) for mechanism_class in mechanism_classes]
+        original.grow(200)
+        with TemporaryDirectory() as directory:
+            original.save(directory)
+            loaded = Graph.load(directory)
+            replayed = [mechanism_class(loaded) for mechanism_class in mechanism_classes]
+            for graph in [original, loaded]:
+                graph.grow(100)
+            for observer, replayed_observer in zip(observers, replayed):
+                assert len(replayed_observer.get_delegations()) == loaded.number_of_nodes()
+                assert replayed_observer.current_max_weight() == observer.current_max_weight(), observer.PLOT_LABEL
@@ -0,0 +1,139 @@
+"""Vectorized computation of voter weights and their statistics from resolved delegations.
+
+Weights are computed in a single NumPy pass without recursion: transitive delegates of confluent delegations are found
+by pointer jumping, which needs a logarithmic number of passes in the length of the longest delegation chain. In
+splittable delegations, the flow on every edge already includes the weight passed on from further up, so the weight of
+a voter is one plus the sum of the flows into it.
+"""
+
+from itertools import chain
+
+from numpy import (arange, array_equal, asarray, bincount, flatnonzero, fromiter, histogram, int64, ndarray, partition,
+                   quantile, sort)
+
+from delegation_results import ConfluentDelegations, SplittableFlows
+
+
+class WeightStatistics:
+    """Weights of all voters under resolved delegations, along with statistics derived from them.
+
+    >>> statistics = WeightStatistics.from_confluent([None, 0, None, 2, 3])
+    >>> statistics.voters.tolist(), statistics.weights.tolist()
+    ([0, 2], [2, 3])
+    >>> statistics.max(), statistics.top(1).tolist(), statistics.quantiles([0., .5]).tolist()
+    (3, [3], [2.0, 2.5])
+    >>> WeightStatistics.from_splittable([None, None, {0: 0.25, 1: 0.75}]).max()
+    1.75
+
+    Attributes:
+        voters (numpy array of int): all voters in ascending order
+        weights (numpy array of int / float): weights[i] is the weight of voters[i]
+    """
+
+    def __init__(self, voters, weights):
+        assert len(voters) == len(weights) > 0
+        self.voters = voters
+        self.weights = weights
+
+    @classmethod
+    def from_confluent(cls, delegations):
+        """Resolve confluent delegations by pointer jumping.
+
+        >>> WeightStatistics.from_confluent([None, None, None]).weights.tolist()
+        [1, 1, 1]
+        >>> WeightStatistics.from_confluent([None] + list(range(9999))).max()
+        10000
+
+        Args:
+            delegations (list of (None / int) / ConfluentDelegations / numpy array of int): for every node the node it
+                                                                                           delegates to, None or -1 for
+                                                                                           voters
+
+        Returns:
+            WeightStatistics
+        """
+        if isinstance(delegations, (ndarray, ConfluentDelegations)):
+            delegates = asarray(delegations).astype(int64)
+        else:
+            delegates = fromiter((-1 if delegate is None else delegate for delegate in delegations), int64,
+                                 len(delegations))
+        is_voter = delegates < 0
+        delegates[is_voter] = flatnonzero(is_voter)
+
+        # After i rounds, every node points to its delegate 2^i steps ahead, or to its voter if that is closer
+        for _ in range(max(len(delegates), 1).bit_length() + 1):
+            jumped = delegates[delegates]
+            if array_equal(jumped, delegates):
+                break
+            delegates = jumped
+        assert is_voter[delegates].all(), "Delegations contain a cycle."
+
+        voters = flatnonzero(is_voter)
+        return cls(voters, bincount(delegates, minlength=len(delegates))[voters])
+
+    @classmethod
+    def from_splittable(cls, delegations):
+        """Sum up the flows into every voter.
+
+        >>> WeightStatistics.from_splittable([None, None, {0: 0.75, 1: 0.5}, {1: 0.75, 2: 0.25}]).max()
+        2.25
+
+        Args:
+            delegations (list of ((dict of int → float) / None) / SplittableFlows): for every node, a dictionary
+                                                                                    mapping delegates to the flow of
+                                                                                    delegation, or None (or an empty
+                                                                                    dict) for voters
+
+        Returns:
+            WeightStatistics
+        """
+        if isinstance(delegations, SplittableFlows):
+            _, delegates, flows = delegations.to_numpy()
+            voters = flatnonzero(delegations.is_voter)
+            return cls(voters, 1. + bincount(delegates, weights=flows, minlength=len(delegations))[voters])
+
+        number_of_nodes = len(delegations)
+        delegates = fromiter(chain.from_iterable(succs for succs in delegations if succs), int64)
+        flows = fromiter(chain.from_iterable(succs.values() for succs in delegations if succs), float)
+        is_voter = fromiter((not succs for succs in delegations), bool, number_of_nodes)
+
+        voters = flatnonzero(is_voter)
+        return cls(voters, 1. + bincount(delegates, weights=flows, minlength=number_of_nodes)[voters])
+
+    def max(self):
+        """Return the maximum weight of a voter, as a Python int or float."""
+        return self.weights.max().item()
+
+    def top(self, k):
+        """Return the ``k`` largest weights (or all, if there are fewer voters) in descending order."""
+        k = min(k, len(self.weights))
+        if k == 0:
+            return self.weights[:0]
+        return sort(partition(self.weights, len(self.weights) - k)[len(self.weights) - k:])[::-1]
+
+    def quantiles(self, q):
+        """Return the ``q``-quantiles of the weights, for a float or array of floats between 0 and 1."""
+        return quantile(self.weights, asarray(q))
+
+    def histogram(self, bins=None):
+        """Count the voters by weight.
+
+        >>> counts, edges = WeightStatistics.from_confluent([None, 0, None, 2, 3, None]).histogram()
+        >>> counts.tolist(), edges.tolist()
+        ([1, 1, 1], [0.5, 1.5, 2.5, 3.5])
+
+        Args:
+            bins (int / sequence of float / None): as in ``numpy.histogram``. By default, one bin per integer from 1
+                                                   to the ceiled maximum weight.
+
+        Returns:
+            (numpy array of int, numpy array of float): (counts, bin edges)
+        """
+        if bins is None:
+            bins = arange(1, int(-(-self.max() // 1)) + 2) - .5
+        return histogram(self.weights, bins)
+
+
+if __name__ == "__main__":
+    from doctest import testmod
+    testmod()